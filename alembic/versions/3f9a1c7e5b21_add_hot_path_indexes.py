@@ -0,0 +1,50 @@
+"""Add hot path indexes
+
+Revision ID: 3f9a1c7e5b21
+Revises: c12dbcd14d24
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c7e5b21'
+down_revision: Union[str, None] = 'c12dbcd14d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Перед созданием уникальных индексов оставляем только первую запись
+    # для каждой пары, как это делал отчет
+    op.execute(
+        "DELETE FROM question_responses WHERE id NOT IN ("
+        "SELECT MIN(id) FROM question_responses GROUP BY poll_response_id, question_id)"
+    )
+    op.execute(
+        "DELETE FROM question_responses WHERE poll_response_id NOT IN ("
+        "SELECT MIN(id) FROM poll_responses GROUP BY poll_id, user_id)"
+    )
+    op.execute(
+        "DELETE FROM poll_responses WHERE id NOT IN ("
+        "SELECT MIN(id) FROM poll_responses GROUP BY poll_id, user_id)"
+    )
+
+    op.create_index('ix_users_is_admin', 'users', ['is_admin'])
+    op.create_index('ix_polls_created_by', 'polls', ['created_by'])
+    op.create_index('ix_questions_poll_id_order', 'questions', ['poll_id', 'order'])
+    op.create_index('ix_poll_responses_poll_id_user_id', 'poll_responses', ['poll_id', 'user_id'], unique=True)
+    op.create_index('ix_question_responses_poll_response_id_question_id', 'question_responses',
+                    ['poll_response_id', 'question_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_question_responses_poll_response_id_question_id', table_name='question_responses')
+    op.drop_index('ix_poll_responses_poll_id_user_id', table_name='poll_responses')
+    op.drop_index('ix_questions_poll_id_order', table_name='questions')
+    op.drop_index('ix_polls_created_by', table_name='polls')
+    op.drop_index('ix_users_is_admin', table_name='users')
@@ -0,0 +1,27 @@
+"""Add question scoring policy
+
+Revision ID: 8d2e4b6a9c13
+Revises: 3f9a1c7e5b21
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2e4b6a9c13'
+down_revision: Union[str, None] = '3f9a1c7e5b21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('questions', sa.Column('scoring_policy', sa.String(), nullable=False, server_default='partial'))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('questions') as batch_op:
+        batch_op.drop_column('scoring_policy')
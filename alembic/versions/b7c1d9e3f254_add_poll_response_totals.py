@@ -0,0 +1,42 @@
+"""Add poll response totals
+
+Revision ID: b7c1d9e3f254
+Revises: 8d2e4b6a9c13
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7c1d9e3f254'
+down_revision: Union[str, None] = '8d2e4b6a9c13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL = (
+    "UPDATE poll_responses SET "
+    "total_score = COALESCE((SELECT SUM(score) FROM question_responses "
+    "WHERE question_responses.poll_response_id = poll_responses.id), 0), "
+    "answered_count = (SELECT COUNT(*) FROM question_responses "
+    "WHERE question_responses.poll_response_id = poll_responses.id "
+    "AND selected_answers IS NOT NULL AND CAST(selected_answers AS TEXT) != '[]')"
+)
+
+
+def upgrade() -> None:
+    op.add_column('poll_responses', sa.Column('total_score', sa.Float(), nullable=False, server_default='0'))
+    op.add_column('poll_responses', sa.Column('answered_count', sa.Integer(), nullable=False, server_default='0'))
+    op.create_index('ix_poll_responses_poll_id_total_score', 'poll_responses', ['poll_id', 'total_score'],
+                    unique=False)
+    op.execute(BACKFILL)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_poll_responses_poll_id_total_score', table_name='poll_responses')
+    with op.batch_alter_table('poll_responses') as batch_op:
+        batch_op.drop_column('answered_count')
+        batch_op.drop_column('total_score')
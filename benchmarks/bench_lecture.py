@@ -0,0 +1,274 @@
+"""
+Нагрузочная имитация лекции без Telegram.
+
+Обновления подаются в настоящий диспетчер (main.create_dispatcher()) через
+Dispatcher.feed_update(), ответы бота обрабатывает FakeTelegramSession с
+задержкой и случайными 429. Сценарий:
+
+  1. администратор регистрируется, создает опрос и загружает вопросы текстом;
+  2. студенты регистрируются и присоединяются к опросу по коду доступа;
+  3. для каждого вопроса студенты нажимают случайные варианты ответа,
+     затем администратор завершает прием ответов;
+  4. администратор завершает опрос и получает отчет.
+
+В конце печатаются пропускная способность, перцентили времени обработки
+обновлений по видам и число запросов к БД по этапам. Прогон использует
+отдельную временную базу SQLite (если DATABASE_URL не задан явно).
+
+Запуск: python -m benchmarks.bench_lecture [--students 200] [--questions 5] [--toggles 3]
+        [--latency 0.03] [--rate-limit 0.01] [--seed 1]
+"""
+import os
+import tempfile
+
+BENCH_DIR = tempfile.mkdtemp(prefix="opros_bench_")
+# Переменные окружения должны быть заданы до создания движка базы данных
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(BENCH_DIR, 'bench.db')}")
+os.environ.setdefault("FSM_STORAGE", "memory")
+os.environ.setdefault("ANSWER_BUFFER", "memory")
+os.environ.setdefault("REPORT_EXECUTOR", "thread")
+# Скорость рассылки ограничивает не бот, а 429 от FakeTelegramSession
+os.environ.setdefault("BROADCAST_RATE", "1000")
+
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import shutil
+import statistics
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from sqlalchemy import event
+
+from benchmarks.fake_telegram import FakeTelegramSession
+from database.database import async_engine, engine
+from database.init_db import init_db
+from keyboards.callbacks import AnswerCallback
+from main import create_dispatcher
+from utils.log import setup_logging
+
+logger = logging.getLogger(__name__)
+
+ADMIN_ID = 1_000_000
+STUDENT_ID_START = 2_000_000
+ACCESS_CODE = "lecture"
+OPTIONS_PER_QUESTION = 4
+
+
+def make_questions_text(count: int) -> str:
+    blocks = []
+    for order in range(1, count + 1):
+        options = [f"{'+' if i == 0 else '-'} Вариант {i + 1}" for i in range(OPTIONS_PER_QUESTION)]
+        blocks.append("\n".join([f"{order}. Вопрос {order}?"] + options))
+    return "\n\n".join(blocks)
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class QueryCounter:
+    """
+    Считает запросы синхронного и асинхронного движков к БД.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    @contextmanager
+    def listening(self) -> Iterator["QueryCounter"]:
+        engines = (engine, async_engine.sync_engine)
+        for db_engine in engines:
+            event.listen(db_engine, "before_cursor_execute", self._record)
+        try:
+            yield self
+        finally:
+            for db_engine in engines:
+                event.remove(db_engine, "before_cursor_execute", self._record)
+
+
+class Lecture:
+    """
+    Подает обновления от имени администратора и студентов и замеряет их обработку.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, session: FakeTelegramSession, queries: QueryCounter,
+                 rng: random.Random):
+        self.dp = dp
+        self.bot = bot
+        self.session = session
+        self.queries = queries
+        self.rng = rng
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self.phases: List[tuple] = []
+        self._update_ids = itertools.count(1)
+
+    async def feed(self, kind: str, raw: dict) -> None:
+        update = Update.model_validate({"update_id": next(self._update_ids), **raw}, context={"bot": self.bot})
+        started = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            self.errors[type(e).__name__] += 1
+            logger.debug("Ошибка при обработке обновления %s (%s): %s", update.update_id, kind, e)
+        self.latencies[kind].append(time.perf_counter() - started)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        updates_before = sum(map(len, self.latencies.values()))
+        queries_before = self.queries.count
+        started = time.perf_counter()
+        yield
+        self.phases.append((name, time.perf_counter() - started,
+                            sum(map(len, self.latencies.values())) - updates_before,
+                            self.queries.count - queries_before))
+
+    @staticmethod
+    def user(user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"Студент{user_id}", "last_name": "Тестов",
+                "username": f"user{user_id}"}
+
+    async def message(self, kind: str, user_id: int, text: str = None, **fields) -> None:
+        message = {"message_id": next(self._update_ids), "date": int(time.time()),
+                   "chat": {"id": user_id, "type": "private"}, "from": self.user(user_id), **fields}
+        if text is not None:
+            message["text"] = text
+            if text.startswith("/"):
+                message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        await self.feed(kind, {"message": message})
+
+    async def callback(self, kind: str, user_id: int, data: str, message: dict = None) -> None:
+        message = message or self.session.last_message(user_id) or {
+            "message_id": 0, "date": int(time.time()), "chat": {"id": user_id, "type": "private"}
+        }
+        await self.feed(kind, {"callback_query": {
+            "id": str(next(self._update_ids)), "from": self.user(user_id), "chat_instance": str(user_id),
+            "message": message, "data": data,
+        }})
+
+    async def register(self, user_id: int) -> None:
+        await self.message("register", user_id, "/register")
+        await self.message("register", user_id, contact={
+            "phone_number": f"+7{user_id}", "first_name": f"Студент{user_id}", "user_id": user_id
+        })
+
+    async def create_poll(self, questions: int) -> int:
+        await self.register(ADMIN_ID)
+        await self.message("admin", ADMIN_ID, "/initialize_admin")
+        await self.callback("admin", ADMIN_ID, "create_poll")
+        await self.message("admin", ADMIN_ID, "Нагрузочная лекция")
+        await self.message("admin", ADMIN_ID, "Опрос для замеров")
+        await self.message("admin", ADMIN_ID, ACCESS_CODE)
+        poll_id = int(self.admin_button("add_questions_text_").rsplit("_", 1)[-1])
+        await self.callback("admin", ADMIN_ID, f"add_questions_text_{poll_id}")
+        await self.message("admin:questions", ADMIN_ID, make_questions_text(questions))
+        await self.callback("admin", ADMIN_ID, f"select_poll_{poll_id}")
+        return poll_id
+
+    async def join(self, user_id: int) -> None:
+        await self.register(user_id)
+        await self.callback("join", user_id, "join_poll")
+        await self.message("join", user_id, ACCESS_CODE)
+
+    async def answer(self, user_id: int, toggles: int) -> None:
+        question = self.session.last_message(user_id)
+        callback_data = AnswerCallback.unpack(question["reply_markup"]["inline_keyboard"][0][0]["callback_data"])
+        for _ in range(toggles):
+            option = self.rng.randrange(OPTIONS_PER_QUESTION)
+            data = AnswerCallback(poll_id=callback_data.poll_id, question_id=callback_data.question_id,
+                                  option=option).pack()
+            # Нажатие приходит под последней версией клавиатуры
+            await self.callback("answer", user_id, data, self.session.messages[user_id][question["message_id"]])
+
+    def admin_button(self, prefix: str) -> str:
+        for message in sorted(self.session.messages[ADMIN_ID].values(), key=lambda m: m["message_id"],
+                              reverse=True):
+            for row in message.get("reply_markup", {}).get("inline_keyboard", []):
+                for button in row:
+                    if button.get("callback_data", "").startswith(prefix):
+                        return button["callback_data"]
+        raise LookupError(f"Нет кнопки {prefix} у администратора")
+
+
+async def run(students: int, questions: int, toggles: int, latency: float, rate_limit: float, seed: int) -> None:
+    init_db()
+    rng = random.Random(seed)
+    session = FakeTelegramSession(latency=latency, rate_limit_probability=rate_limit, seed=seed)
+    bot = Bot(token="42:FAKE", session=session)
+    dp = create_dispatcher()
+    queries = QueryCounter()
+    lecture = Lecture(dp, bot, session, queries, rng)
+    student_ids = range(STUDENT_ID_START, STUDENT_ID_START + students)
+
+    await dp.emit_startup(bot=bot)
+    started = time.perf_counter()
+    with queries.listening():
+        with lecture.phase("Создание опроса"):
+            poll_id = await lecture.create_poll(questions)
+        with lecture.phase("Подключение студентов"):
+            await asyncio.gather(*(lecture.join(user_id) for user_id in student_ids))
+        await lecture.callback("admin:send", ADMIN_ID, f"send_first_question_{poll_id}")
+        for order in range(1, questions + 1):
+            with lecture.phase(f"Ответы на вопрос {order}"):
+                await asyncio.gather(*(lecture.answer(user_id, rng.randint(1, toggles)) for user_id in student_ids))
+            with lecture.phase(f"Итоги вопроса {order}"):
+                await lecture.callback("admin:finish", ADMIN_ID, lecture.admin_button("finish_question_"))
+            # После последнего вопроса кнопка завершает опрос и строит отчет
+            with lecture.phase("Завершение опроса" if order == questions else f"Отправка вопроса {order + 1}"):
+                await lecture.callback("admin:next", ADMIN_ID, lecture.admin_button("next_question_"))
+        await dp.emit_shutdown(bot=bot)
+    elapsed = time.perf_counter() - started
+    await bot.session.close()
+
+    total_updates = sum(map(len, lecture.latencies.values()))
+    print(f"Студентов: {students}, вопросов: {questions}, задержка API: {latency * 1000:.0f} мс, "
+          f"вероятность 429: {rate_limit:.1%}")
+    print(f"Обновлений: {total_updates} за {elapsed:.2f} с ({total_updates / elapsed:.1f} обн./с), "
+          f"ошибок обработки: {sum(lecture.errors.values())} {dict(lecture.errors)}")
+    print(f"Запросов к API: {sum(session.calls.values())} ({dict(session.calls.most_common())}), "
+          f"ответов 429: {session.rate_limited}")
+    print(f"Запросов к БД: {queries.count}\n")
+
+    print(f"{'Обновления':18} {'кол-во':>7} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'макс, мс':>9}")
+    for kind, values in lecture.latencies.items():
+        print(f"{kind:18} {len(values):7} " + " ".join(
+            f"{value * 1000:9.1f}" for value in (statistics.median(values), percentile(values, 95),
+                                                 percentile(values, 99), max(values))
+        ))
+
+    print(f"\n{'Этап':24} {'время, с':>9} {'обновлений':>11} {'запросов БД':>12} {'на обновление':>14}")
+    for name, duration, updates, db_queries in lecture.phases:
+        print(f"{name:24} {duration:9.2f} {updates:11} {db_queries:12} {db_queries / max(updates, 1):14.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--toggles", type=int, default=3, help="максимум нажатий на вопрос у студента")
+    parser.add_argument("--latency", type=float, default=0.03, help="задержка ответа API в секундах")
+    parser.add_argument("--rate-limit", type=float, default=0.01, help="вероятность 429 на sendMessage")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    setup_logging(level="ERROR", fmt="text")
+    try:
+        asyncio.run(run(args.students, args.questions, args.toggles, args.latency, args.rate_limit, args.seed))
+    finally:
+        shutil.rmtree(BENCH_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Накладные расходы сбора метрик (utils/metrics.py).
+
+Замеряются:
+  - прямые накладные расходы: цепочка из трех middleware метрик (обновления,
+    обработчика и запроса к API) вокруг пустого обработчика;
+  - сквозной прогон одних и тех же обновлений через диспетчер с одним
+    обработчиком, отвечающим через FakeTelegramSession, без метрик и с ними.
+
+Если прямые накладные расходы на обновление больше бюджета, программа
+завершается с кодом 1 (сквозной замер слишком шумный для такой проверки).
+
+Запуск: python -m benchmarks.bench_metrics [количество обновлений] [бюджет, мкс на обновление]
+"""
+import asyncio
+import sys
+import time
+
+from aiogram import Bot, Dispatcher, Router, types
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.methods import SendMessage
+from aiogram.types import Update
+
+from benchmarks.fake_telegram import FakeTelegramSession
+from utils.metrics import ApiMetricsMiddleware, HandlerMetricsMiddleware, UpdateMetricsMiddleware, setup_metrics
+
+DEFAULT_BUDGET_US = 50.0
+
+
+def make_dispatcher(with_metrics: bool) -> Dispatcher:
+    router = Router(name="bench")
+
+    @router.message()
+    async def reply(message: types.Message):
+        await message.answer("ok")
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    if with_metrics:
+        setup_metrics(dp, port=0)
+    return dp
+
+
+async def measure(with_metrics: bool, count: int, repeat: int) -> float:
+    bot = Bot(token="42:FAKE", session=FakeTelegramSession())
+    dp = make_dispatcher(with_metrics)
+    await dp.emit_startup(bot=bot)
+    updates = [
+        Update.model_validate({"update_id": i, "message": {
+            "message_id": i, "date": 0, "chat": {"id": i, "type": "private"},
+            "from": {"id": i, "is_bot": False, "first_name": "Студент"}, "text": "x",
+        }}, context={"bot": bot})
+        for i in range(count)
+    ]
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for update in updates:
+            await dp.feed_update(bot, update)
+        best = min(best, time.perf_counter() - started)
+    await dp.emit_shutdown(bot=bot)
+    return best
+
+
+async def measure_middlewares(with_metrics: bool, count: int, repeat: int) -> float:
+    update = Update.model_validate({"update_id": 1, "message": {
+        "message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"}, "text": "x"}})
+    method = SendMessage(chat_id=1, text="ok")
+    router = Router(name="bench")
+    data = {"handler": HandlerObject(callback=lambda: None), "event_router": router}
+    update_metrics, handler_metrics, api_metrics = (UpdateMetricsMiddleware(), HandlerMetricsMiddleware(),
+                                                    ApiMetricsMiddleware())
+
+    async def make_request(bot, method):
+        return None
+
+    async def handle(event, data):
+        return await make_request(None, method)
+
+    async def handle_with_metrics(event, data):
+        return await handler_metrics(lambda event, data: api_metrics(make_request, None, method), event, data)
+
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        if with_metrics:
+            for _ in range(count):
+                await update_metrics(handle_with_metrics, update, data)
+        else:
+            for _ in range(count):
+                await handle(update, data)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def report(name: str, count: int, without_metrics: float, with_metrics: float) -> float:
+    overhead_us = (with_metrics - without_metrics) / count * 1e6
+    print(f"{name}: без метрик {without_metrics / count * 1e6:7.1f} мкс/обновление, "
+          f"с метриками {with_metrics / count * 1e6:7.1f} мкс/обновление, "
+          f"накладные расходы {overhead_us:5.1f} мкс/обновление")
+    return overhead_us
+
+
+def main(count: int = 5_000, budget_us: float = DEFAULT_BUDGET_US, repeat: int = 5) -> int:
+    direct = report("Middleware метрик", count * 10,
+                    asyncio.run(measure_middlewares(False, count * 10, repeat)),
+                    asyncio.run(measure_middlewares(True, count * 10, repeat)))
+    report("Сквозной прогон ", count,
+           asyncio.run(measure(False, count, repeat)),
+           asyncio.run(measure(True, count, repeat)))
+    print(f"Бюджет: {budget_us:.0f} мкс/обновление - {'в пределах' if direct <= budget_us else 'превышен'}")
+    return 0 if direct <= budget_us else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000,
+                  float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_BUDGET_US))
@@ -0,0 +1,72 @@
+"""
+Скорость и память разбора больших файлов с вопросами.
+
+Запуск: python -m benchmarks.bench_poll_parser [количество строк]
+"""
+import io
+import sys
+import timeit
+import tracemalloc
+
+from utils.poll_parser import PollParseError, iter_poll_questions, parse_poll, parse_poll_from_file
+
+
+def make_content(lines_count: int, error_every: int = 0) -> str:
+    """
+    Формирует текст из вопросов по 4 варианта ответа (6 строк на вопрос).
+
+    Если error_every > 0, в каждый error_every-й вопрос добавляется ошибочная строка.
+    """
+    lines = []
+    order = 0
+    while len(lines) < lines_count:
+        order += 1
+        lines.append(f"{order}. Вопрос номер {order} о чем-нибудь важном?")
+        lines.append("+ Правильный ответ")
+        if error_every and order % error_every == 0:
+            lines.append("Строка без маркера ответа")
+        lines.extend(["- Неправильный ответ 1", "- Неправильный ответ 2", "+ Еще один правильный ответ", ""])
+    return "\n".join(lines[:lines_count])
+
+
+def parse_collecting_errors(content: str) -> int:
+    try:
+        parse_poll_from_file(content)
+    except PollParseError as e:
+        return len(e.errors)
+    return 0
+
+
+def peak_memory(func) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(lines_count: int = 100_000, repeat: int = 5) -> None:
+    content = make_content(lines_count)
+    data = content.encode("utf-8")
+    with_errors = make_content(lines_count, error_every=10)
+
+    def stream_questions():
+        for _ in iter_poll_questions(io.BytesIO(data)):
+            pass
+
+    cases = (
+        ("parse_poll_from_file(str)", lambda: parse_poll_from_file(content)),
+        ("parse_poll(BytesIO)", lambda: parse_poll(io.BytesIO(data))),
+        ("iter_poll_questions(BytesIO)", stream_questions),
+        ("с ошибками (каждый 10-й)", lambda: parse_collecting_errors(with_errors)),
+    )
+    print(f"Ошибок найдено за один проход: {parse_collecting_errors(with_errors)}")
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=1, repeat=repeat))
+        print(f"{name:30} {lines_count} строк: {best * 1000:8.2f} мс "
+              f"({lines_count / best / 1e6:.2f} млн строк/с), пик памяти {peak_memory(func) / 1024:8.0f} КБ")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
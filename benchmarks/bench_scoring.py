@@ -0,0 +1,38 @@
+"""
+Сравнение подсчета баллов по одному ответу и пакетного QuestionScorer.
+
+Запуск: python -m benchmarks.bench_scoring [количество ответов]
+"""
+import random
+import sys
+import timeit
+
+from database.database import compare_answers
+from utils.scoring import QuestionScorer
+
+OPTIONS = ["Вариант A", "Вариант B", "Вариант C", "Вариант D", "Вариант E"]
+CORRECT = ["Вариант A", "Вариант C"]
+
+
+def make_answers(count: int, seed: int = 1) -> dict:
+    rng = random.Random(seed)
+    return {user_id: rng.sample(OPTIONS, rng.randint(0, 3)) for user_id in range(count)}
+
+
+def main(count: int = 10_000, repeat: int = 5) -> None:
+    answers = make_answers(count)
+
+    def per_answer():
+        return {user_id: compare_answers(selected, CORRECT) for user_id, selected in answers.items()}
+
+    def batched():
+        return QuestionScorer(CORRECT, OPTIONS).score_many(answers)
+
+    assert per_answer() == batched()
+    for name, func in (("compare_answers по одному", per_answer), ("QuestionScorer.score_many", batched)):
+        best = min(timeit.repeat(func, number=1, repeat=repeat))
+        print(f"{name:28} {count} ответов: {best * 1000:8.2f} мс ({best / count * 1e6:.2f} мкс/ответ)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -0,0 +1,131 @@
+"""
+Локальная имитация Telegram Bot API для нагрузочных прогонов.
+
+FakeTelegramSession подменяет HTTP-сессию бота: запросы не уходят в сеть,
+а обрабатываются на месте с задержкой и, с заданной вероятностью, ответом
+429 Too Many Requests. Ответы проходят через BaseSession.check_response(),
+поэтому обработчики получают такие же объекты (и исключения), как от
+настоящего API. Отправленные ботом сообщения запоминаются, чтобы
+имитировать нажатия кнопок под ними.
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from typing import Any, AsyncGenerator, Dict, Iterable, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import InlineKeyboardMarkup
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Опрос", "username": "opros_bot"}
+
+
+class FakeTelegramSession(BaseSession):
+    """
+    Сессия бота, отвечающая на запросы без обращения к Telegram.
+
+    Args:
+        latency: Средняя задержка ответа в секундах.
+        jitter: Разброс задержки (доля от latency).
+        rate_limit_probability: Вероятность ответа 429 на метод из rate_limited_methods.
+        rate_limited_methods: Методы, которые могут получить 429 (по умолчанию - рассылка sendMessage).
+        retry_after: Значение retry_after в ответе 429.
+        seed: Начальное значение генератора случайных чисел.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.5, rate_limit_probability: float = 0.0,
+                 rate_limited_methods: Iterable[str] = ("sendMessage",), retry_after: int = 1,
+                 seed: Optional[int] = None):
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_probability = rate_limit_probability
+        self.rate_limited_methods = frozenset(rate_limited_methods)
+        self.retry_after = retry_after
+        self.calls: Counter = Counter()
+        self.rate_limited = 0
+        self.messages: Dict[int, Dict[int, dict]] = defaultdict(dict)
+        self.files: Dict[str, bytes] = {}
+        self._random = random.Random(seed)
+        self._message_ids = itertools.count(1)
+
+    def last_message(self, chat_id: int) -> Optional[dict]:
+        """
+        Возвращает последнее сообщение бота в чате.
+        """
+        messages = self.messages.get(chat_id)
+        return messages[max(messages)] if messages else None
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        name = method.__api_method__
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency * self._random.uniform(1 - self.jitter, 1 + self.jitter))
+
+        if name in self.rate_limited_methods and self._random.random() < self.rate_limit_probability:
+            self.rate_limited += 1
+            content = {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+            # check_response() выбрасывает TelegramRetryAfter
+            self.check_response(bot, method, 429, json.dumps(content))
+
+        content = {"ok": True, "result": self._result(method)}
+        return self.check_response(bot, method, 200, json.dumps(content)).result
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        data = self.files.get(url.rsplit("/", 1)[-1], b"")
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+
+    async def close(self) -> None:
+        pass
+
+    def _result(self, method: TelegramMethod) -> Any:
+        name = method.__api_method__
+        if method.__returning__ is bool:
+            return True
+        if name == "getMe":
+            return BOT_USER
+        if name == "getFile":
+            return {"file_id": method.file_id, "file_unique_id": method.file_id,
+                    "file_path": f"documents/{method.file_id}"}
+        if hasattr(method, "chat_id"):
+            return self._store_message(method)
+        raise NotImplementedError(f"Метод {name} не поддерживается")
+
+    def _store_message(self, method: TelegramMethod) -> dict:
+        chat_id = method.chat_id
+        markup = getattr(method, "reply_markup", None)
+        markup = markup.model_dump(mode="json", exclude_none=True) \
+            if isinstance(markup, InlineKeyboardMarkup) else None
+        text = getattr(method, "text", None) or getattr(method, "caption", None)
+
+        message_id = getattr(method, "message_id", None)
+        message = self.messages[chat_id].get(message_id) if message_id is not None else None
+        if message is None:
+            # Новое сообщение (или правка сообщения, которое не отправлялось через эту сессию)
+            message = {
+                "message_id": message_id or next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER,
+            }
+        else:
+            message = dict(message)
+        if text is not None:
+            message["text"] = text
+        # Правка без клавиатуры убирает ее, как и в Telegram
+        message.pop("reply_markup", None)
+        if markup is not None:
+            message["reply_markup"] = markup
+        self.messages[chat_id][message["message_id"]] = message
+        return message
@@ -0,0 +1,360 @@
+"""
+Асинхронные версии функций из database.database для работы через AsyncSession.
+
+Используются в обработчиках с высокой нагрузкой, чтобы запросы к базе данных
+не блокировали цикл событий.
+"""
+from datetime import datetime
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, func, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.database import ADD_TO_TOTALS, INSERT_QUESTIONS, compare_answers, question_cache, poll_cache, \
+    admin_cache, ADMIN_IDS_KEY, QuestionAnswers, PollInfo, PollFinalization, question_rows, finalize_poll_statements, \
+    poll_finalization, unanswered_participants_query, question_response_rows, question_results_query, leaderboard_query
+from database.models import User, Poll, Question, PollResponse, QuestionResponse
+from utils.scoring import DEFAULT_SCORING_POLICY
+
+
+async def create_user(db: AsyncSession, telegram_id: int, username: str, first_name: str,
+                      last_name: str, phone: str, email: str, is_admin: bool = False) -> User:
+    db_user = User(
+        telegram_id=telegram_id,
+        username=username,
+        first_name=first_name,
+        last_name=last_name,
+        phone=phone,
+        email=email,
+        is_admin=is_admin
+    )
+    db.add(db_user)
+    await db.commit()
+    if is_admin:
+        admin_cache.clear()
+    await db.refresh(db_user)
+    return db_user
+
+
+async def get_user_by_telegram_id(db: AsyncSession, telegram_id: int) -> Optional[User]:
+    result = await db.execute(select(User).filter(User.telegram_id == telegram_id))
+    return result.scalars().first()
+
+
+async def get_admins(db: AsyncSession) -> List[User]:
+    result = await db.execute(select(User).filter(User.is_admin == True))  # noqa
+    return list(result.scalars().all())
+
+
+async def add_admin(db: AsyncSession, telegram_id: int) -> Optional[User]:
+    user = await get_user_by_telegram_id(db, telegram_id)
+    if not user:
+        return None
+
+    user.is_admin = True
+    await db.commit()
+    admin_cache.clear()
+    await db.refresh(user)
+    return user
+
+
+async def remove_admin(db: AsyncSession, telegram_id: int) -> Optional[User]:
+    user = await get_user_by_telegram_id(db, telegram_id)
+    if not user:
+        return None
+
+    user.is_admin = False
+    await db.commit()
+    admin_cache.clear()
+    await db.refresh(user)
+    return user
+
+
+async def get_admin_ids(db: AsyncSession) -> FrozenSet[int]:
+    """
+    Возвращает множество telegram_id администраторов (кэшируется).
+    """
+    async def load() -> FrozenSet[int]:
+        result = await db.execute(select(User.telegram_id).filter(User.is_admin == True))  # noqa
+        return frozenset(result.scalars().all())
+
+    return await admin_cache.get_or_load_async(ADMIN_IDS_KEY, load)
+
+
+async def is_admin(db: AsyncSession, telegram_id: int) -> bool:
+    return telegram_id in await get_admin_ids(db)
+
+
+async def get_admin_count(db: AsyncSession) -> int:
+    """
+    Возвращает количество администраторов в системе
+    """
+    result = await db.execute(select(func.count(User.id)).filter(User.is_admin == True))  # noqa
+    return result.scalar_one()
+
+
+async def create_poll_db(db: AsyncSession, title: str, description: str, created_by: int, access_code: str) -> Poll:
+    """
+    Создает новый опрос в базе данных.
+    """
+    db_poll = Poll(
+        title=title,
+        description=description,
+        created_by=created_by,
+        access_code=access_code
+    )
+    db.add(db_poll)
+    await db.commit()
+    poll_cache.invalidate(access_code)
+    await db.refresh(db_poll)
+    return db_poll
+
+
+async def create_question(db: AsyncSession, poll_id: int, text: str, options: list, correct_answers: list,
+                          order: int, scoring_policy: str = DEFAULT_SCORING_POLICY) -> Question:
+    """
+    Создает новый вопрос в базе данных и связывает его с опросом.
+    """
+    db_question = Question(
+        poll_id=poll_id,
+        text=text,
+        options=options,
+        correct_answers=correct_answers,
+        order=order,
+        scoring_policy=scoring_policy
+    )
+    db.add(db_question)
+    await db.commit()
+    await db.refresh(db_question)
+    question_cache.invalidate(db_question.id)
+    return db_question
+
+
+async def create_questions_bulk(db: AsyncSession, poll_id: int, questions: Iterable[dict],
+                                scoring_policy: str = DEFAULT_SCORING_POLICY) -> List[int]:
+    """
+    Добавляет все вопросы опроса одной транзакцией (см. database.create_questions_bulk()).
+    """
+    rows = question_rows(poll_id, questions, scoring_policy)
+    if not rows:
+        return []
+
+    try:
+        question_ids = sorted((await db.scalars(INSERT_QUESTIONS, rows)).all())
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    for question_id in question_ids:
+        question_cache.invalidate(question_id)
+    return question_ids
+
+
+async def get_polls_by_creator(db: AsyncSession, creator_id: int) -> List[Poll]:
+    """
+    Возвращает список опросов, созданных пользователем с указанным ID.
+    """
+    result = await db.execute(select(Poll).filter(Poll.created_by == creator_id))
+    return list(result.scalars().all())
+
+
+async def get_poll_by_access_code(db: AsyncSession, access_code: str) -> Optional[Poll]:
+    """
+    Возвращает опрос по коду доступа.
+    """
+    result = await db.execute(select(Poll).filter(Poll.access_code == access_code))
+    return result.scalars().first()
+
+
+async def get_poll_info_by_access_code(db: AsyncSession, access_code: str) -> Optional[PollInfo]:
+    """
+    Возвращает основные данные опроса по коду доступа (кэшируется).
+    """
+    async def load() -> Optional[PollInfo]:
+        poll = await get_poll_by_access_code(db, access_code)
+        return PollInfo(poll.id, poll.title, poll.description, poll.is_active, poll.access_code) if poll else None
+
+    return await poll_cache.get_or_load_async(access_code, load)
+
+
+async def finalize_poll(db: AsyncSession, poll_id: int) -> Optional[PollFinalization]:
+    """
+    Завершает опрос и возвращает итоги участников (см. database.finalize_poll()).
+    """
+    result = await db.execute(select(Poll.access_code).filter(Poll.id == poll_id))
+    poll = result.first()
+    if not poll:
+        return None
+
+    completed_at = datetime.utcnow()
+    complete_participants, stop_poll = finalize_poll_statements(poll_id, completed_at)
+    try:
+        rows = (await db.execute(complete_participants)).all()
+        await db.execute(stop_poll)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    poll_cache.invalidate(poll.access_code)
+    return poll_finalization(poll_id, completed_at, rows)
+
+
+async def get_leaderboard(db: AsyncSession, poll_id: int, limit: int = 10) -> list:
+    """
+    Возвращает участников с наибольшей суммой баллов.
+    """
+    result = await db.execute(leaderboard_query(poll_id, limit))
+    return list(result.all())
+
+
+async def has_completed_poll(db: AsyncSession, poll_id: int, user_id: int) -> bool:
+    """
+    Проверяет, завершил ли пользователь опрос.
+    """
+    result = await db.execute(
+        select(PollResponse.id).filter(
+            PollResponse.poll_id == poll_id,
+            PollResponse.user_id == user_id,
+            PollResponse.completed_at != None  # noqa
+        ).limit(1)
+    )
+    return result.first() is not None
+
+
+async def create_poll_response(db: AsyncSession, poll_id: int, user_id: int) -> Optional[PollResponse]:
+    """
+    Создает запись об участии пользователя в опросе.
+    """
+    result = await db.execute(
+        select(PollResponse.id).filter(PollResponse.poll_id == poll_id, PollResponse.user_id == user_id).limit(1)
+    )
+    if result.first() is not None:
+        return None
+
+    db_poll_response = PollResponse(
+        poll_id=poll_id,
+        user_id=user_id
+    )
+    db.add(db_poll_response)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Параллельный запрос уже создал запись (уникальный индекс poll_id, user_id)
+        await db.rollback()
+        return None
+    await db.refresh(db_poll_response)
+    return db_poll_response
+
+
+async def get_question_answers(db: AsyncSession, question_id: int) -> Optional[QuestionAnswers]:
+    """
+    Возвращает варианты и правильные ответы вопроса (кэшируется).
+    """
+    async def load() -> Optional[QuestionAnswers]:
+        result = await db.execute(
+            select(Question.options, Question.correct_answers).filter(Question.id == question_id)
+        )
+        row = result.first()
+        return QuestionAnswers(row.options or [], row.correct_answers or []) if row else None
+
+    # Одновременные нажатия после рассылки вопроса ждут один запрос
+    return await question_cache.get_or_load_async(question_id, load)
+
+
+async def get_answer_options(db: AsyncSession, question_id: int) -> List[str]:
+    """
+    Возвращает список вариантов ответов для вопроса.
+    """
+    answers = await get_question_answers(db, question_id)
+    return answers.options if answers else []
+
+
+async def get_users_by_poll_id(db: AsyncSession, poll_id: int, is_poll_finished: bool = False) -> List[int]:
+    """
+    Возвращает список ID пользователей опроса.
+
+    Args:
+        db: SQLAlchemy AsyncSession.
+        poll_id: ID опроса.
+        is_poll_finished: Флаг для фильтрации пользователей.
+            - False: Только активные пользователи (не завершившие опрос).
+            - True: Все пользователи, включая завершивших опрос.
+
+    Returns:
+        List[int]: Список ID пользователей.
+    """
+    query = select(PollResponse.user_id).filter(PollResponse.poll_id == poll_id)
+
+    if not is_poll_finished:
+        # Фильтруем только активные опросы (не завершенные)
+        query = query.filter(PollResponse.completed_at == None)  # noqa
+
+    result = await db.execute(query)
+    return list(result.scalars().all())
+
+
+async def create_question_response(db: AsyncSession, poll_id: int, user_id: int,
+                                   question_id: int, selected_answers: list) -> QuestionResponse:
+    """
+    Создает запись об ответе пользователя на вопрос с автоматической проверкой
+    """
+    result = await db.execute(
+        select(Question.correct_answers, Question.scoring_policy).filter(Question.id == question_id)
+    )
+    question = result.first()
+    correct_answers = (question.correct_answers or []) if question else []
+    policy = question.scoring_policy if question else DEFAULT_SCORING_POLICY
+
+    score = compare_answers(selected_answers, correct_answers, policy)
+
+    result = await db.execute(
+        select(PollResponse.id).filter(PollResponse.poll_id == poll_id, PollResponse.user_id == user_id)
+    )
+    poll_response_id = result.scalar()
+
+    db_question_response = QuestionResponse(
+        poll_response_id=poll_response_id,
+        question_id=question_id,
+        selected_answers=selected_answers,
+        score=score
+    )
+    db.add(db_question_response)
+    # Итоги участника обновляются в той же транзакции
+    await db.execute(ADD_TO_TOTALS, {"poll_response_id": poll_response_id, "score": score,
+                                     "answered": int(bool(selected_answers))})
+    await db.commit()
+    await db.refresh(db_question_response)
+    return db_question_response
+
+
+async def create_question_responses_bulk(db: AsyncSession, poll_id: int, question_id: int,
+                                         answers: Dict[int, list]) -> int:
+    """
+    Сохраняет ответы участников на вопрос одной транзакцией (см. database.create_question_responses_bulk()).
+    """
+    participants = (await db.execute(unanswered_participants_query(poll_id, question_id))).all()
+    if not participants:
+        return 0
+
+    rows, totals = question_response_rows(participants, question_id, answers)
+    try:
+        await db.execute(insert(QuestionResponse), rows)
+        if totals:
+            await db.execute(ADD_TO_TOTALS, totals)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return len(rows)
+
+
+async def get_question_results(db: AsyncSession, poll_id: int, question_id: int) -> Dict[int, Tuple[list, float]]:
+    """
+    Возвращает ответы участников на вопрос и их баллы одним запросом.
+
+    Returns:
+        Dict[int, Tuple[list, float]]: (выбранные ответы, балл) по ID пользователей.
+    """
+    result = await db.execute(question_results_query(poll_id, question_id))
+    return {user_id: (selected_answers, score) for user_id, selected_answers, score in result}
@@ -0,0 +1,21 @@
+"""
+Пересчет PollResponse.total_score и answered_count по сохраненным ответам.
+
+Запуск: python -m database.backfill_totals [poll_id]
+"""
+import sys
+
+from database.database import SessionLocal, recalculate_poll_totals
+
+
+def backfill_totals(poll_id=None) -> int:
+    db = SessionLocal()
+    try:
+        return recalculate_poll_totals(db, poll_id)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    updated = backfill_totals(int(sys.argv[1]) if len(sys.argv) > 1 else None)
+    print(f"Обновлено записей: {updated}")
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Ограниченный по размеру LRU-кэш с временем жизни записей.
+
+    Используется для сущностей, которые не меняются во время проведения
+    опроса. Записи вытесняются при превышении maxsize (давно не
+    использованные первыми), по истечении ttl или явным вызовом invalidate().
+
+    Одновременные промахи по одному ключу в get_or_load() и
+    get_or_load_async() выполняют одну загрузку: остальные вызовы ждут ее
+    и берут значение из кэша.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loads: Dict[Hashable, threading.Lock] = {}
+        self._async_loads: Dict[Hashable, asyncio.Lock] = {}
+
+    def _peek(self, key: Hashable) -> Any:
+        """
+        Возвращает действующее значение без учета в статистике.
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] > time.monotonic():
+                return item[0]
+            return None
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires_at = item
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Возвращает значение из кэша или загружает его через loader.
+        Значения None не кэшируются.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            load_lock = self._loads.setdefault(key, threading.Lock())
+        with load_lock:
+            # Пока ждали, значение мог загрузить другой поток
+            value = self._peek(key)
+            if value is None:
+                value = loader()
+                if value is not None:
+                    self.set(key, value)
+        with self._lock:
+            if self._loads.get(key) is load_lock and not load_lock.locked():
+                del self._loads[key]
+        return value
+
+    async def get_or_load_async(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Асинхронный вариант get_or_load() для загрузки через AsyncSession.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        load_lock = self._async_loads.setdefault(key, asyncio.Lock())
+        async with load_lock:
+            value = self._peek(key)
+            if value is None:
+                value = await loader()
+                if value is not None:
+                    self.set(key, value)
+        if self._async_loads.get(key) is load_lock and not load_lock.locked():
+            del self._async_loads[key]
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "hit_ratio": self.hits / total if total else None,
+        }
@@ -1,15 +1,95 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime
+from sqlalchemy import and_, bindparam, cast, func, insert, select, update, Column, Integer, String, Boolean, \
+    DateTime
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from database.engine import get_database_url, get_async_database_url, create_db_engine, create_async_db_engine
 from database.models import Base, User, Poll, Question, PollResponse, QuestionResponse
+from database.cache import TTLCache
+from utils.metrics import CallbackMetric, registry
+from utils.scoring import DEFAULT_SCORING_POLICY, QuestionScorer, score_answer
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional
+import os
 
-DATABASE_URL = "sqlite:///opros_bot.db"
+DATABASE_URL = get_database_url()
 
-engine = create_engine(DATABASE_URL)
+engine = create_db_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+ASYNC_DATABASE_URL = get_async_database_url()
+
+async_engine = create_async_db_engine(ASYNC_DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+ENTITY_CACHE_SIZE = int(os.getenv("ENTITY_CACHE_SIZE", "1024"))
+ENTITY_CACHE_TTL = float(os.getenv("ENTITY_CACHE_TTL", "300"))
+
+
+class QuestionAnswers(NamedTuple):
+    options: list
+    correct_answers: list
+
+
+class PollInfo(NamedTuple):
+    id: int
+    title: str
+    description: str
+    is_active: bool
+    access_code: str
+
+
+class ParticipantTotal(NamedTuple):
+    user_id: int
+    total_score: float
+    answered_count: int
+
+
+class PollFinalization(NamedTuple):
+    """
+    Итоги завершенного опроса: участники, завершившие его этим вызовом, и их баллы.
+    """
+    poll_id: int
+    completed_at: datetime
+    participants: List[ParticipantTotal]
+
+    @property
+    def completed_count(self) -> int:
+        return len(self.participants)
+
+    @property
+    def average_score(self) -> float:
+        if not self.participants:
+            return 0.0
+        return sum(participant.total_score for participant in self.participants) / len(self.participants)
+
+
+# Кэши сущностей, которые не меняются во время проведения опроса.
+# Записи сбрасываются функциями, изменяющими эти сущности, и в любом случае
+# живут не дольше ENTITY_CACHE_TTL секунд. Значения из кэша нельзя изменять.
+question_cache = TTLCache("questions", ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL)
+poll_cache = TTLCache("polls", ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL)
+admin_cache = TTLCache("admins", 1, ENTITY_CACHE_TTL)
+ADMIN_IDS_KEY = "admin_ids"
+
+
+def cache_stats() -> Dict[str, dict]:
+    """
+    Возвращает количество попаданий и промахов для каждого кэша.
+    """
+    return {cache.name: cache.stats() for cache in (question_cache, poll_cache, admin_cache)}
+
+
+CACHE_REQUESTS = registry.register(CallbackMetric(
+    "bot_cache_requests_total", "Обращения к кэшам сущностей по результату", ("cache", "result"),
+    callback=lambda: {(name, result): stats[result] for name, stats in cache_stats().items()
+                      for result in ("hits", "misses")},
+    kind="counter"))
+CACHE_SIZE = registry.register(CallbackMetric(
+    "bot_cache_size", "Количество записей в кэшах сущностей", ("cache",),
+    callback=lambda: {(name,): stats["size"] for name, stats in cache_stats().items()}))
+
 
 def get_db():
     db = SessionLocal()
@@ -19,6 +99,11 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def create_user(db, telegram_id: int, username: str, first_name: str,
                 last_name: str, phone: str, email: str, is_admin: bool = False):
     db_user = User(
@@ -32,6 +117,8 @@ def create_user(db, telegram_id: int, username: str, first_name: str,
     )
     db.add(db_user)
     db.commit()
+    if is_admin:
+        admin_cache.clear()
     db.refresh(db_user)
     return db_user
 
@@ -51,6 +138,7 @@ def add_admin(db, telegram_id: int) -> Optional[User]:
 
     user.is_admin = True
     db.commit()
+    admin_cache.clear()
     db.refresh(user)
     return user
 
@@ -62,6 +150,7 @@ def remove_admin(db, telegram_id: int) -> Optional[User]:
 
     user.is_admin = False
     db.commit()
+    admin_cache.clear()
     db.refresh(user)
     return user
 
@@ -70,9 +159,18 @@ from database.models import Poll
 import secrets
 
 
+def get_admin_ids(db: Session) -> FrozenSet[int]:
+    """
+    Возвращает множество telegram_id администраторов (кэшируется).
+    """
+    return admin_cache.get_or_load(
+        ADMIN_IDS_KEY,
+        lambda: frozenset(row.telegram_id for row in db.query(User.telegram_id).filter(User.is_admin == True))  # noqa
+    )
+
+
 def is_admin(db, telegram_id: int) -> bool:
-    user = get_user_by_telegram_id(db, telegram_id)
-    return user.is_admin if user else False
+    return telegram_id in get_admin_ids(db)
 
 
 def get_admin_count(db: Session) -> int:
@@ -94,11 +192,13 @@ def create_poll_db(db: Session, title: str, description: str, created_by: int, a
     )
     db.add(db_poll)
     db.commit()
+    poll_cache.invalidate(access_code)
     db.refresh(db_poll)
     return db_poll
 
 
-def create_question(db: Session, poll_id: int, text: str, options: list, correct_answers: list, order: int):
+def create_question(db: Session, poll_id: int, text: str, options: list, correct_answers: list, order: int,
+                    scoring_policy: str = DEFAULT_SCORING_POLICY):
     """
     Создает новый вопрос в базе данных и связывает его с опросом.
     """
@@ -107,14 +207,73 @@ def create_question(db: Session, poll_id: int, text: str, options: list, correct
         text=text,
         options=options,
         correct_answers=correct_answers,
-        order=order
+        order=order,
+        scoring_policy=scoring_policy
     )
     db.add(db_question)
     db.commit()
     db.refresh(db_question)
+    question_cache.invalidate(db_question.id)
     return db_question
 
 
+# Пакетная вставка вопросов, возвращает их ID
+INSERT_QUESTIONS = insert(Question).returning(Question.id)
+
+
+def question_rows(poll_id: int, questions: Iterable[dict],
+                  scoring_policy: str = DEFAULT_SCORING_POLICY) -> List[dict]:
+    """
+    Преобразует вопросы в формате parse_poll() в строки для INSERT_QUESTIONS.
+    """
+    return [
+        {
+            "poll_id": poll_id,
+            "text": question["text"],
+            "options": question["options"],
+            "correct_answers": question["correct_answers"],
+            "order": question["order"],
+            "scoring_policy": question.get("scoring_policy", scoring_policy),
+        }
+        for question in questions
+    ]
+
+
+def create_questions_bulk(db: Session, poll_id: int, questions: Iterable[dict],
+                          scoring_policy: str = DEFAULT_SCORING_POLICY) -> List[int]:
+    """
+    Добавляет все вопросы опроса одной транзакцией.
+
+    Вопросы вставляются одним пакетным INSERT ... RETURNING без загрузки
+    объектов обратно; при ошибке не сохраняется ни один вопрос.
+
+    Args:
+        db: SQLAlchemy Session.
+        poll_id: ID опроса.
+        questions: Вопросы в формате parse_poll(): text, options, correct_answers,
+            order и, при необходимости, scoring_policy.
+        scoring_policy: Правило подсчета баллов для вопросов без scoring_policy.
+
+    Returns:
+        List[int]: ID созданных вопросов в порядке questions.
+    """
+    rows = question_rows(poll_id, questions, scoring_policy)
+    if not rows:
+        return []
+
+    try:
+        # Все строки вставляются в одной транзакции, поэтому их ID растут в порядке rows.
+        # sort_by_parameter_order не используется: на SQLite он разбивает вставку на отдельные INSERT
+        question_ids = sorted(db.scalars(INSERT_QUESTIONS, rows))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    for question_id in question_ids:
+        question_cache.invalidate(question_id)
+    return question_ids
+
+
 def get_polls_by_creator(db: Session, creator_id: int) -> List[Poll]:
     """
     Возвращает список опросов, созданных пользователем с указанным ID.
@@ -129,6 +288,96 @@ def get_poll_by_access_code(db: Session, access_code: str) -> Optional[Poll]:
     return db.query(Poll).filter(Poll.access_code == access_code).first()
 
 
+def get_poll_info_by_access_code(db: Session, access_code: str) -> Optional[PollInfo]:
+    """
+    Возвращает основные данные опроса по коду доступа (кэшируется).
+    """
+    def load() -> Optional[PollInfo]:
+        poll = get_poll_by_access_code(db, access_code)
+        return PollInfo(poll.id, poll.title, poll.description, poll.is_active, poll.access_code) if poll else None
+
+    return poll_cache.get_or_load(access_code, load)
+
+
+def set_poll_active(db: Session, poll_id: int, is_active: bool) -> Optional[Poll]:
+    """
+    Запускает или останавливает опрос.
+    """
+    poll = db.query(Poll).filter(Poll.id == poll_id).first()
+    if not poll:
+        return None
+
+    poll.is_active = is_active
+    db.commit()
+    poll_cache.invalidate(poll.access_code)
+    return poll
+
+
+def finalize_poll(db: Session, poll_id: int) -> Optional[PollFinalization]:
+    """
+    Завершает опрос: отмечает участников завершившими и останавливает опрос.
+
+    Оба изменения выполняются двумя UPDATE в одной транзакции независимо от
+    количества участников. Итоги завершенных участников (накопленные
+    PollResponse.total_score и answered_count) возвращает сам UPDATE через
+    RETURNING, поэтому они не ищутся повторно по отметке времени. Повторный
+    вызов не затрагивает уже завершивших участников и возвращает пустой список.
+
+    Args:
+        db: SQLAlchemy Session.
+        poll_id: ID опроса.
+
+    Returns:
+        Optional[PollFinalization]: Итоги опроса или None, если опрос не найден.
+    """
+    poll = db.query(Poll.access_code).filter(Poll.id == poll_id).first()
+    if not poll:
+        return None
+
+    completed_at = datetime.utcnow()
+    complete_participants, stop_poll = finalize_poll_statements(poll_id, completed_at)
+    try:
+        rows = db.execute(complete_participants).all()
+        db.execute(stop_poll)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    poll_cache.invalidate(poll.access_code)
+    return poll_finalization(poll_id, completed_at, rows)
+
+
+def finalize_poll_statements(poll_id: int, completed_at: datetime) -> tuple:
+    """
+    Возвращает UPDATE участников (с RETURNING их итогов) и UPDATE опроса для finalize_poll().
+    """
+    complete_participants = (
+        update(PollResponse)
+        .where(PollResponse.poll_id == poll_id, PollResponse.completed_at == None)  # noqa
+        .values(completed_at=completed_at)
+        .returning(PollResponse.id, PollResponse.user_id, PollResponse.total_score, PollResponse.answered_count)
+        .execution_options(synchronize_session=False)
+    )
+    stop_poll = (
+        update(Poll)
+        .where(Poll.id == poll_id)
+        .values(is_active=False)
+        .execution_options(synchronize_session=False)
+    )
+    return complete_participants, stop_poll
+
+
+def poll_finalization(poll_id: int, completed_at: datetime, rows: Iterable) -> PollFinalization:
+    """
+    Собирает итоги опроса из строк, которые вернул UPDATE участников.
+    """
+    participants = [
+        ParticipantTotal(row.user_id, row.total_score or 0.0, row.answered_count or 0)
+        for row in sorted(rows, key=lambda row: row.id)
+    ]
+    return PollFinalization(poll_id, completed_at, participants)
+
+
 def create_poll_response(db: Session, poll_id: int, user_id: int):
     """
     Создает запись об участии пользователя в опросе.
@@ -143,20 +392,83 @@ def create_poll_response(db: Session, poll_id: int, user_id: int):
         user_id=user_id
     )
     db.add(db_poll_response)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # Параллельный запрос уже создал запись (уникальный индекс poll_id, user_id)
+        db.rollback()
+        return None
     db.refresh(db_poll_response)
     return db_poll_response
 
 
+def get_question_answers(db: Session, question_id: int) -> Optional[QuestionAnswers]:
+    """
+    Возвращает варианты и правильные ответы вопроса (кэшируется).
+    """
+    def load() -> Optional[QuestionAnswers]:
+        row = db.query(Question.options, Question.correct_answers).filter(Question.id == question_id).first()
+        return QuestionAnswers(row.options or [], row.correct_answers or []) if row else None
+
+    return question_cache.get_or_load(question_id, load)
+
+
 def get_answer_options(db: Session, question_id: int) -> List[str]:
     """
     Возвращает список вариантов ответов для вопроса.
     """
-    question = db.query(Question).filter(Question.id == question_id).first()
-    if question:
-        return question.options
-    else:
-        return []
+    answers = get_question_answers(db, question_id)
+    return answers.options if answers else []
+
+
+# Прибавляет балл за ответ к итогам участника; выполняется пакетом по списку параметров
+ADD_TO_TOTALS = (
+    update(PollResponse.__table__)
+    .where(PollResponse.__table__.c.id == bindparam("poll_response_id"))
+    .values(total_score=PollResponse.__table__.c.total_score + bindparam("score"),
+            answered_count=PollResponse.__table__.c.answered_count + bindparam("answered"))
+)
+
+
+def recalculate_poll_totals(db: Session, poll_id: Optional[int] = None) -> int:
+    """
+    Пересчитывает итоги участников по сохраненным ответам.
+
+    Args:
+        db: SQLAlchemy Session.
+        poll_id: ID опроса или None для всех опросов.
+
+    Returns:
+        int: Количество обновленных записей PollResponse.
+    """
+    responses = QuestionResponse.poll_response_id == PollResponse.id
+    total_score = select(func.coalesce(func.sum(QuestionResponse.score), 0.0)).where(responses)
+    answered_count = select(func.count(QuestionResponse.id)).where(
+        responses, cast(QuestionResponse.selected_answers, String) != '[]'
+    )
+    query = update(PollResponse).values(
+        total_score=total_score.scalar_subquery(),
+        answered_count=answered_count.scalar_subquery()
+    )
+    if poll_id is not None:
+        query = query.where(PollResponse.poll_id == poll_id)
+    try:
+        updated = db.execute(query.execution_options(synchronize_session=False)).rowcount
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return updated
+
+
+def get_leaderboard(db: Session, poll_id: int, limit: int = 10) -> list:
+    """
+    Возвращает участников с наибольшей суммой баллов.
+
+    Returns:
+        list: Строки (user_id, first_name, last_name, total_score, answered_count).
+    """
+    return db.execute(leaderboard_query(poll_id, limit)).all()
 
 
 def get_users_by_poll_id(db: Session, poll_id: int, is_poll_finished: bool = False) -> List[int]:
@@ -190,9 +502,10 @@ def create_question_response(db: Session, poll_id: int, user_id: int,
     # Получаем правильные ответы из вопроса
     question = db.query(Question).filter(Question.id == question_id).first()
     correct_answers = question.correct_answers if question else []
+    policy = question.scoring_policy if question else DEFAULT_SCORING_POLICY
 
     # Вычисляем балл за ответ
-    score = compare_answers(selected_answers, correct_answers)
+    score = compare_answers(selected_answers, correct_answers, policy)
 
     # Получаем PollResponse
     poll_response = db.query(PollResponse) \
@@ -208,47 +521,120 @@ def create_question_response(db: Session, poll_id: int, user_id: int,
         score=score
     )
     db.add(db_question_response)
+    # Итоги участника обновляются в той же транзакции
+    poll_response.total_score = PollResponse.total_score + score
+    poll_response.answered_count = PollResponse.answered_count + bool(selected_answers)
     db.commit()
     db.refresh(db_question_response)
     return db_question_response
 
 
-import logging
+def create_question_responses_bulk(db: Session, poll_id: int, question_id: int,
+                                   answers: Dict[int, list]) -> int:
+    """
+    Сохраняет ответы всех активных участников опроса на вопрос одной транзакцией.
 
+    Вопрос и ID записей PollResponse загружаются одним запросом, баллы
+    считаются одним вызовом QuestionScorer, записи QuestionResponse
+    вставляются пакетно. Итоги участников (PollResponse.total_score и
+    answered_count) обновляются в той же транзакции.
+    Участники, которых нет в answers, получают пустой ответ; уже сохраненные
+    ответы на этот вопрос не перезаписываются.
 
-def compare_answers(selected: list, correct: list) -> float:
-    """
-    Сравнивает выбранные ответы с правильными и возвращает балл.
-    :param selected: список выбранных пользователем ответов
-    :param correct: список правильных ответов
-    :return: балл за ответ
+    Args:
+        db: SQLAlchemy Session.
+        poll_id: ID опроса.
+        question_id: ID вопроса.
+        answers: Выбранные ответы по ID пользователей.
+
+    Returns:
+        int: Количество сохраненных ответов.
     """
-    # Логирование входных данных
-    logging.info(f"compare_answers: selected={selected}, correct={correct}")
+    participants = db.execute(unanswered_participants_query(poll_id, question_id)).all()
+    if not participants:
+        return 0
 
-    # Если нет правильных ответов, возвращаем 0 баллов
-    if not correct:
-        logging.info("compare_answers: no correct answers provided, returning score=0.0")
-        return 0.0
+    rows, totals = question_response_rows(participants, question_id, answers)
+    try:
+        db.execute(insert(QuestionResponse), rows)
+        if totals:
+            db.execute(ADD_TO_TOTALS, totals)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(rows)
 
-    # Подсчет количества правильных ответов
-    correct_count = len(set(selected) & set(correct))
-    logging.info(f"compare_answers: correct_count={correct_count}")
 
-    # Подсчет количества неправильных ответов
-    incorrect_count = len(selected) - correct_count
-    logging.info(f"compare_answers: incorrect_count={incorrect_count}")
+def unanswered_participants_query(poll_id: int, question_id: int):
+    """
+    Активные участники опроса без сохраненного ответа на вопрос вместе с данными вопроса.
+    """
+    return (select(PollResponse.id, PollResponse.user_id, Question.correct_answers,
+                   Question.options, Question.scoring_policy)
+            .join(Question, Question.poll_id == PollResponse.poll_id)
+            .outerjoin(QuestionResponse, and_(QuestionResponse.poll_response_id == PollResponse.id,
+                                              QuestionResponse.question_id == question_id))
+            .filter(Question.id == question_id,
+                    PollResponse.poll_id == poll_id,
+                    PollResponse.completed_at == None,  # noqa
+                    QuestionResponse.id == None))  # noqa
+
+
+def question_response_rows(participants: list, question_id: int, answers: Dict[int, list]) -> tuple:
+    """
+    Считает баллы участников и возвращает строки QuestionResponse и параметры ADD_TO_TOTALS.
+    """
+    question = participants[0]
+    scorer = QuestionScorer(question.correct_answers or [], question.options or [],
+                            question.scoring_policy or DEFAULT_SCORING_POLICY)
+    selected = {row.id: answers.get(row.user_id, []) for row in participants}
+    scores = scorer.score_many(selected)
+    rows = [
+        {
+            "poll_response_id": poll_response_id,
+            "question_id": question_id,
+            "selected_answers": selected_answers,
+            "score": scores[poll_response_id],
+        }
+        for poll_response_id, selected_answers in selected.items()
+    ]
+
+    totals = [
+        {"poll_response_id": row["poll_response_id"], "score": row["score"], "answered": 1}
+        for row in rows if row["selected_answers"]
+    ]
+    return rows, totals
+
+
+def question_results_query(poll_id: int, question_id: int):
+    """
+    Ответы участников на вопрос с баллами: строки (user_id, selected_answers, score).
+    """
+    return (select(PollResponse.user_id, QuestionResponse.selected_answers, QuestionResponse.score)
+            .join(QuestionResponse, QuestionResponse.poll_response_id == PollResponse.id)
+            .filter(PollResponse.poll_id == poll_id, QuestionResponse.question_id == question_id))
 
-    # Вычисление веса одного правильного ответа
-    weight = 1 / len(correct)
-    logging.info(f"compare_answers: weight={weight}")
 
-    # Вычисление балла
-    score = (correct_count * weight) - (incorrect_count * weight)
-    logging.info(f"compare_answers: raw_score={score}")
+def leaderboard_query(poll_id: int, limit: int):
+    """
+    Участники с наибольшей суммой баллов (см. get_leaderboard()).
+    """
+    return (select(PollResponse.user_id, User.first_name, User.last_name,
+                   PollResponse.total_score, PollResponse.answered_count)
+            .outerjoin(User, User.telegram_id == PollResponse.user_id)
+            .filter(PollResponse.poll_id == poll_id)
+            .order_by(PollResponse.total_score.desc())
+            .limit(limit))
 
-    # Ограничение балла минимальным значением 0
-    final_score = max(0.0, score)
-    logging.info(f"compare_answers: final_score={final_score}")
 
-    return final_score
+def compare_answers(selected: list, correct: list, policy: str = DEFAULT_SCORING_POLICY) -> float:
+    """
+    Сравнивает выбранные ответы с правильными и возвращает балл.
+    Для нескольких ответов на один вопрос используйте utils.scoring.QuestionScorer.
+    :param selected: список выбранных пользователем ответов
+    :param correct: список правильных ответов
+    :param policy: политика подсчета баллов
+    :return: балл за ответ
+    """
+    return score_answer(selected, correct, policy)
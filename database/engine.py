@@ -0,0 +1,116 @@
+"""
+Фабрика движков SQLAlchemy, настраиваемая через переменные окружения.
+
+DATABASE_URL           - адрес базы данных (по умолчанию sqlite:///opros_bot.db)
+ASYNC_DATABASE_URL     - адрес для асинхронного движка (по умолчанию выводится из DATABASE_URL)
+DB_POOL_SIZE           - размер пула соединений серверной БД
+DB_MAX_OVERFLOW        - количество соединений сверх размера пула
+DB_POOL_RECYCLE        - время жизни соединения в секундах
+SQLITE_JOURNAL_MODE    - режим журнала SQLite (WAL)
+SQLITE_SYNCHRONOUS     - режим синхронизации SQLite (NORMAL)
+SQLITE_BUSY_TIMEOUT    - ожидание блокировки SQLite в миллисекундах
+SQLITE_CACHE_SIZE      - размер кэша страниц SQLite (отрицательное значение - в КиБ)
+SQLITE_MMAP_SIZE       - размер отображаемой в память области SQLite в байтах
+"""
+import os
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+DEFAULT_DATABASE_URL = "sqlite:///opros_bot.db"
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def get_database_url() -> str:
+    return os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL)
+
+
+def get_async_database_url(url: Optional[str] = None) -> str:
+    """
+    Возвращает адрес базы данных с асинхронным драйвером.
+    """
+    if url is None:
+        async_url = os.getenv("ASYNC_DATABASE_URL")
+        if async_url:
+            return async_url
+        url = get_database_url()
+
+    parsed = make_url(url)
+    async_driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if async_driver is None or parsed.drivername != parsed.get_backend_name():
+        # Драйвер указан явно - оставляем как есть
+        return url
+    return parsed.set(drivername=async_driver).render_as_string(hide_password=False)
+
+
+def get_sqlite_pragmas() -> Dict[str, str]:
+    return {
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT", "5000"),
+        "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-64000"),
+        "mmap_size": os.getenv("SQLITE_MMAP_SIZE", "268435456"),
+    }
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in get_sqlite_pragmas().items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def get_engine_options(url: str) -> Dict[str, Any]:
+    """
+    Возвращает параметры пула соединений для create_engine.
+
+    Для SQLite параметры пула не задаются: соединения дешевые, а параллельную
+    запись ограничивает сама база данных.
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": True,
+    }
+
+
+def _with_engine_options(url: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    if "poolclass" in kwargs:
+        return kwargs
+    return {**get_engine_options(url), **kwargs}
+
+
+def create_db_engine(url: Optional[str] = None, **kwargs) -> Engine:
+    """
+    Создает синхронный движок SQLAlchemy.
+
+    Для SQLite при каждом подключении применяются PRAGMA из get_sqlite_pragmas().
+    """
+    url = url or get_database_url()
+    engine = create_engine(url, **_with_engine_options(url, kwargs))
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+def create_async_db_engine(url: Optional[str] = None, **kwargs) -> AsyncEngine:
+    """
+    Создает асинхронный движок SQLAlchemy с теми же настройками, что и create_db_engine.
+    """
+    url = get_async_database_url(url)
+    engine = create_async_engine(url, **_with_engine_options(url, kwargs))
+    if engine.dialect.name == "sqlite":
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return engine
@@ -1,11 +1,10 @@
-from sqlalchemy import create_engine
+from database.engine import create_db_engine
 from database.models import Base
 
-DATABASE_URL = "sqlite:///opros_bot.db"
-
 def init_db():
-    engine = create_engine(DATABASE_URL)
+    engine = create_db_engine()
     Base.metadata.create_all(engine)
+    engine.dispose()
 
 if __name__ == "__main__":
-    init_db() 
\ No newline at end of file
+    init_db() 
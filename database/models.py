@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, JSON, Float
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, JSON, Float, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -16,7 +16,7 @@ class User(Base):
     last_name = Column(String)
     phone = Column(String)
     email = Column(String)
-    is_admin = Column(Boolean, default=False)
+    is_admin = Column(Boolean, default=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     responses = relationship("PollResponse", back_populates="user")
@@ -28,7 +28,7 @@ class Poll(Base):
     id = Column(Integer, primary_key=True)
     title = Column(String)
     description = Column(String)
-    created_by = Column(Integer, ForeignKey('users.id'))
+    created_by = Column(Integer, ForeignKey('users.id'), index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     is_active = Column(Boolean, default=False)
     access_code = Column(String, unique=True)
@@ -39,6 +39,10 @@ class Poll(Base):
 
 class Question(Base):
     __tablename__ = 'questions'
+    __table_args__ = (
+        # Не уникальный: повторная загрузка вопросов в опрос снова нумерует их с 1
+        Index('ix_questions_poll_id_order', 'poll_id', 'order'),
+    )
 
     id = Column(Integer, primary_key=True)
     poll_id = Column(Integer, ForeignKey('polls.id'))
@@ -47,6 +51,7 @@ class Question(Base):
     correct_answers = Column(JSON)  # Список правильных ответов
     order = Column(Integer)  # Порядок вопроса в опросе
     is_active = Column(Boolean, default=True)
+    scoring_policy = Column(String, nullable=False, default='partial', server_default='partial')  # См. utils/scoring.py
 
     poll = relationship("Poll", back_populates="questions")
     responses = relationship("QuestionResponse", back_populates="question")
@@ -54,12 +59,19 @@ class Question(Base):
 
 class PollResponse(Base):
     __tablename__ = 'poll_responses'
+    __table_args__ = (
+        Index('ix_poll_responses_poll_id_user_id', 'poll_id', 'user_id', unique=True),
+        Index('ix_poll_responses_poll_id_total_score', 'poll_id', 'total_score'),
+    )
 
     id = Column(Integer, primary_key=True)
     poll_id = Column(Integer, ForeignKey('polls.id'))
     user_id = Column(Integer, ForeignKey('users.id'))
     started_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime)
+    # Сумма баллов и количество отвеченных вопросов; обновляются вместе с вставкой QuestionResponse
+    total_score = Column(Float, nullable=False, default=0.0, server_default='0')
+    answered_count = Column(Integer, nullable=False, default=0, server_default='0')
 
     poll = relationship("Poll", back_populates="responses")
     user = relationship("User", back_populates="responses")
@@ -68,6 +80,9 @@ class PollResponse(Base):
 
 class QuestionResponse(Base):
     __tablename__ = 'question_responses'
+    __table_args__ = (
+        Index('ix_question_responses_poll_response_id_question_id', 'poll_response_id', 'question_id', unique=True),
+    )
 
     id = Column(Integer, primary_key=True)
     poll_response_id = Column(Integer, ForeignKey('poll_responses.id'))
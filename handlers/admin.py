@@ -1,8 +1,7 @@
-from datetime import datetime
+import asyncio
+import os
 
-from sqlalchemy import func
-
-from database.models import Poll, PollResponse, QuestionResponse
+from database.models import Poll
 from keyboards.reply import get_admin_start_inline_keyboard, get_add_questions_keyboard, \
     get_admin_question_control_keyboard, get_admin_control_keyboard
 from aiogram import Router, types, F, Bot
@@ -10,21 +9,42 @@ from aiogram.filters import Command
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardRemove
 from aiogram.fsm.context import FSMContext
 from database.database import get_db, get_user_by_telegram_id, is_admin, add_admin, remove_admin, get_admin_count, \
-    get_admins, create_poll_db, create_question, get_polls_by_creator, get_users_by_poll_id, create_question_response
+    get_admins, create_poll_db, get_polls_by_creator, get_users_by_poll_id, set_poll_active
+from database import async_database
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from states.admin_states import AdminStates
 from states.poll_states import CreatePollStates
 from utils.message_exception_translator import translate_exception
-from utils.poll_parser import parse_poll_from_file
+from utils.poll_parser import PollParseError, parse_poll_from_file
+from utils.question_upload import FileTooLargeError, download_questions
 import logging
 from keyboards.reply import get_polls_keyboard, get_send_first_question_keyboard
-from handlers.poll import send_question, send_results_for_question, TEMP_ANSWERS
+from handlers.poll import send_question, send_results_for_question, ANSWER_BUFFER
 from database.models import Question
-from utils.report_generator import generate_excel_report
-from aiogram.types import BufferedInputFile
+from utils.report_executor import report_executor, ReportQueueFullError
+from aiogram.types import FSInputFile
 from aiogram.exceptions import TelegramForbiddenError
+from utils.broadcaster import broadcaster, BroadcastStats
+from utils.dashboard import Dashboard, dashboards, render_dashboard
+
+logger = logging.getLogger(__name__)
+
+admin_router = Router(name="admin")
+
+# Сколько ошибок разбора вопросов показывать в одном сообщении
+MAX_PARSE_ERRORS_SHOWN = 20
+
 
-admin_router = Router()
+def format_parse_errors(error: PollParseError) -> str:
+    """
+    Формирует переведенный список ошибок разбора вопросов для администратора.
+    """
+    lines = [translate_exception(str(parse_error)) for parse_error in error.errors[:MAX_PARSE_ERRORS_SHOWN]]
+    hidden = len(error.errors) - MAX_PARSE_ERRORS_SHOWN
+    if hidden > 0:
+        lines.append(f"... и еще {hidden}")
+    return f"Найдено ошибок: {len(error.errors)}\n" + "\n".join(lines)
 
 
 def get_confirm_keyboard(action: str) -> InlineKeyboardMarkup:
@@ -80,7 +100,7 @@ async def admin_command(message: types.Message, db: Session):
 
 
 @admin_router.message(CreatePollStates.waiting_for_questions_text, F.text)
-async def process_questions_text(message: types.Message, state: FSMContext, db: Session):
+async def process_questions_text(message: types.Message, state: FSMContext, adb: AsyncSession):
     data = await state.get_data()
     poll_id = data.get('poll_id')
     if not poll_id:
@@ -91,19 +111,16 @@ async def process_questions_text(message: types.Message, state: FSMContext, db:
     file_content = message.text
     try:
         questions = parse_poll_from_file(file_content)
-    except ValueError as e:
-        translated_error_message = translate_exception(str(e))
-        logging.error(f"Ошибка при обработке текста с вопросами: {e}")
+    except PollParseError as e:
+        logger.error("Ошибка при обработке текста с вопросами: %s", e)
         await message.answer(
-            f"❌ Произошла ошибка: {translated_error_message}. "
+            f"❌ {format_parse_errors(e)}\n"
             "Пожалуйста, исправьте текст и отправьте его снова.",
             reply_markup=ReplyKeyboardRemove()
         )
         return
 
-    for question_data in questions:
-        create_question(db, poll_id, question_data['text'], question_data['options'],
-                        question_data['correct_answers'], question_data['order'])
+    await async_database.create_questions_bulk(adb, poll_id, questions)
 
     await message.answer(f"✅ Вопросы успешно добавлены к опросу!", reply_markup=ReplyKeyboardRemove())
     await state.clear()
@@ -148,14 +165,11 @@ async def process_start_poll(callback: types.CallbackQuery, state: FSMContext, d
 @admin_router.callback_query(F.data.startswith("select_poll_"))
 async def process_select_poll(callback: types.CallbackQuery, state: FSMContext, db: Session, bot: Bot):
     poll_id = int(callback.data.split("_")[-1])
-    poll = db.query(Poll).filter(Poll.id == poll_id).first()
+    poll = set_poll_active(db, poll_id, True)
 
     if not poll:
         await callback.message.edit_text("❌ Опрос не найден.")
         return
-    poll.is_active = True
-    db.commit()
-    print(poll.access_code)
     await callback.message.edit_text(
         f"Код доступа к опросу {poll.title}:\n\n{poll.access_code}",
         reply_markup=get_send_first_question_keyboard(poll.id)
@@ -223,65 +237,86 @@ async def send_next_question(callback: types.CallbackQuery, bot: Bot, db: Sessio
     for i, answer in enumerate(question.correct_answers, 1):
         admin_message += f"{i}. {answer}\n"
 
-    # Отправляем вопрос пользователям
-    success_count = 0
-    for user_id in user_ids:
-        try:
-            await send_question(
-                student_id=user_id,
-                question_text=question.text,
-                answer_options=question.options,
-                poll_id=poll_id,
-                question_id=question.id,
-                bot=bot
-            )
-            success_count += 1
-        except Exception as e:
-            logging.error(f"Ошибка отправки вопроса {question.id} пользователю {user_id}: {e}")
+    # Сводка ответов запускается до рассылки: первые ответы приходят, пока вопрос еще рассылается.
+    # Панель управления вопросом отправляется после рассылки, чтобы прием не завершили раньше
+    dashboard_message = await bot.send_message(
+        chat_id=callback.from_user.id,
+        text=render_dashboard(await ANSWER_BUFFER.stats_async(poll_id, question.id), question.options,
+                              len(user_ids))
+    )
+    dashboards.start(Dashboard(
+        bot=bot,
+        chat_id=callback.from_user.id,
+        message_id=dashboard_message.message_id,
+        buffer=ANSWER_BUFFER,
+        poll_id=poll_id,
+        question_id=question.id,
+        options=question.options,
+        participants=len(user_ids)
+    ))
+
+    # Отправляем вопрос пользователям, показывая администратору прогресс рассылки
+    progress_message = await callback.message.answer(
+        text=f"⏳ Вопрос {current_index + 1} отправляется: 0/{len(user_ids)}"
+    )
+
+    async def report_progress(stats: BroadcastStats):
+        await progress_message.edit_text(
+            f"⏳ Вопрос {current_index + 1} отправляется: {stats.processed}/{stats.total} "
+            f"({stats.throughput:.1f} сообщ./с)"
+        )
+
+    stats = await broadcaster.broadcast(
+        user_ids,
+        lambda user_id: send_question(
+            student_id=user_id,
+            question_text=question.text,
+            answer_options=question.options,
+            poll_id=poll_id,
+            question_id=question.id,
+            bot=bot
+        ),
+        on_progress=report_progress
+    )
 
     # Обновляем состояние
     await state.update_data(current_question_index=current_index + 1)
 
     # Отправляем подтверждение администратору
-    await callback.message.answer(
-        text=f"✅ Вопрос {current_index + 1} отправлен {success_count}/{len(user_ids)} пользователям",
-    )
+    try:
+        await progress_message.edit_text(
+            f"✅ Вопрос {current_index + 1} отправлен {stats.sent}/{stats.total} пользователям"
+        )
+    except Exception as e:
+        logger.error("Ошибка при обновлении прогресса рассылки: %s", e)
     question_details_message = await bot.send_message(
         chat_id=callback.from_user.id,
         text=admin_message,
         parse_mode="Markdown",
         reply_markup=admin_keyboard
     )
-    await state.update_data(question_details_message=question_details_message)
+    await state.update_data(question_details_message_id=question_details_message.message_id)
 
 
 @admin_router.callback_query(F.data.startswith("finish_question_"))
-async def process_finish_question(callback: types.CallbackQuery, db: Session, bot: Bot, state: FSMContext):
+async def process_finish_question(callback: types.CallbackQuery, adb: AsyncSession, bot: Bot, state: FSMContext):
     poll_id, question_id = map(int, callback.data.split("_")[2:])
     data = await state.get_data()
 
-    # Получаем всех пользователей опроса
-    user_ids = get_users_by_poll_id(db, poll_id)
-
-    for user_id in user_ids:
-        key = (user_id, poll_id, question_id)
-        selected_answers = TEMP_ANSWERS.get(key, [])
-        print(f"selected_answers: {selected_answers}")
-
-        # Создаем запись в БД
-        create_question_response(db, poll_id, user_id, question_id, selected_answers)
+    # Фиксируем сводку ответов до того, как буфер будет очищен
+    await dashboards.stop(poll_id, question_id)
 
-        # Удаляем временные данные
-        if key in TEMP_ANSWERS:
-            del TEMP_ANSWERS[key]
+    # Забираем ответы на вопрос из буфера и сохраняем их одной транзакцией
+    answers = await ANSWER_BUFFER.drain(poll_id, question_id)
+    await async_database.create_question_responses_bulk(adb, poll_id, question_id, answers)
 
     # Получаем вопрос из БД
-    question = db.query(Question).filter(Question.id == question_id).first()
+    question = await adb.get(Question, question_id)
     if not question:
         await callback.answer("Вопрос не найден", show_alert=True)
         return
 
-    await send_results_for_question(question, db, bot)
+    await send_results_for_question(question, adb, bot)
     next_question_keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="➡️ Перейти к следующему вопросу", callback_data=f"next_question_{poll_id}")]
     ])
@@ -290,69 +325,76 @@ async def process_finish_question(callback: types.CallbackQuery, db: Session, bo
         f"✅ Прием ответов на вопрос {question.order} завершен",
         reply_markup=next_question_keyboard
     )
-    question_details_message: types.Message = data.get("question_details_message")
+    question_details_message_id = data.get("question_details_message_id")
     try:
         await bot.edit_message_reply_markup(
             chat_id=callback.from_user.id,
-            message_id=question_details_message.message_id,
+            message_id=question_details_message_id,
             reply_markup=None
         )
     except Exception as e:
-        logging.error(f"Ошибка при удалении клавиатуры для {callback.from_user.id}: {e}")
+        logger.error("Ошибка при удалении клавиатуры для %s: %s", callback.from_user.id, e)
 
 
 @admin_router.callback_query(F.data.startswith("next_question_"))
-async def process_next_question(callback: types.CallbackQuery, bot: Bot, db: Session, state: FSMContext):
+async def process_next_question(callback: types.CallbackQuery, bot: Bot, db: Session, adb: AsyncSession,
+                                state: FSMContext):
     data = await state.get_data()
     poll_id = int(callback.data.split("_")[2])
     questions_list = data.get('questions_list', [])
     current_index = data.get('current_question_index', 0)
 
+    # Сводка предыдущего вопроса не должна обновляться, если прием ответов не был завершен
+    await dashboards.stop_poll(poll_id)
+
     if current_index >= len(questions_list):
-        # Calculate total score
-        poll_id = int(callback.data.split("_")[2])
-        questions = db.query(Question).filter(Question.poll_id == poll_id).order_by(Question.order).all()
-        user_ids = get_users_by_poll_id(db, poll_id)
-
-        # Set completed_at for all users
-        for user_id in user_ids:
-            poll_response = db.query(PollResponse).filter(
-                PollResponse.poll_id == poll_id,
-                PollResponse.user_id == user_id,
-                PollResponse.completed_at == None  # noqa
-            ).first()
-            if poll_response:
-                poll_response.completed_at = datetime.utcnow()
-                db.commit()
-
-        # Set poll is_active to False
-        poll = db.query(Poll).filter(Poll.id == poll_id).first()
-        if poll:
-            poll.is_active = False
-            db.commit()
+        # Завершаем опрос и получаем итоги участников
+        summary = await async_database.finalize_poll(adb, poll_id)
 
         await callback.message.answer(text="Опрос завершен, можете посмотреть отчет")
 
         # Generate Excel report
-        excel_file = generate_excel_report(db, poll_id)
-        file = BufferedInputFile(excel_file.read(), filename=f"poll_{poll_id}_results.xlsx")
-        await bot.send_document(callback.from_user.id, document=file)
+        try:
+            report_path = await report_executor.generate(poll_id, summary)
+        except ReportQueueFullError:
+            report_path = None
+            await callback.message.answer("❌ Сейчас формируется слишком много отчетов, попробуйте позже.")
+        except asyncio.TimeoutError:
+            report_path = None
+            await callback.message.answer("❌ Не удалось сформировать отчет за отведенное время.")
+        except Exception as e:
+            # Ошибка отчета не должна мешать разослать итоги участникам
+            logger.error("Ошибка при формировании отчета по опросу %s: %s", poll_id, e)
+            report_path = None
+            await callback.message.answer("❌ Не удалось сформировать отчет.")
+        if report_path:
+            try:
+                file = FSInputFile(report_path, filename=f"poll_{poll_id}_results.xlsx")
+                await bot.send_document(callback.from_user.id, document=file)
+            except Exception as e:
+                logger.error("Ошибка при отправке отчета по опросу %s: %s", poll_id, e)
+                await callback.message.answer("❌ Не удалось отправить отчет.")
+            finally:
+                os.remove(report_path)
+
+        # Лучшие результаты для администратора
+        leaderboard = await async_database.get_leaderboard(adb, poll_id, limit=3)
+        if leaderboard:
+            lines = [
+                f"{place}. {first_name or user_id} {last_name or ''} - {round(total_score, 2)}"
+                for place, (user_id, first_name, last_name, total_score, _) in enumerate(leaderboard, 1)
+            ]
+            await callback.message.answer("🏆 Лучшие результаты:\n" + "\n".join(lines))
 
         # Send results to each user
-        for user_id in user_ids:
-            poll_response = db.query(PollResponse).filter(PollResponse.poll_id == poll_id, PollResponse.user_id == user_id).first()
-            if poll_response:
-                total_score = db.query(func.sum(QuestionResponse.score)).filter(
-                    QuestionResponse.poll_response_id == poll_response.id
-                ).scalar() or 0.0
-
-                # Округляем до двух знаков после запятой
-                total_score = round(total_score, 2)
-
-                await bot.send_message(
-                    user_id,
-                    f"Опрос завершен! Вы набрали {total_score} баллов"
-                )
+        if summary and summary.participants:
+            scores = {participant.user_id: round(participant.total_score, 2)
+                      for participant in summary.participants}
+            stats = await broadcaster.broadcast(
+                list(scores),
+                lambda user_id: bot.send_message(user_id, f"Опрос завершен! Вы набрали {scores[user_id]} баллов")
+            )
+            logger.info("Итоги опроса %s разосланы: %d/%d", poll_id, stats.sent, stats.total)
 
         return
 
@@ -483,7 +525,7 @@ async def process_add_questions(callback: types.CallbackQuery, state: FSMContext
 
 
 @admin_router.message(CreatePollStates.waiting_for_questions_file, F.document)
-async def process_questions_file(message: types.Message, state: FSMContext, db: Session):
+async def process_questions_file(message: types.Message, state: FSMContext, adb: AsyncSession):
     data = await state.get_data()
     poll_id = data.get('poll_id')
 
@@ -492,35 +534,32 @@ async def process_questions_file(message: types.Message, state: FSMContext, db:
         await state.clear()
         return
 
-    document = message.document
-    file_id = document.file_id
-    file = await message.bot.get_file(file_id)
-    file_path = file.file_path
-
     try:
-        downloaded_file = await message.bot.download_file(file_path)
-        file_content = downloaded_file.read().decode('utf-8')
         try:
-            questions = parse_poll_from_file(file_content)
-        except ValueError as e:
-            translated_error_message = translate_exception(str(e))
-            logging.error(f"Ошибка при обработке файла с вопросами: {e}")
+            questions = await download_questions(message.bot, message.document)
+        except FileTooLargeError as e:
+            await message.answer(
+                f"❌ Файл слишком большой (максимум {e.max_size // 1024} КБ). "
+                "Пожалуйста, разделите вопросы на несколько файлов.",
+                reply_markup=ReplyKeyboardRemove()
+            )
+            return
+        except PollParseError as e:
+            logger.error("Ошибка при обработке файла с вопросами: %s", e)
             await message.answer(
-                f"❌ Произошла ошибка: {translated_error_message}. "
+                f"❌ {format_parse_errors(e)}\n"
                 "Пожалуйста, исправьте файл и отправьте его снова.",
                 reply_markup=ReplyKeyboardRemove()
             )
             return
 
-        for question_data in questions:
-            create_question(db, poll_id, question_data['text'], question_data['options'],
-                            question_data['correct_answers'], question_data['order'])
+        await async_database.create_questions_bulk(adb, poll_id, questions)
 
         await message.answer(f"✅ Вопросы успешно добавлены к опросу!", reply_markup=ReplyKeyboardRemove())
         await state.clear()
 
     except Exception as e:
-        logging.error(f"Ошибка при обработке файла с вопросами: {e}")
+        logger.error("Ошибка при обработке файла с вопросами: %s", e)
         await message.answer(
             "❌ Произошла ошибка при обработке файла с вопросами. "
             "Пожалуйста, попробуйте снова.",
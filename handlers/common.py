@@ -5,20 +5,25 @@ from aiogram.fsm.context import FSMContext
 from keyboards.reply import get_contact_keyboard, get_admin_start_inline_keyboard, get_user_start_keyboard, \
     get_registration_type_keyboard
 from states.user_states import UserRegistration
-from database.database import get_db, create_user, get_user_by_telegram_id, is_admin, get_poll_by_access_code, create_poll_response
+from database.async_database import create_user, get_user_by_telegram_id, get_poll_info_by_access_code, \
+    create_poll_response, has_completed_poll
 from database.models import Poll, Question, PollResponse
 from handlers.poll import send_question
 import logging
 import re
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.log import SAMPLED
 
-common_router = Router()
+logger = logging.getLogger(__name__)
+
+common_router = Router(name="common")
 
 @common_router.message(Command("start"))
-async def cmd_start(message: Message, state: FSMContext, db: Session):
-    user = get_user_by_telegram_id(db, message.from_user.id)
+async def cmd_start(message: Message, state: FSMContext, adb: AsyncSession):
+    user = await get_user_by_telegram_id(adb, message.from_user.id)
     
-    if is_admin(db, message.from_user.id):
+    if user and user.is_admin:
         await message.answer(
             f"Добро пожаловать, администратор {user.first_name}! 👋\n",
             reply_markup=get_admin_start_inline_keyboard()
@@ -59,28 +64,22 @@ async def process_join_poll(callback: CallbackQuery, state: FSMContext, db: Sess
     await callback.message.edit_text("Пожалуйста, введите код доступа к опросу:")
 
 @common_router.message(UserRegistration.waiting_for_access_code)
-async def process_access_code(message: Message, state: FSMContext, db: Session):
+async def process_access_code(message: Message, state: FSMContext, adb: AsyncSession):
     access_code = message.text.strip()
-    print(access_code)
-    poll = get_poll_by_access_code(db, access_code)
-    print(poll)
+    poll = await get_poll_info_by_access_code(adb, access_code)
+    logger.debug("Код доступа %r: опрос %s", access_code, poll.id if poll else None, extra=SAMPLED)
 
     if poll:
         if not poll.is_active:
             await message.answer("❌ Этот опрос неактивен.")
             return
 
-        poll_response = db.query(PollResponse).filter(
-            PollResponse.poll_id == poll.id,
-            PollResponse.user_id == message.from_user.id,
-            PollResponse.completed_at != None  # noqa
-        ).first()
-        if poll_response:
+        if await has_completed_poll(adb, poll.id, message.from_user.id):
             await message.answer("❌ Вы уже завершили этот опрос!")
             return
 
         # Check if user already joined the poll
-        poll_response = create_poll_response(db, poll.id, message.from_user.id)
+        poll_response = await create_poll_response(adb, poll.id, message.from_user.id)
         if poll_response is None:
             await message.answer("Вы уже присоединились к этому опросу!")
             return
@@ -114,7 +113,7 @@ async def cmd_register(message: Message, state: FSMContext):
     )
 
 @common_router.message(F.contact, UserRegistration.waiting_for_contact)
-async def handle_contact(message: Message, state: FSMContext):
+async def handle_contact(message: Message, state: FSMContext, adb: AsyncSession):
     user_id = message.from_user.id
     username = message.from_user.username
     contact = message.contact
@@ -134,10 +133,9 @@ async def handle_contact(message: Message, state: FSMContext):
         'last_name': contact.last_name
     }
 
-    db = next(get_db())
     try:
-        create_user(
-            db=db,
+        await create_user(
+            db=adb,
             telegram_id=user_info['user_id'],
             username=user_info['username'],
             first_name=user_info['first_name'],
@@ -146,7 +144,7 @@ async def handle_contact(message: Message, state: FSMContext):
             email=None  # Не требуем email
         )
     except Exception as e:
-        logging.error(f"Ошибка при создании пользователя: {e}")
+        logger.error("Ошибка при создании пользователя: %s", e)
         await message.answer("❌ Произошла ошибка при регистрации. Попробуйте позже.")
         return
 
@@ -158,7 +156,7 @@ async def handle_contact(message: Message, state: FSMContext):
     )
 
 @common_router.message(UserRegistration.waiting_for_email)
-async def handle_email(message: Message, state: FSMContext):
+async def handle_email(message: Message, state: FSMContext, adb: AsyncSession):
     email = message.text.strip()
     
     if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
@@ -168,10 +166,9 @@ async def handle_email(message: Message, state: FSMContext):
     user_id = message.from_user.id
     username = message.from_user.username
 
-    db = next(get_db())
     try:
-        create_user(
-            db=db,
+        await create_user(
+            db=adb,
             telegram_id=user_id,
             username=username,
             first_name=message.from_user.first_name,
@@ -180,7 +177,7 @@ async def handle_email(message: Message, state: FSMContext):
             email=email
         )
     except Exception as e:
-        logging.error(f"Ошибка при создании пользователя: {e}")
+        logger.error("Ошибка при создании пользователя: %s", e)
         await message.answer("❌ Произошла ошибка при регистрации. Попробуйте позже.")
         return
 
@@ -1,31 +1,34 @@
 from aiogram import Router, types, F, Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from aiogram.fsm.context import FSMContext
-from database.database import get_db, get_answer_options, create_question_response, get_users_by_poll_id
-from database.models import Poll, Question, QuestionResponse, PollResponse
-from sqlalchemy.orm import Session
+from database.async_database import get_answer_options, get_question_answers, get_question_results, \
+    get_users_by_poll_id
+from database.models import Question
+from sqlalchemy.ext.asyncio import AsyncSession
 import logging
-from states.poll_states import PollPassing
-from typing import Dict, List, Tuple
+from keyboards.callbacks import AnswerCallback
+from utils.answer_buffer import create_answer_buffer
+from utils.broadcaster import broadcaster
+from utils.edit_coalescer import edit_coalescer
+from utils.log import RATE_LIMITED, SAMPLED
 
-poll_router = Router()
+logger = logging.getLogger(__name__)
 
-TEMP_ANSWERS: Dict[Tuple[int, int, int], List[str]] = {}
+poll_router = Router(name="poll")
+
+ANSWER_BUFFER = create_answer_buffer()
 
 async def send_question(student_id: int, question_text: str, answer_options: list, poll_id: int, question_id: int, bot):
     """
     Отправляет вопрос и варианты ответа студенту.
+    Ошибки отправки пробрасываются вызывающему коду (рассылке).
     """
     keyboard = create_answer_keyboard(answer_options, poll_id, question_id)
-    try:
-        await bot.send_message(
-            student_id,
-            question_text,
-            reply_markup=keyboard,
-            parse_mode="Markdown"
-        )
-    except Exception as e:
-        logging.error(f"Не удалось отправить сообщение пользователю {student_id}: {e}")
+    await bot.send_message(
+        student_id,
+        question_text,
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
 
 
 def create_answer_keyboard(answer_options: list, poll_id: int, question_id: int,
@@ -34,102 +37,97 @@ def create_answer_keyboard(answer_options: list, poll_id: int, question_id: int,
     Создает инлайн-клавиатуру с вариантами ответов.
     """
     keyboard = []
-    for option in answer_options:
+    for index, option in enumerate(answer_options):
         if option in selected_options:
             text = f"✅ {option}"
         else:
             text = option
-        keyboard.append([InlineKeyboardButton(text=text,
-                                              callback_data=f"answer:{poll_id}:{question_id}:{option.replace(':', '__COLON__')}")])
+        callback_data = AnswerCallback(poll_id=poll_id, question_id=question_id, option=index).pack()
+        keyboard.append([InlineKeyboardButton(text=text, callback_data=callback_data)])
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
-@poll_router.callback_query(F.data.startswith("answer:"))
-async def process_answer(callback: types.CallbackQuery, state: FSMContext, db: Session):
+@poll_router.callback_query(AnswerCallback.filter())
+async def process_answer(callback: types.CallbackQuery, callback_data: AnswerCallback, adb: AsyncSession):
     """
     Обрабатывает выбор варианта ответа.
     """
-    data = callback.data.split(":")
+    await toggle_answer(callback, adb, callback_data.poll_id, callback_data.question_id, callback_data.option)
+
+
+@poll_router.callback_query(F.data.startswith("answer:"))
+async def process_legacy_answer(callback: types.CallbackQuery, adb: AsyncSession):
+    """
+    Обрабатывает кнопки в старом формате "answer:<poll_id>:<question_id>:<текст варианта>",
+    разосланные до перехода на AnswerCallback.
+    """
+    data = callback.data.split(":", 3)
     poll_id = int(data[1])
     question_id = int(data[2])
     selected_option = data[3].replace('__COLON__', ':')
-    user_id = callback.from_user.id
-
-    key = (user_id, poll_id, question_id)
+    answer_options = await get_answer_options(adb, question_id)
+    option_index = answer_options.index(selected_option) if selected_option in answer_options else -1
+    await toggle_answer(callback, adb, poll_id, question_id, option_index)
 
-    # Получаем текущие выбранные опции
-    current_options = TEMP_ANSWERS.get(key, [])
-    print(f"current_options: {current_options}")
 
-    # Get selected options from state
-    state_data = await state.get_data()
-    selected_options = state_data.get(f"selected_options:{poll_id}:{question_id}", []) or []
-
-    # Toggle selected option
-    if selected_option in selected_options:
-        selected_options.remove(selected_option)
-    else:
-        selected_options.append(selected_option)
+async def toggle_answer(callback: types.CallbackQuery, adb: AsyncSession, poll_id: int, question_id: int,
+                        option_index: int):
+    user_id = callback.from_user.id
 
-    # Обновляем словарь
-    TEMP_ANSWERS[key] = selected_options
+    answers = await get_question_answers(adb, question_id)
+    answer_options = answers.options if answers else []
+    if not 0 <= option_index < len(answer_options):
+        await callback.answer("Вариант ответа не найден")
+        return
 
-    # Update state
-    await state.update_data({f"selected_options:{poll_id}:{question_id}": selected_options})
+    # Переключаем выбранный вариант в буфере ответов, он же обновляет счетчики для сводки
+    try:
+        selected_options = await ANSWER_BUFFER.toggle(user_id, poll_id, question_id, answer_options[option_index],
+                                                      correct_answers=answers.correct_answers)
+    except Exception as e:
+        logger.error("Не удалось сохранить ответ пользователя %s на вопрос %s: %s", user_id, question_id, e,
+                     extra=RATE_LIMITED)
+        await callback.answer("❌ Не удалось сохранить ответ, попробуйте еще раз")
+        return
+    logger.debug("Пользователь %s выбрал %s в вопросе %s", user_id, selected_options, question_id, extra=SAMPLED)
 
-    # Get answer options from database
-    answer_options = get_answer_options(db, question_id)
+    # Отвечаем сразу, чтобы у участника не висел индикатор загрузки
+    await callback.answer()
 
-    # Create new keyboard
     keyboard = create_answer_keyboard(answer_options=answer_options, poll_id=poll_id, question_id=question_id,
                                       selected_options=selected_options)
 
-    # Edit message
-    try:
-        await callback.message.edit_reply_markup(reply_markup=keyboard)
-    except Exception as e:
-        logging.error(f"Не удалось отредактировать сообщение: {e}")
-
-    await callback.answer()
+    # Правки клавиатуры объединяются, Telegram получает только последнюю
+    message = callback.message
+    edit_coalescer.submit((message.chat.id, message.message_id), keyboard,
+                          lambda markup: message.edit_reply_markup(reply_markup=markup),
+                          current=message.reply_markup)
 
 
-async def send_results_for_question(question: Question, db: Session, bot: Bot):
-    poll = question.poll
-    user_ids = get_users_by_poll_id(db, poll.id)
+async def send_results_for_question(question: Question, adb: AsyncSession, bot: Bot):
+    user_ids = await get_users_by_poll_id(adb, question.poll_id)
     correct_answers = ", ".join(question.correct_answers)
 
+    # Ответы участников загружаются одним запросом, баллы посчитаны при их сохранении
+    responses = await get_question_results(adb, question.poll_id, question.id)
+
+    texts = {}
     for user_id in user_ids:
-        # Получаем ответ пользователя
-        response = (db.query(QuestionResponse)
-                    .join(PollResponse)
-                    .filter(
-            PollResponse.poll_id == poll.id,
-                        PollResponse.user_id == user_id,
-                        QuestionResponse.question_id == question.id
-                    )
-                    .order_by(QuestionResponse.id.desc())  # Сортировка по убыванию ID
-                    .first())  # Получение первой записи после сортировки
-
-        if not response:
-            await bot.send_message(user_id, text=f"Вы не ответили на вопрос {question.order}")
-            return
-
-        user_answers = ", ".join(response.selected_answers)
-        correct_answers_list = question.correct_answers
-        selected_answers_list = response.selected_answers
-        
-        correct_count = len(set(selected_answers_list) & set(correct_answers_list))
-        incorrect_count = len(selected_answers_list) - correct_count
-        
-        weight = 1 / len(correct_answers_list) if correct_answers_list else 0
-        score = (correct_count * weight) - (incorrect_count * weight)
-        score = max(0, score)
-        
+        response = responses.get(user_id)
+        if response is None:
+            texts[user_id] = f"Вы не ответили на вопрос {question.order}"
+            continue
+
+        selected_answers, score = response
+        user_answers = ", ".join(selected_answers)
         result = f"Ваш балл: {score:.2f}"
 
-        message = f"📊 Результат по вопросу:\n**Вопрос:** {question.text}\n**Ваш ответ:** {user_answers}\n**Правильный ответ:** {correct_answers}\n**Итог:** {result}"
+        texts[user_id] = f"📊 Результат по вопросу:\n**Вопрос:** {question.text}\n**Ваш ответ:** {user_answers}\n**Правильный ответ:** {correct_answers}\n**Итог:** {result}"
 
-        try:
-            await bot.send_message(user_id, message, parse_mode="Markdown")
-        except Exception as e:
-            logging.error(f"Ошибка при отправке результатов {user_id}: {e}")
+    # Результаты уходят через общий ограничитель скорости, 429 повторяются рассылкой
+    stats = await broadcaster.broadcast(
+        texts,
+        lambda user_id: bot.send_message(user_id, texts[user_id], parse_mode="Markdown")
+    )
+    logger.info("Результаты вопроса %s разосланы: %d/%d", question.id, stats.sent, stats.total)
+    return stats
@@ -0,0 +1,14 @@
+from aiogram.filters.callback_data import CallbackData
+
+
+class AnswerCallback(CallbackData, prefix="a1"):
+    """
+    Нажатие на вариант ответа: "a1:<poll_id>:<question_id>:<индекс варианта>".
+
+    Вместо текста варианта передается его индекс, поэтому длина callback_data
+    не зависит от длины вариантов и не превышает лимит Telegram в 64 байта.
+    Цифра в префиксе - версия формата.
+    """
+    poll_id: int
+    question_id: int
+    option: int
@@ -1,36 +1,58 @@
 import asyncio
-import logging
-from aiogram import Bot, Dispatcher
-from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 from dotenv import load_dotenv
-import os
-from typing import Any, Awaitable, Callable, Dict, Union
-from aiogram.types import Message, CallbackQuery
-from database.database import get_db
-from database.init_db import init_db
-from middleware.database import DatabaseMiddleware
 
+# Переменные окружения должны быть загружены до создания движка базы данных
 load_dotenv()
-logging.basicConfig(level=logging.INFO)
-storage = MemoryStorage()
-bot = Bot(token=os.getenv("BOT_TOKEN"))
-dp = Dispatcher(storage=storage)
-
-init_db()
 
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.base import BaseStorage
+import os
+from typing import Optional
+from database.init_db import init_db
+from middleware.database import DatabaseMiddleware
+from utils.edit_coalescer import edit_coalescer
+from utils.fsm_storage import create_fsm_storage
+from utils.log import setup_logging
+from utils.metrics import METRICS_PORT, setup_metrics
+from utils.webhook import run_webhook
 from handlers.common import common_router
 from handlers.admin import admin_router
 from handlers.poll import poll_router
 
-dp.update.middleware(DatabaseMiddleware())
+# "polling" - long polling, "webhook" - прием обновлений HTTP-сервером (см. utils/webhook.py)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+
+
+def create_dispatcher(storage: Optional[BaseStorage] = None, metrics_port: int = METRICS_PORT) -> Dispatcher:
+    """
+    Создает диспетчер со всеми обработчиками и middleware.
+
+    Если metrics_port не 0, при старте диспетчера запускается сервер метрик (см. utils/metrics.py).
+    """
+    dp = Dispatcher(storage=storage or create_fsm_storage())
+    dp.update.middleware(DatabaseMiddleware())
+    setup_metrics(dp, metrics_port)
+
+    dp.include_router(common_router)
+    dp.include_router(admin_router)
+    dp.include_router(poll_router)
+
+    # Отложенные правки клавиатур применяются до закрытия сессии бота
+    dp.shutdown.register(edit_coalescer.flush)
+    dp.shutdown.register(dp.storage.close)
+    return dp
 
-dp.include_router(common_router)
-dp.include_router(admin_router)
-dp.include_router(poll_router)
 
 async def main():
-    await dp.start_polling(bot)
+    setup_logging()
+    init_db()
+    bot = Bot(token=os.getenv("BOT_TOKEN"))
+    dp = create_dispatcher()
+    if BOT_MODE == "webhook":
+        await run_webhook(dp, bot)
+    else:
+        await dp.start_polling(bot)
+
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,17 +1,26 @@
 from typing import Any, Awaitable, Callable, Dict, Union
 from aiogram.types import Message, CallbackQuery
-from database.database import get_db
+from database.database import SessionLocal, AsyncSessionLocal
 
 class DatabaseMiddleware:
+    """
+    Передает обработчикам синхронную сессию (db) и асинхронную сессию (adb).
+
+    Обе сессии открывают соединение только при первом запросе, поэтому
+    обработчик, использующий одну из них, не платит за вторую.
+    """
     async def __call__(
         self,
         handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
         event: Union[Message, CallbackQuery],
         data: Dict[str, Any]
     ) -> Any:
-        db = next(get_db())
+        db = SessionLocal()
+        adb = AsyncSessionLocal()
         data["db"] = db
+        data["adb"] = adb
         try:
             return await handler(event, data)
         finally:
-            db.close() 
\ No newline at end of file
+            db.close()
+            await adb.close()
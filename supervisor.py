@@ -0,0 +1,301 @@
+"""
+Запуск бота в нескольких процессах.
+
+Процесс-супервизор получает обновления (long polling или вебхук, см. BOT_MODE)
+и передает каждое одному из SUPERVISOR_WORKERS рабочих процессов. Процесс
+выбирается консистентным хэшированием идентификатора чата, поэтому все
+обновления одного пользователя обрабатываются одним процессом и по порядку.
+Рабочие процессы собирают диспетчер через main.create_dispatcher().
+
+Состояния FSM и буфер ответов должны быть общими для всех процессов:
+FSM_STORAGE=sqlite|redis и ANSWER_BUFFER=sqlite (значения по умолчанию).
+С ANSWER_BUFFER=memory супервизор не запускается: ответы студентов и
+завершение вопроса администратором обрабатываются разными процессами.
+Ограничитель скорости рассылки общий для всех процессов. Кэши опросов и
+администраторов в каждом процессе свои и не видят изменений из других
+процессов, поэтому в рабочих процессах записи в них живут не дольше
+SUPERVISOR_CACHE_TTL секунд. Завершившиеся рабочие процессы перезапускаются
+с теми же очередями.
+
+У каждого рабочего процесса есть свой буфер в супервизоре (до
+SUPERVISOR_QUEUE_SIZE обновлений) и своя задача, которая перекладывает
+обновления из него в очередь процесса. Поэтому медленный процесс
+задерживает только обновления своих чатов. В режиме вебхука чаты
+передаются одновременно, и ждут только чаты заполненного процесса. При
+long polling обновления передаются по порядку, и получение новых
+обновлений останавливается, только когда заполнен и буфер процесса:
+Telegram хранит их до следующего getUpdates.
+
+SUPERVISOR_WORKERS         - количество рабочих процессов (по умолчанию - число ядер)
+SUPERVISOR_QUEUE_SIZE      - сколько обновлений может ждать каждый рабочий процесс
+SUPERVISOR_CHECK_INTERVAL  - как часто (в секундах) проверять, что рабочие процессы живы
+SUPERVISOR_CACHE_TTL       - время жизни записей кэшей опросов и администраторов в рабочих процессах
+
+Если задан METRICS_PORT, рабочий процесс с номером i отдает метрики на порту METRICS_PORT + i.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from aiogram import Bot
+from aiohttp import web
+
+from utils.broadcaster import BROADCAST_RATE, SharedTokenBucket
+from utils.hash_ring import HashRing
+from utils.log import RATE_LIMITED, setup_logging
+from utils.webhook import (WEBHOOK_HOST, WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_URL,
+                           UpdateQueue, create_webhook_app, get_update_key)
+
+logger = logging.getLogger(__name__)
+
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+SUPERVISOR_WORKERS = int(os.getenv("SUPERVISOR_WORKERS", str(os.cpu_count() or 1)))
+SUPERVISOR_QUEUE_SIZE = int(os.getenv("SUPERVISOR_QUEUE_SIZE", "1000"))
+SUPERVISOR_CHECK_INTERVAL = float(os.getenv("SUPERVISOR_CHECK_INTERVAL", "1"))
+SUPERVISOR_CACHE_TTL = float(os.getenv("SUPERVISOR_CACHE_TTL", "2"))
+
+# Рабочий процесс получает номер, свою очередь обновлений и состояние общего ограничителя рассылки
+WorkerTarget = Callable[[int, multiprocessing.Queue, Any], None]
+
+
+def run_worker(index: int, updates: multiprocessing.Queue, broadcast_state) -> None:
+    """
+    Точка входа рабочего процесса.
+    """
+    setup_logging()
+    asyncio.run(_serve_worker(index, updates, broadcast_state))
+
+
+def _configure_worker(broadcast_state) -> None:
+    from database.database import admin_cache, poll_cache
+    from utils.broadcaster import broadcaster
+
+    # Запуск и завершение опроса или новый администратор в другом процессе
+    # сбрасывают только его кэш, поэтому здесь записи живут недолго
+    for cache in (poll_cache, admin_cache):
+        cache.ttl = min(cache.ttl, SUPERVISOR_CACHE_TTL)
+        cache.clear()
+    # Лимит Telegram на рассылку - на бота, а не на процесс
+    broadcaster.bucket = SharedTokenBucket(broadcast_state, broadcaster.bucket.rate, broadcaster.bucket.capacity)
+
+
+async def _serve_worker(index: int, updates: multiprocessing.Queue, broadcast_state) -> None:
+    from main import create_dispatcher
+    from utils.metrics import METRICS_PORT
+
+    _configure_worker(broadcast_state)
+    bot = Bot(token=os.getenv("BOT_TOKEN"))
+    dp = create_dispatcher(metrics_port=METRICS_PORT + index if METRICS_PORT else 0)
+    queue = UpdateQueue(lambda update: dp.feed_raw_update(bot, update), overflow="wait")
+    loop = asyncio.get_running_loop()
+
+    await dp.emit_startup(bot=bot)
+    queue.start()
+    try:
+        while True:
+            update = await loop.run_in_executor(None, updates.get)
+            if update is None:
+                break
+            # Обновления не отбрасываются: пока обработчики заняты, ждем места в очереди
+            while not await queue.put(update):
+                logger.warning("Очередь рабочего процесса %d заполнена, обновление %s ждет места",
+                               index, update.get("update_id"))
+    finally:
+        await queue.stop()
+        await dp.emit_shutdown(bot=bot)
+        await bot.session.close()
+
+
+class Supervisor:
+    """
+    Распределяет обновления по рабочим процессам.
+    """
+
+    def __init__(self, workers: int = SUPERVISOR_WORKERS, target: WorkerTarget = run_worker,
+                 queue_size: int = SUPERVISOR_QUEUE_SIZE, check_interval: float = SUPERVISOR_CHECK_INTERVAL):
+        self.target = target
+        self.check_interval = check_interval
+        self.queues: List[multiprocessing.Queue] = [multiprocessing.Queue(queue_size) for _ in range(workers)]
+        self.processes: List[multiprocessing.Process] = []
+        self.ring = HashRing(range(workers))
+        # Обновления, ожидающие места в очереди рабочего процесса
+        self.pending: List[asyncio.Queue] = [asyncio.Queue(queue_size) for _ in range(workers)]
+        self.broadcast_state = SharedTokenBucket.create_state(BROADCAST_RATE)
+        self.restarts = 0
+        self._feeders: List[asyncio.Task] = []
+
+    def _spawn(self, index: int) -> multiprocessing.Process:
+        process = multiprocessing.Process(target=self.target, args=(index, self.queues[index], self.broadcast_state),
+                                          name=f"worker-{index}")
+        process.start()
+        return process
+
+    def start(self) -> None:
+        self.processes = [self._spawn(index) for index in range(len(self.queues))]
+
+    def start_feeders(self) -> None:
+        """
+        Запускает задачи, передающие буферизованные обновления рабочим процессам.
+        """
+        self._feeders = [asyncio.create_task(self._feed(index)) for index in range(len(self.queues))]
+
+    async def stop_feeders(self, timeout: Optional[float] = 30) -> None:
+        """
+        Дожидается передачи буферизованных обновлений (не дольше timeout секунд) и останавливает задачи.
+        """
+        try:
+            await asyncio.wait_for(asyncio.gather(*(pending.join() for pending in self.pending)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Не все обновления переданы рабочим процессам: %d",
+                           sum(pending.qsize() for pending in self.pending))
+        for feeder in self._feeders:
+            feeder.cancel()
+        await asyncio.gather(*self._feeders, return_exceptions=True)
+        self._feeders = []
+
+    async def _feed(self, index: int) -> None:
+        pending, queue = self.pending[index], self.queues[index]
+        loop = asyncio.get_running_loop()
+        while True:
+            update = await pending.get()
+            try:
+                # put блокируется, пока рабочий процесс не освободит место, - ждет только этот процесс
+                await loop.run_in_executor(None, queue.put, update)
+            finally:
+                pending.task_done()
+
+    def check_workers(self) -> int:
+        """
+        Перезапускает завершившиеся рабочие процессы с их прежними очередями.
+
+        Иначе очередь упавшего процесса заполнится и его чаты перестанут
+        обрабатываться.
+
+        Returns:
+            int: Количество перезапущенных процессов.
+        """
+        restarted = 0
+        for index, process in enumerate(self.processes):
+            if process.is_alive():
+                continue
+            logger.error("Процесс %s завершился с кодом %s, перезапускаем", process.name, process.exitcode)
+            process.join()
+            self.processes[index] = self._spawn(index)
+            restarted += 1
+        self.restarts += restarted
+        return restarted
+
+    async def monitor(self) -> None:
+        """
+        Проверяет рабочие процессы каждые check_interval секунд, пока не будет отменена.
+        """
+        while True:
+            await asyncio.sleep(self.check_interval)
+            self.check_workers()
+
+    def route(self, update: Dict[str, Any]) -> int:
+        """
+        Возвращает номер рабочего процесса для обновления.
+        """
+        return self.ring.get(get_update_key(update))
+
+    async def submit(self, update: Dict[str, Any]) -> None:
+        """
+        Передает обновление рабочему процессу (через его буфер, см. start_feeders()).
+
+        Ждет, только если буфер этого процесса заполнен.
+        """
+        index = self.route(update)
+        pending = self.pending[index]
+        if pending.full():
+            logger.warning("Рабочий процесс %d не успевает обрабатывать обновления", index, extra=RATE_LIMITED)
+        await pending.put(update)
+
+    def stop(self, timeout: Optional[float] = 30) -> None:
+        """
+        Дожидается обработки переданных обновлений и останавливает рабочие процессы.
+        """
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning("Процесс %s не завершился, останавливаем принудительно", process.name)
+                process.terminate()
+
+
+async def poll_updates(bot: Bot, supervisor: Supervisor) -> None:
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=30)
+        except Exception as e:
+            logger.error("Ошибка при получении обновлений: %s", e)
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            await supervisor.submit(update.model_dump(mode="json", exclude_none=True))
+            offset = update.update_id + 1
+
+
+async def serve_webhook(bot: Bot, supervisor: Supervisor) -> None:
+    # Очередь упорядочивает обновления одного чата до передачи в рабочий процесс
+    queue = UpdateQueue(supervisor.submit)
+    runner = web.AppRunner(create_webhook_app(queue))
+
+    queue.start()
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    if WEBHOOK_URL:
+        await bot.set_webhook(WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await queue.stop()
+
+
+async def main():
+    from database.init_db import init_db
+    from utils.answer_buffer import ANSWER_BUFFER
+    from utils.fsm_storage import FSM_STORAGE
+
+    if BOT_MODE == "webhook" and not WEBHOOK_SECRET:
+        # Проверяем до запуска рабочих процессов
+        raise ValueError("Для режима вебхука нужно задать WEBHOOK_SECRET")
+    if ANSWER_BUFFER == "memory":
+        # Ответы копятся в процессе студента, а забираются в процессе администратора
+        raise ValueError("ANSWER_BUFFER=memory не разделяется между процессами, используйте ANSWER_BUFFER=sqlite")
+    if FSM_STORAGE == "memory":
+        logger.warning("FSM_STORAGE=memory не разделяется между процессами и теряется при их перезапуске")
+
+    init_db()
+    bot = Bot(token=os.getenv("BOT_TOKEN"))
+    supervisor = Supervisor()
+    supervisor.start()
+    supervisor.start_feeders()
+    logger.info("Запущено рабочих процессов: %d", len(supervisor.processes))
+    monitor = asyncio.create_task(supervisor.monitor())
+    try:
+        if BOT_MODE == "webhook":
+            await serve_webhook(bot, supervisor)
+        else:
+            await bot.delete_webhook()
+            await poll_updates(bot, supervisor)
+    finally:
+        # Пока буферы передаются рабочим процессам, упавшие процессы еще перезапускаются
+        await supervisor.stop_feeders()
+        monitor.cancel()
+        supervisor.stop()
+        await bot.session.close()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    asyncio.run(main())
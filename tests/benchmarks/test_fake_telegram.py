@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from benchmarks.fake_telegram import FakeTelegramSession
+
+
+def make_bot(**kwargs) -> Bot:
+    return Bot(token="42:FAKE", session=FakeTelegramSession(**kwargs))
+
+
+def test_fake_session_records_calls_and_returns_bound_messages():
+    bot = make_bot()
+    markup = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="a", callback_data="a")]])
+
+    async def run():
+        message = await bot.send_message(10, "Вопрос", reply_markup=markup)
+        # Сообщение привязано к боту, как ответ настоящего API
+        edited = await message.edit_text("Вопрос (изменен)")
+        return message, edited
+
+    message, edited = asyncio.run(run())
+
+    session = bot.session
+    assert session.calls == {"sendMessage": 1, "editMessageText": 1}
+    assert message.reply_markup.inline_keyboard[0][0].callback_data == "a"
+    assert edited.message_id == message.message_id
+    assert session.last_message(10) == session.messages[10][message.message_id]
+    assert session.last_message(10)["text"] == "Вопрос (изменен)"
+    assert "reply_markup" not in session.last_message(10)
+    assert session.last_message(11) is None
+
+
+def test_fake_session_simulates_rate_limits():
+    bot = make_bot(rate_limit_probability=1.0, retry_after=3)
+
+    with pytest.raises(TelegramRetryAfter) as exc_info:
+        asyncio.run(bot.send_message(10, "Вопрос"))
+    assert exc_info.value.retry_after == 3
+    assert bot.session.rate_limited == 1
+
+    # Остальные методы не ограничиваются
+    assert asyncio.run(bot.answer_callback_query("1")) is True
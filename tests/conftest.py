@@ -0,0 +1,32 @@
+import os
+
+# Тесты не должны создавать файл журнала ответов в рабочем каталоге
+os.environ.setdefault("ANSWER_BUFFER", "memory")
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database.database import question_cache, poll_cache, admin_cache
+from database.models import Base
+
+
+@pytest.fixture(autouse=True)
+def clear_entity_caches():
+    for cache in (question_cache, poll_cache, admin_cache):
+        cache.clear()
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(autoflush=False, bind=engine)()
+    yield session
+    session.close()
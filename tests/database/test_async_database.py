@@ -0,0 +1,123 @@
+import asyncio
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from database import async_database
+from database.models import Base, PollResponse
+
+
+def run_with_session(tmp_path, scenario):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        try:
+            async with session_factory() as db:
+                return await scenario(db)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+def test_admin_helpers(tmp_path):
+    async def scenario(db):
+        await async_database.create_user(db, 1, "user", "Иван", "Иванов", None, "a@b.c")
+        assert not await async_database.is_admin(db, 1)
+        await async_database.add_admin(db, 1)
+        assert await async_database.is_admin(db, 1)
+        assert await async_database.get_admin_count(db) == 1
+        assert await async_database.add_admin(db, 2) is None
+
+    run_with_session(tmp_path, scenario)
+
+
+def test_poll_participation(tmp_path):
+    async def scenario(db):
+        poll = await async_database.create_poll_db(db, "Опрос", "Описание", 1, "code")
+        question = await async_database.create_question(db, poll.id, "Вопрос", ["a", "b"], ["a"], 1)
+
+        assert (await async_database.get_poll_by_access_code(db, "code")).id == poll.id
+        assert await async_database.create_poll_response(db, poll.id, 10) is not None
+        assert await async_database.create_poll_response(db, poll.id, 10) is None
+        assert not await async_database.has_completed_poll(db, poll.id, 10)
+        assert await async_database.get_users_by_poll_id(db, poll.id) == [10]
+        assert await async_database.get_answer_options(db, question.id) == ["a", "b"]
+
+        response = await async_database.create_question_response(db, poll.id, 10, question.id, ["a"])
+        assert response.score == 1.0
+        totals = await db.execute(select(PollResponse.total_score, PollResponse.answered_count))
+        assert totals.one() == (1.0, 1)
+
+    run_with_session(tmp_path, scenario)
+
+
+def test_concurrent_question_loads_are_coalesced(tmp_path):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        try:
+            async with session_factory() as db:
+                poll = await async_database.create_poll_db(db, "Опрос", "", 1, "code")
+                question = await async_database.create_question(db, poll.id, "Вопрос", ["a", "b"], ["a"], 1)
+            statements.clear()
+
+            async def click():
+                # Каждое нажатие обрабатывается со своей сессией, как в DatabaseMiddleware
+                async with session_factory() as db:
+                    return await async_database.get_question_answers(db, question.id)
+
+            results = await asyncio.gather(*(click() for _ in range(20)))
+            return results, statements
+        finally:
+            await engine.dispose()
+
+    results, statements = asyncio.run(run())
+    assert all(answers.options == ["a", "b"] for answers in results)
+    assert len([statement for statement in statements if "FROM questions" in statement]) == 1
+
+
+def test_create_admin_user_invalidates_admin_cache(tmp_path):
+    async def scenario(db):
+        assert not await async_database.is_admin(db, 1)
+        await async_database.create_user(db, 1, "admin", "Иван", None, None, None, is_admin=True)
+        assert await async_database.is_admin(db, 1)
+
+    run_with_session(tmp_path, scenario)
+
+
+def test_bulk_writes_and_finalization(tmp_path):
+    async def scenario(db):
+        poll = await async_database.create_poll_db(db, "Опрос", "Описание", 1, "code")
+        question_ids = await async_database.create_questions_bulk(db, poll.id, [
+            {"text": "Первый", "options": ["a", "b"], "correct_answers": ["a"], "order": 1},
+            {"text": "Второй", "options": ["a", "b"], "correct_answers": ["b"], "order": 2},
+        ])
+        assert len(question_ids) == 2
+        for user_id in (10, 11):
+            await async_database.create_poll_response(db, poll.id, user_id)
+
+        saved = await async_database.create_question_responses_bulk(db, poll.id, question_ids[0],
+                                                                    {10: ["a"], 11: ["b"]})
+        assert saved == 2
+        # Повторное сохранение не перезаписывает ответы
+        assert await async_database.create_question_responses_bulk(db, poll.id, question_ids[0], {10: ["b"]}) == 0
+        assert await async_database.get_question_results(db, poll.id, question_ids[0]) == {
+            10: (["a"], 1.0), 11: (["b"], 0.0)
+        }
+        assert [row.user_id for row in await async_database.get_leaderboard(db, poll.id, limit=1)] == [10]
+
+        summary = await async_database.finalize_poll(db, poll.id)
+        assert [(participant.user_id, participant.total_score) for participant in summary.participants] == [
+            (10, 1.0), (11, 0.0)
+        ]
+        assert (await async_database.finalize_poll(db, poll.id)).participants == []
+        assert await async_database.finalize_poll(db, 42) is None
+
+    run_with_session(tmp_path, scenario)
@@ -0,0 +1,98 @@
+import threading
+import time
+
+from sqlalchemy import event
+
+from database import database
+from database.cache import TTLCache
+from utils.metrics import registry
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache("test", maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.stats()["hits"] == 3
+    assert cache.stats()["misses"] == 1
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache("test", maxsize=10, ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+
+    assert cache.get("a") is None
+
+
+def test_answer_options_are_read_through(engine, db):
+    poll = database.create_poll_db(db, "Опрос", "", 1, "code")
+    question = database.create_question(db, poll.id, "Вопрос", ["a", "b"], ["a"], 1)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    for _ in range(3):
+        assert database.get_answer_options(db, question.id) == ["a", "b"]
+
+    assert len(statements) == 1
+    assert database.cache_stats()["questions"]["hits"] == 2
+
+
+def test_admin_cache_invalidated_by_write_helpers(db):
+    database.create_user(db, 1, "user", "Имя", None, None, None)
+    assert not database.is_admin(db, 1)
+
+    database.add_admin(db, 1)
+    assert database.is_admin(db, 1)
+
+    database.remove_admin(db, 1)
+    assert not database.is_admin(db, 1)
+
+
+def test_poll_info_invalidated_when_poll_started(db):
+    poll = database.create_poll_db(db, "Опрос", "", 1, "code")
+    assert database.get_poll_info_by_access_code(db, "code").is_active is False
+
+    database.set_poll_active(db, poll.id, True)
+    assert database.get_poll_info_by_access_code(db, "code").is_active is True
+    assert database.get_poll_info_by_access_code(db, "missing") is None
+
+
+def test_create_admin_user_invalidates_admin_cache(db):
+    assert not database.is_admin(db, 1)
+
+    database.create_user(db, 1, "admin", "Имя", None, None, None, is_admin=True)
+    assert database.is_admin(db, 1)
+
+
+def test_concurrent_loads_of_one_key_are_coalesced():
+    cache = TTLCache("test", maxsize=10, ttl=60)
+    loads = []
+
+    def load():
+        loads.append(1)
+        time.sleep(0.05)
+        return "value"
+
+    threads = [threading.Thread(target=lambda: cache.get_or_load("a", load)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
+    assert cache.get("a") == "value"
+
+
+def test_cache_stats_are_exported_as_metrics():
+    database.question_cache.clear()
+    database.question_cache.get("missing")
+    misses = database.question_cache.misses
+
+    assert f'bot_cache_requests_total{{cache="questions",result="misses"}} {misses}' in registry.render()
+    assert 'bot_cache_size{cache="questions"} 0' in registry.render()
@@ -0,0 +1,176 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import StatementError
+
+from database.database import create_poll_db, create_question, create_poll_response, \
+    create_question_response, create_question_responses_bulk, get_leaderboard, recalculate_poll_totals, \
+    finalize_poll, get_poll_info_by_access_code, set_poll_active, create_questions_bulk, get_question_answers
+from database import database as database_module
+from database.models import PollResponse, Question, QuestionResponse
+
+
+def test_create_question_responses_bulk(db):
+    poll = create_poll_db(db, "Опрос", "Описание", 1, "code")
+    question = create_question(db, poll.id, "Вопрос", ["a", "b", "c"], ["a", "b"], 1)
+    for user_id in (10, 11, 12, 13):
+        create_poll_response(db, poll.id, user_id)
+    # Завершивший опрос участник не получает новых ответов
+    db.query(PollResponse).filter(PollResponse.user_id == 13).update({"completed_at": datetime.utcnow()})
+    db.commit()
+
+    saved = create_question_responses_bulk(db, poll.id, question.id, {10: ["a", "b"], 11: ["a", "c"], 99: ["a"]})
+
+    assert saved == 3
+    scores = {
+        response.poll_response.user_id: (response.selected_answers, response.score)
+        for response in db.query(QuestionResponse).all()
+    }
+    assert scores == {
+        10: (["a", "b"], 1.0),
+        11: (["a", "c"], 0.0),
+        12: ([], 0.0),
+    }
+
+
+def test_create_question_responses_bulk_without_participants(db):
+    poll = create_poll_db(db, "Опрос", "Описание", 1, "code")
+    question = create_question(db, poll.id, "Вопрос", ["a"], ["a"], 1)
+
+    assert create_question_responses_bulk(db, poll.id, question.id, {}) == 0
+    assert db.query(QuestionResponse).count() == 0
+
+
+def test_create_question_responses_bulk_uses_question_scoring_policy(db):
+    poll = create_poll_db(db, "Опрос", "Описание", 1, "code")
+    question = create_question(db, poll.id, "Вопрос", ["a", "b", "c"], ["a", "b"], 1,
+                               scoring_policy="partial_no_penalty")
+    for user_id in (10, 11):
+        create_poll_response(db, poll.id, user_id)
+
+    create_question_responses_bulk(db, poll.id, question.id, {10: ["a", "c"], 11: ["c"]})
+
+    scores = {response.poll_response.user_id: response.score for response in db.query(QuestionResponse).all()}
+    assert scores == {10: 0.5, 11: 0.0}
+
+
+def test_totals_are_maintained_with_responses(db):
+    poll = create_poll_db(db, "Опрос", "Описание", 1, "code")
+    first = create_question(db, poll.id, "Вопрос 1", ["a", "b"], ["a"], 1)
+    second = create_question(db, poll.id, "Вопрос 2", ["a", "b"], ["a", "b"], 2)
+    for user_id in (10, 11, 12):
+        create_poll_response(db, poll.id, user_id)
+
+    create_question_responses_bulk(db, poll.id, first.id, {10: ["a"], 11: ["b"]})
+    create_question_response(db, poll.id, 10, second.id, ["a"])
+    create_question_responses_bulk(db, poll.id, second.id, {11: ["a", "b"]})
+
+    totals = {row.user_id: (row.total_score, row.answered_count) for row in db.query(PollResponse).all()}
+    assert totals == {10: (1.5, 2), 11: (1.0, 2), 12: (0.0, 0)}
+    assert [row.user_id for row in get_leaderboard(db, poll.id, limit=2)] == [10, 11]
+
+    # Пересчет по сохраненным ответам дает те же итоги
+    db.query(PollResponse).update({"total_score": 0, "answered_count": 0})
+    db.commit()
+    assert recalculate_poll_totals(db, poll.id) == 3
+    db.expire_all()
+    assert {row.user_id: (row.total_score, row.answered_count) for row in db.query(PollResponse).all()} == totals
+
+
+def test_finalize_poll(db, engine):
+    poll = create_poll_db(db, "Опрос", "Описание", 1, "code")
+    question = create_question(db, poll.id, "Вопрос", ["a", "b"], ["a"], 1)
+    for user_id in (10, 11, 12):
+        create_poll_response(db, poll.id, user_id)
+    create_question_responses_bulk(db, poll.id, question.id, {10: ["a"], 11: ["b"]})
+    set_poll_active(db, poll.id, True)
+    assert get_poll_info_by_access_code(db, "code").is_active
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        summary = finalize_poll(db, poll.id)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    # Количество запросов не зависит от числа участников, итоги возвращает сам UPDATE
+    assert len(statements) == 3
+    assert [participant.user_id for participant in summary.participants] == [10, 11, 12]
+    assert [participant.total_score for participant in summary.participants] == [1.0, 0.0, 0.0]
+    assert [participant.answered_count for participant in summary.participants] == [1, 1, 0]
+    assert summary.completed_count == 3
+    assert summary.average_score == 1 / 3
+    assert not get_poll_info_by_access_code(db, "code").is_active
+    db.expire_all()
+    assert {row.completed_at for row in db.query(PollResponse).all()} == {summary.completed_at}
+
+    # Повторное завершение не затрагивает уже завершивших участников
+    assert finalize_poll(db, poll.id).participants == []
+
+
+def test_finalize_polls_in_the_same_instant(db, monkeypatch):
+    polls = [create_poll_db(db, "Опрос", "Описание", 1, f"code{index}") for index in range(2)]
+    for poll, user_ids in zip(polls, ((10, 11), (12,))):
+        for user_id in user_ids:
+            create_poll_response(db, poll.id, user_id)
+
+    # Одинаковое время завершения не смешивает участников разных опросов
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return datetime(2024, 1, 1, 12, 0, 0, 123456)
+
+    monkeypatch.setattr(database_module, "datetime", FrozenDatetime)
+    first, second = (finalize_poll(db, poll.id) for poll in polls)
+
+    assert [participant.user_id for participant in first.participants] == [10, 11]
+    assert [participant.user_id for participant in second.participants] == [12]
+
+
+def test_finalize_poll_unknown_poll(db):
+    assert finalize_poll(db, 42) is None
+
+
+def test_create_questions_bulk(db, engine):
+    poll = create_poll_db(db, "Опрос", "Описание", 1, "code")
+    questions = [
+        {"text": f"Вопрос {order}", "options": ["a", "b"], "correct_answers": ["a"], "order": order}
+        for order in range(1, 51)
+    ]
+    questions[1]["scoring_policy"] = "all_or_nothing"
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        question_ids = create_questions_bulk(db, poll.id, questions)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert len(statements) == 1
+    stored = db.query(Question).filter(Question.poll_id == poll.id).order_by(Question.id).all()
+    assert [question.id for question in stored] == question_ids
+    assert [question.order for question in stored] == list(range(1, 51))
+    assert [question.scoring_policy for question in stored[:3]] == ["partial", "all_or_nothing", "partial"]
+    assert all(question.is_active for question in stored)
+    assert get_question_answers(db, question_ids[0]) == (["a", "b"], ["a"])
+    assert create_questions_bulk(db, poll.id, []) == []
+
+
+def test_create_questions_bulk_is_all_or_nothing(db):
+    poll = create_poll_db(db, "Опрос", "Описание", 1, "code")
+    questions = [
+        {"text": "Вопрос 1", "options": ["a"], "correct_answers": ["a"], "order": 1},
+        {"text": "Вопрос 2", "options": [object()], "correct_answers": ["a"], "order": 2},
+    ]
+
+    with pytest.raises(StatementError):
+        create_questions_bulk(db, poll.id, questions)
+    assert db.query(Question).count() == 0
@@ -0,0 +1,44 @@
+import asyncio
+
+from sqlalchemy import text
+
+from database.engine import create_db_engine, create_async_db_engine, get_async_database_url, get_engine_options
+
+
+def test_sqlite_pragmas_applied_on_connect(tmp_path, monkeypatch):
+    monkeypatch.setenv("SQLITE_BUSY_TIMEOUT", "1234")
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    try:
+        with engine.connect() as connection:
+            assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            # NORMAL
+            assert connection.execute(text("PRAGMA synchronous")).scalar() == 1
+            assert connection.execute(text("PRAGMA busy_timeout")).scalar() == 1234
+    finally:
+        engine.dispose()
+
+
+def test_async_engine_applies_pragmas(tmp_path):
+    async def run():
+        engine = create_async_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+        try:
+            async with engine.connect() as connection:
+                return (await connection.execute(text("PRAGMA journal_mode"))).scalar()
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(run()) == "wal"
+
+
+def test_get_async_database_url():
+    assert get_async_database_url("sqlite:///opros_bot.db") == "sqlite+aiosqlite:///opros_bot.db"
+    assert get_async_database_url("postgresql://u:p@db/opros") == "postgresql+asyncpg://u:p@db/opros"
+    assert get_async_database_url("postgresql+psycopg://u:p@db/opros") == "postgresql+psycopg://u:p@db/opros"
+
+
+def test_pool_options_only_for_server_databases(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "20")
+    assert get_engine_options("sqlite:///opros_bot.db") == {}
+    options = get_engine_options("postgresql://u:p@db/opros")
+    assert options["pool_size"] == 20
+    assert options["pool_pre_ping"] is True
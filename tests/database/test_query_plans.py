@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy import event
+
+from database import database
+
+
+@pytest.fixture
+def populated_db(db):
+    database.create_user(db, 1, "admin", "Админ", None, None, None, is_admin=True)
+    database.create_user(db, 2, "user", "Студент", None, None, None)
+    poll = database.create_poll_db(db, "Опрос", "Описание", 1, "code")
+    question = database.create_question(db, poll.id, "Вопрос", ["a", "b"], ["a"], 1)
+    database.create_poll_response(db, poll.id, 2)
+    return db, poll.id, question.id
+
+
+HELPERS = {
+    "get_user_by_telegram_id": lambda db, poll_id, question_id: database.get_user_by_telegram_id(db, 2),
+    "get_admins": lambda db, poll_id, question_id: database.get_admins(db),
+    "add_admin": lambda db, poll_id, question_id: database.add_admin(db, 2),
+    "remove_admin": lambda db, poll_id, question_id: database.remove_admin(db, 2),
+    "is_admin": lambda db, poll_id, question_id: database.is_admin(db, 1),
+    "get_admin_count": lambda db, poll_id, question_id: database.get_admin_count(db),
+    "get_polls_by_creator": lambda db, poll_id, question_id: database.get_polls_by_creator(db, 1),
+    "get_poll_by_access_code": lambda db, poll_id, question_id: database.get_poll_by_access_code(db, "code"),
+    "create_poll_response": lambda db, poll_id, question_id: database.create_poll_response(db, poll_id, 3),
+    "get_answer_options": lambda db, poll_id, question_id: database.get_answer_options(db, question_id),
+    "get_users_by_poll_id": lambda db, poll_id, question_id: database.get_users_by_poll_id(db, poll_id),
+    "create_question_response":
+        lambda db, poll_id, question_id: database.create_question_response(db, poll_id, 2, question_id, ["a"]),
+    "get_leaderboard": lambda db, poll_id, question_id: database.get_leaderboard(db, poll_id),
+    "recalculate_poll_totals": lambda db, poll_id, question_id: database.recalculate_poll_totals(db, poll_id),
+    "finalize_poll": lambda db, poll_id, question_id: database.finalize_poll(db, poll_id),
+    "create_question_responses_bulk":
+        lambda db, poll_id, question_id: database.create_question_responses_bulk(db, poll_id, question_id, {2: ["a"]}),
+}
+
+
+@pytest.mark.parametrize("helper", sorted(HELPERS))
+def test_helper_queries_use_indexes(engine, populated_db, helper):
+    db, poll_id, question_id = populated_db
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        HELPERS[helper](db, poll_id, question_id)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert statements
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+            table_scans = [row[-1] for row in plan if row[-1].startswith("SCAN") and "INDEX" not in row[-1]]
+            assert not table_scans, f"{statement}\n{plan}"
@@ -0,0 +1,20 @@
+from handlers.poll import create_answer_keyboard
+from keyboards.callbacks import AnswerCallback
+
+
+def test_answer_callback_round_trip():
+    packed = AnswerCallback(poll_id=123456, question_id=7890123, option=11).pack()
+
+    assert packed == "a1:123456:7890123:11"
+    assert AnswerCallback.unpack(packed) == AnswerCallback(poll_id=123456, question_id=7890123, option=11)
+
+
+def test_answer_keyboard_fits_telegram_limit_for_long_options():
+    options = ["Очень длинный вариант ответа: " + "x" * 200, "Короткий"]
+
+    keyboard = create_answer_keyboard(options, 2 ** 31, 2 ** 31, selected_options=["Короткий"])
+
+    buttons = [row[0] for row in keyboard.inline_keyboard]
+    assert [button.text for button in buttons] == [options[0], "✅ Короткий"]
+    assert all(len(button.callback_data.encode()) <= 64 for button in buttons)
+    assert AnswerCallback.unpack(buttons[1].callback_data).option == 1
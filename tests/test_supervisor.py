@@ -0,0 +1,117 @@
+import asyncio
+import multiprocessing
+import os
+
+from supervisor import Supervisor
+from utils.webhook import get_update_key
+from tests.utils.test_webhook import callback_update, message_update
+
+
+def test_updates_of_one_chat_go_to_one_worker_in_order():
+    results = multiprocessing.Queue()
+
+    def worker(index, updates, broadcast_state):
+        while True:
+            update = updates.get()
+            if update is None:
+                break
+            results.put((index, update["update_id"]))
+
+    supervisor = Supervisor(workers=3, target=worker)
+    updates = [message_update(update_id, update_id % 20, "x") for update_id in range(100)]
+    updates.append(callback_update(100, 5, "a1:1:1:0"))
+
+    async def run():
+        supervisor.start_feeders()
+        for update in updates:
+            await supervisor.submit(update)
+        await supervisor.stop_feeders()
+
+    supervisor.start()
+    try:
+        asyncio.run(run())
+    finally:
+        supervisor.stop()
+
+    handled = [results.get(timeout=5) for _ in updates]
+    order_by_chat = {}
+    for index, update_id in handled:
+        assert index == supervisor.route(updates[update_id])
+        order_by_chat.setdefault(get_update_key(updates[update_id]), []).append(update_id)
+
+    assert len({index for index, _ in handled}) == 3
+    for chat_id in range(20):
+        assert order_by_chat[chat_id] == list(range(chat_id, 100, 20))
+
+
+def test_dead_worker_is_restarted_with_its_queue():
+    results = multiprocessing.Queue()
+
+    def worker(index, updates, broadcast_state):
+        while True:
+            update = updates.get()
+            if update is None:
+                break
+            if update["message"]["text"] == "crash":
+                os._exit(1)
+            results.put((index, update["update_id"]))
+
+    supervisor = Supervisor(workers=2, target=worker)
+    index = supervisor.route(message_update(1, 7, "crash"))
+
+    async def run():
+        supervisor.start_feeders()
+        await supervisor.submit(message_update(1, 7, "crash"))
+        await supervisor.pending[index].join()
+        supervisor.processes[index].join(5)
+        # Обновление, пришедшее после падения, ждет в очереди упавшего процесса
+        await supervisor.submit(message_update(2, 7, "x"))
+        await supervisor.stop_feeders()
+
+        assert supervisor.check_workers() == 1
+        assert supervisor.check_workers() == 0
+        assert results.get(timeout=5) == (index, 2)
+        assert supervisor.restarts == 1
+
+    supervisor.start()
+    try:
+        asyncio.run(run())
+    finally:
+        supervisor.stop()
+
+
+def test_full_worker_does_not_block_other_workers():
+    results = multiprocessing.Queue()
+    blocked = multiprocessing.Event()
+
+    def worker(index, updates, broadcast_state):
+        while True:
+            update = updates.get()
+            if update is None:
+                break
+            if update["message"]["text"] == "slow":
+                blocked.wait(10)
+            results.put((index, update["update_id"]))
+
+    supervisor = Supervisor(workers=2, target=worker, queue_size=1)
+    chats = {}
+    for chat_id in range(100):
+        chats.setdefault(supervisor.route(message_update(0, chat_id, "x")), chat_id)
+    slow_chat, fast_chat = chats[0], chats[1]
+
+    async def run():
+        supervisor.start_feeders()
+        # Очередь и буфер первого процесса заполнены, пока он обрабатывает долгое обновление
+        for update_id in range(4):
+            await supervisor.submit(message_update(update_id, slow_chat, "slow" if update_id == 0 else "x"))
+        await asyncio.wait_for(supervisor.submit(message_update(10, fast_chat, "x")), 1)
+        handled = await asyncio.get_running_loop().run_in_executor(None, results.get, True, 5)
+        blocked.set()
+        await supervisor.stop_feeders()
+        return handled
+
+    supervisor.start()
+    try:
+        assert asyncio.run(run()) == (1, 10)
+    finally:
+        supervisor.stop()
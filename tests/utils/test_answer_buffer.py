@@ -0,0 +1,136 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from utils.answer_buffer import MemoryAnswerBuffer, SQLiteAnswerBuffer
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def buffer(request, tmp_path):
+    if request.param == "memory":
+        buffer = MemoryAnswerBuffer(ttl=60)
+    else:
+        buffer = SQLiteAnswerBuffer(str(tmp_path / "answers.db"), ttl=60)
+    yield buffer
+    buffer.close()
+
+
+def test_toggle_selects_and_unselects(buffer):
+    assert asyncio.run(buffer.toggle(1, 10, 100, "a")) == ["a"]
+    assert asyncio.run(buffer.toggle(1, 10, 100, "b")) == ["a", "b"]
+    assert asyncio.run(buffer.toggle(1, 10, 100, "a")) == ["b"]
+    assert buffer.get(1, 10, 100) == ["b"]
+    assert buffer.get(2, 10, 100) == []
+
+
+def test_drain_returns_answers_for_one_question(buffer):
+    asyncio.run(buffer.toggle(1, 10, 100, "a"))
+    asyncio.run(buffer.toggle(2, 10, 100, "b"))
+    asyncio.run(buffer.toggle(1, 10, 101, "c"))
+
+    assert asyncio.run(buffer.drain(10, 100)) == {1: ["a"], 2: ["b"]}
+    assert asyncio.run(buffer.drain(10, 100)) == {}
+    assert buffer.get(1, 10, 101) == ["c"]
+
+
+def test_evict_expired(buffer):
+    asyncio.run(buffer.toggle(1, 10, 100, "a"))
+
+    assert buffer.evict_expired(now=0) == 0
+    assert buffer.evict_expired(now=10 ** 10) == 1
+    assert asyncio.run(buffer.drain(10, 100)) == {}
+
+
+def test_sqlite_buffer_survives_restart(tmp_path):
+    path = str(tmp_path / "answers.db")
+    buffer = SQLiteAnswerBuffer(path)
+    asyncio.run(buffer.toggle(1, 10, 100, "a"))
+    asyncio.run(buffer.toggle(1, 10, 100, "b"))
+    asyncio.run(buffer.toggle(1, 10, 100, "a"))
+    asyncio.run(buffer.toggle(2, 10, 100, "c"))
+    buffer.close()
+
+    restarted = SQLiteAnswerBuffer(path)
+    try:
+        assert restarted.get(1, 10, 100) == ["b"]
+        assert asyncio.run(restarted.toggle(2, 10, 100, "d")) == ["c", "d"]
+        assert asyncio.run(restarted.drain(10, 100)) == {1: ["b"], 2: ["c", "d"]}
+    finally:
+        restarted.close()
+
+
+def test_stats_follow_toggles(buffer):
+    correct = ["a", "b"]
+    asyncio.run(buffer.toggle(1, 10, 100, "a", correct))
+    asyncio.run(buffer.toggle(1, 10, 100, "b", correct))
+    asyncio.run(buffer.toggle(2, 10, 100, "a", correct))
+    asyncio.run(buffer.toggle(3, 10, 100, "c", correct))
+    asyncio.run(buffer.toggle(3, 10, 100, "c", correct))
+
+    stats = buffer.stats(10, 100)
+
+    assert (stats.answered, stats.correct) == (2, 1)
+    assert stats.percent_correct == 50
+    assert {option: count for option, count in stats.options.items() if count} == {"a": 2, "b": 1}
+
+    assert asyncio.run(buffer.stats_async(10, 100)) == stats
+
+    asyncio.run(buffer.drain(10, 100))
+    assert buffer.stats(10, 100).answered == 0
+
+
+def test_sqlite_stats_are_read_without_count(tmp_path):
+    path = str(tmp_path / "answers.db")
+    writer = SQLiteAnswerBuffer(path)
+    reader = SQLiteAnswerBuffer(path)
+    statements = []
+    reader._connection.set_trace_callback(statements.append)
+    try:
+        for user_id in range(100):
+            asyncio.run(writer.toggle(user_id, 10, 100, "a", ["a"]))
+
+        # Счетчики, записанные другим процессом, видны сразу
+        assert reader.stats(10, 100).correct == 100
+        assert not [statement for statement in statements if "COUNT(" in statement.upper()]
+    finally:
+        writer.close()
+        reader.close()
+
+
+def test_failed_append_is_rolled_back(buffer, monkeypatch):
+    asyncio.run(buffer.toggle(1, 10, 100, "a", ["a"]))
+
+    def fail(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(buffer, "_append", fail)
+    with pytest.raises(sqlite3.OperationalError):
+        asyncio.run(buffer.toggle(1, 10, 100, "b", ["a"]))
+    monkeypatch.undo()
+
+    # Память совпадает с сохраненным состоянием
+    assert buffer.get(1, 10, 100) == ["a"]
+    assert buffer.stats(10, 100).correct == 1
+    assert asyncio.run(buffer.drain(10, 100)) == {1: ["a"]}
+
+
+def test_sqlite_writes_run_off_the_event_loop(tmp_path):
+    buffer = SQLiteAnswerBuffer(str(tmp_path / "answers.db"))
+    blocker = sqlite3.connect(str(tmp_path / "answers.db"), isolation_level=None)
+    blocker.execute("PRAGMA busy_timeout=5000")
+
+    async def run():
+        # Пока другой процесс держит блокировку записи, цикл событий продолжает работать
+        blocker.execute("BEGIN IMMEDIATE")
+        toggle = asyncio.create_task(buffer.toggle(1, 10, 100, "a"))
+        await asyncio.sleep(0.1)
+        assert not toggle.done()
+        blocker.execute("COMMIT")
+        return await toggle
+
+    try:
+        assert asyncio.run(run()) == ["a"]
+    finally:
+        blocker.close()
+        buffer.close()
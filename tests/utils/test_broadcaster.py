@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from utils.broadcaster import Broadcaster, SharedTokenBucket, TokenBucket
+
+
+def test_token_bucket_limits_rate():
+    async def run():
+        bucket = TokenBucket(rate=50, capacity=5)
+        started = time.monotonic()
+        for _ in range(15):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # 5 токенов выдаются сразу, остальные 10 - со скоростью 50 в секунду
+    assert asyncio.run(run()) >= 0.18
+
+
+def test_broadcast_sends_to_every_chat():
+    sent = []
+
+    async def send(chat_id):
+        sent.append(chat_id)
+
+    broadcaster = Broadcaster(rate=1000, concurrency=10, per_chat_interval=0)
+    stats = asyncio.run(broadcaster.broadcast(range(100), send))
+
+    assert sorted(sent) == list(range(100))
+    assert stats.sent == 100
+    assert stats.failed == 0
+
+
+def test_broadcast_retries_after_flood_control():
+    attempts = {}
+
+    async def send(chat_id):
+        attempts[chat_id] = attempts.get(chat_id, 0) + 1
+        if chat_id == 3 and attempts[chat_id] == 1:
+            raise TelegramRetryAfter(SendMessage(chat_id=chat_id, text="x"), "Flood control", retry_after=0)
+
+    broadcaster = Broadcaster(rate=1000, concurrency=4, per_chat_interval=0)
+    stats = asyncio.run(broadcaster.broadcast(range(10), send))
+
+    assert attempts[3] == 2
+    assert stats.sent == 10
+    assert stats.retries == 1
+
+
+def test_broadcast_counts_failures_and_reports_progress():
+    progress = []
+
+    async def send(chat_id):
+        await asyncio.sleep(0.01)
+        if chat_id % 2:
+            raise RuntimeError("blocked")
+
+    async def on_progress(stats):
+        progress.append(stats.processed)
+
+    broadcaster = Broadcaster(rate=1000, concurrency=1, per_chat_interval=0)
+    stats = asyncio.run(broadcaster.broadcast(range(10), send, on_progress=on_progress, progress_interval=0.02))
+
+    assert stats.sent == 5
+    assert stats.failed == 5
+    assert progress and progress == sorted(progress)
+
+
+def test_shared_token_bucket_is_shared_between_instances():
+    # Экземпляры в разных процессах работают с одним состоянием
+    state = SharedTokenBucket.create_state(5)
+    first = SharedTokenBucket(state, rate=50, capacity=5)
+    second = SharedTokenBucket(state, rate=50, capacity=5)
+
+    async def run():
+        for _ in range(5):
+            await first.acquire()
+        started = time.monotonic()
+        for _ in range(5):
+            await second.acquire()
+        return time.monotonic() - started
+
+    # Токены первого экземпляра израсходованы, второй получает их со скоростью 50 в секунду
+    assert asyncio.run(run()) >= 0.09
+
+    second.pause(0.05)
+    assert first._take() > 0
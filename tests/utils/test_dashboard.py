@@ -0,0 +1,69 @@
+import asyncio
+
+from utils.answer_buffer import MemoryAnswerBuffer
+from utils.dashboard import Dashboard, DashboardRefresher, render_dashboard
+
+
+class FakeBot:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_message_text(self, text, chat_id, message_id):
+        self.edits.append(text)
+
+
+def test_render_dashboard():
+    buffer = MemoryAnswerBuffer()
+    asyncio.run(buffer.toggle(1, 10, 100, "Да", ["Да"]))
+    asyncio.run(buffer.toggle(2, 10, 100, "Нет", ["Да"]))
+
+    text = render_dashboard(buffer.stats(10, 100), ["Да", "Нет"], participants=4)
+
+    assert text == (
+        "📊 Ответили: 2 из 4\n"
+        "✅ Полностью верно: 1 (50%)\n"
+        "\n"
+        "1. Да: 1 █████\n"
+        "2. Нет: 1 █████"
+    )
+
+
+def test_dashboard_refreshes_only_on_changes():
+    bot = FakeBot()
+    buffer = MemoryAnswerBuffer()
+
+    async def run():
+        refresher = DashboardRefresher(interval=0.02)
+        refresher.start(Dashboard(bot, 1, 2, buffer, 10, 100, ["a", "b"], participants=3))
+        await asyncio.sleep(0.05)
+        for user_id in range(3):
+            await buffer.toggle(user_id, 10, 100, "a", ["a"])
+        await asyncio.sleep(0.05)
+        await buffer.toggle(0, 10, 100, "b", ["a"])
+        await refresher.stop(10, 100)
+
+    asyncio.run(run())
+
+    # Без ответов сводка не перерисовывается, три быстрых ответа дают одну правку
+    assert len(bot.edits) == 2
+    assert bot.edits[0].startswith("📊 Ответили: 3 из 3\n✅ Полностью верно: 3 (100%)")
+    assert "Полностью верно: 2 (67%)" in bot.edits[1]
+
+
+def test_stop_poll_stops_all_dashboards_of_the_poll():
+    bot = FakeBot()
+    buffer = MemoryAnswerBuffer()
+
+    async def run():
+        refresher = DashboardRefresher(interval=60)
+        for poll_id, question_id in ((10, 100), (10, 101), (11, 100)):
+            refresher.start(Dashboard(bot, 1, 2, buffer, poll_id, question_id, ["a"], participants=1))
+        tasks = [task for _, task in refresher._tasks.values()]
+
+        await refresher.stop_poll(10)
+
+        assert list(refresher._tasks) == [(11, 100)]
+        assert [task.cancelled() for task in tasks] == [True, True, False]
+        await refresher.stop_poll(11)
+
+    asyncio.run(run())
@@ -0,0 +1,56 @@
+import asyncio
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from utils.edit_coalescer import EditCoalescer
+
+
+def keyboard(*selected):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=f"✅ {option}" if option in selected else option, callback_data=option)]
+        for option in ("a", "b", "c")
+    ])
+
+
+def test_rapid_toggles_are_coalesced_into_one_edit():
+    edits = []
+
+    async def edit(markup):
+        edits.append(markup)
+
+    async def run():
+        coalescer = EditCoalescer(delay=0.05)
+        for selected in (("a",), ("a", "b"), ("a", "b", "c")):
+            coalescer.submit((1, 10), keyboard(*selected), edit, current=keyboard())
+        await asyncio.sleep(0.1)
+        return coalescer
+
+    coalescer = asyncio.run(run())
+
+    assert edits == [keyboard("a", "b", "c")]
+    assert (coalescer.submitted, coalescer.sent) == (3, 1)
+
+
+def test_unchanged_markup_is_not_sent():
+    edits = []
+
+    async def edit(markup):
+        edits.append(markup)
+
+    async def run():
+        coalescer = EditCoalescer(delay=0.01)
+        # Вариант отмечен и тут же снят - клавиатура не изменилась
+        coalescer.submit((1, 10), keyboard("a"), edit, current=keyboard())
+        coalescer.submit((1, 10), keyboard(), edit)
+        await asyncio.sleep(0.05)
+        coalescer.submit((1, 10), keyboard("b"), edit)
+        coalescer.submit((2, 20), keyboard("c"), edit)
+        await coalescer.flush()
+        coalescer.submit((1, 10), keyboard("b"), edit)
+        await coalescer.flush()
+        return coalescer
+
+    coalescer = asyncio.run(run())
+
+    assert edits == [keyboard("b"), keyboard("c")]
+    assert coalescer.skipped == 2
@@ -0,0 +1,171 @@
+import asyncio
+import sqlite3
+
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import DefaultKeyBuilder, StorageKey
+
+from utils.fsm_storage import SQLiteStorage
+
+
+class Form(StatesGroup):
+    waiting = State()
+
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+
+
+def test_state_survives_restart_and_is_shared(tmp_path):
+    path = str(tmp_path / "fsm.db")
+
+    async def run():
+        first = SQLiteStorage(path)
+        await first.set_state(KEY, Form.waiting)
+        await first.update_data(KEY, {"questions_list": [1, 2, 3], "current_question_index": 1})
+        # До сброса изменения видны только своему процессу
+        second = SQLiteStorage(path)
+        assert await second.get_state(KEY) is None
+        assert await first.get_state(KEY) == "Form:waiting"
+        await first.close()
+
+        assert await second.get_state(KEY) == "Form:waiting"
+        assert await second.get_data(KEY) == {"questions_list": [1, 2, 3], "current_question_index": 1}
+        await second.close()
+
+    asyncio.run(run())
+
+
+def test_writes_are_batched_into_one_transaction(tmp_path):
+    path = str(tmp_path / "fsm.db")
+
+    async def run():
+        storage = SQLiteStorage(path, flush_interval=0.01)
+        statements = []
+        storage._writer.set_trace_callback(statements.append)
+        for user_id in range(50):
+            key = StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+            await storage.set_state(key, Form.waiting)
+            await storage.set_data(key, {"user_id": user_id})
+        await asyncio.sleep(0.05)
+        await storage.close()
+        return statements
+
+    statements = asyncio.run(run())
+
+    assert sum(statement.startswith("BEGIN") for statement in statements) == 1
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM fsm_storage").fetchone() == (50,)
+
+
+def test_clear_expiry_and_namespacing(tmp_path):
+    path = str(tmp_path / "fsm.db")
+
+    async def run():
+        storage = SQLiteStorage(path, ttl=60)
+        other_bot = SQLiteStorage(path, key_builder=DefaultKeyBuilder(prefix="other_bot", with_bot_id=True))
+        await storage.set_state(KEY, Form.waiting)
+        await other_bot.set_data(KEY, {"poll_id": 5})
+        await storage.flush()
+        await other_bot.flush()
+
+        assert await storage.get_data(KEY) == {}
+        assert await other_bot.get_state(KEY) is None
+
+        await storage.set_state(KEY, None)
+        await storage.flush()
+        assert storage.evict_expired() == 0
+        # Запись второго бота устаревает через ttl
+        assert other_bot.evict_expired(now=10 ** 12) == 1
+        await storage.close()
+        await other_bot.close()
+
+    asyncio.run(run())
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM fsm_storage").fetchone() == (0,)
+
+
+def test_failed_flush_keeps_pending_writes(tmp_path):
+    path = str(tmp_path / "fsm.db")
+
+    async def run():
+        storage = SQLiteStorage(path, flush_interval=0.01)
+        storage._writer.execute("PRAGMA busy_timeout=0")
+        blocker = sqlite3.connect(path, isolation_level=None)
+        blocker.execute("BEGIN IMMEDIATE")
+
+        await storage.update_data(KEY, {"questions_list": [1, 2, 3]})
+        await asyncio.sleep(0.05)
+        # Запись не прошла, но данные не потеряны, а более новые изменения не затерты
+        assert await storage.get_data(KEY) == {"questions_list": [1, 2, 3]}
+        await storage.set_state(KEY, Form.waiting)
+
+        blocker.execute("COMMIT")
+        blocker.close()
+        await asyncio.sleep(0.05)
+        assert not storage._pending
+        await storage.close()
+
+        reopened = SQLiteStorage(path)
+        assert await reopened.get_state(KEY) == "Form:waiting"
+        assert await reopened.get_data(KEY) == {"questions_list": [1, 2, 3]}
+        await reopened.close()
+
+    asyncio.run(run())
+
+
+def test_flush_does_not_block_the_event_loop(tmp_path):
+    path = str(tmp_path / "fsm.db")
+
+    async def run():
+        storage = SQLiteStorage(path)
+        blocker = sqlite3.connect(path, isolation_level=None)
+        blocker.execute("BEGIN IMMEDIATE")
+        await storage.set_state(KEY, Form.waiting)
+        flush = asyncio.create_task(storage.flush())
+
+        # Пока другой процесс держит блокировку, чтение продолжает работать
+        await asyncio.sleep(0.1)
+        assert not flush.done()
+        assert await storage.get_state(KEY) == "Form:waiting"
+
+        blocker.execute("COMMIT")
+        blocker.close()
+        await flush
+        await storage.close()
+
+    asyncio.run(run())
+
+
+def test_close_flushes_pending_writes(tmp_path):
+    path = str(tmp_path / "fsm.db")
+
+    async def run():
+        storage = SQLiteStorage(path, flush_interval=60)
+        await storage.set_state(KEY, Form.waiting)
+        await storage.set_data(KEY, {"poll_id": 1})
+        reader = SQLiteStorage(path)
+        assert await reader.get_state(KEY) is None
+
+        await storage.close()
+
+        assert await reader.get_state(KEY) == "Form:waiting"
+        assert await reader.get_data(KEY) == {"poll_id": 1}
+        await reader.close()
+
+    asyncio.run(run())
+
+
+def test_zero_flush_interval_writes_through(tmp_path):
+    path = str(tmp_path / "fsm.db")
+
+    async def run():
+        storage = SQLiteStorage(path, flush_interval=0)
+        reader = SQLiteStorage(path)
+        await storage.set_state(KEY, Form.waiting)
+
+        # Изменение уже в файле, хотя storage не закрыт
+        assert await reader.get_state(KEY) == "Form:waiting"
+        assert storage._flush_handle is None
+        await storage.close()
+        await reader.close()
+
+    asyncio.run(run())
@@ -0,0 +1,27 @@
+from collections import Counter
+
+from utils.hash_ring import HashRing
+
+
+def test_keys_spread_over_all_nodes():
+    ring = HashRing(range(4))
+
+    counts = Counter(ring.get(key) for key in range(10000))
+
+    assert set(counts) == {0, 1, 2, 3}
+    assert min(counts.values()) > 1500
+
+
+def test_adding_node_moves_few_keys():
+    ring = HashRing(range(4))
+    before = {key: ring.get(key) for key in range(10000)}
+
+    ring.add(4)
+    moved = [key for key in before if ring.get(key) != before[key]]
+
+    # Переезжают только ключи, доставшиеся новому узлу
+    assert all(ring.get(key) == 4 for key in moved)
+    assert len(moved) < 3500
+
+    ring.remove(4)
+    assert {key: ring.get(key) for key in range(10000)} == before
@@ -0,0 +1,92 @@
+import io
+import json
+import logging
+import queue
+
+import pytest
+
+from utils.log import RATE_LIMITED, SAMPLED, RateLimitFilter, SamplingFilter, _QueueHandler, parse_levels, \
+    setup_logging, shutdown_logging
+
+
+@pytest.fixture
+def output():
+    stream = io.StringIO()
+    setup_logging(level="INFO", levels="noisy=WARNING", fmt="json", stream=stream)
+    yield stream
+    shutdown_logging()
+    logging.getLogger().handlers.clear()
+
+
+def read_records(stream):
+    shutdown_logging()
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_json_output_with_module_levels(output):
+    logging.getLogger("handlers.poll").info("Опрос %s завершен", 5, extra={"poll_id": 5})
+    logging.getLogger("noisy").info("не выводится")
+    logging.getLogger("noisy").warning("выводится")
+
+    records = read_records(output)
+
+    assert [record["message"] for record in records] == ["Опрос 5 завершен", "выводится"]
+    assert records[0]["logger"] == "handlers.poll"
+    assert records[0]["poll_id"] == 5
+
+
+def test_arguments_are_captured_when_logging():
+    answers = ["a"]
+    record = logging.makeLogRecord({"msg": "Ответы: %s", "args": (answers,)})
+
+    prepared = _QueueHandler(queue.SimpleQueue()).prepare(record)
+    answers.append("b")
+
+    # Значение на момент вызова, даже если поток вывода обработает запись позже
+    assert prepared.getMessage() == "Ответы: ['a']"
+    assert prepared.args is None
+
+
+def test_disabled_records_are_not_formatted(output):
+    class Lazy:
+        formatted = 0
+
+        def __str__(self):
+            Lazy.formatted += 1
+            return "lazy"
+
+    logging.getLogger("handlers.poll").debug("отключено %s", Lazy())
+    logging.getLogger("handlers.poll").info("включено %s", "lazy")
+
+    assert read_records(output)[0]["message"] == "включено lazy"
+    assert Lazy.formatted == 0
+
+
+def test_rate_limit_filter_counts_suppressed_records():
+    rate_filter = RateLimitFilter(rate=0.001, burst=2)
+    logger = logging.getLogger("broadcast")
+    records = [logger.makeRecord(logger.name, logging.ERROR, __file__, 1, "Ошибка %s", (i,), None, extra=RATE_LIMITED)
+               for i in range(5)]
+    other = logger.makeRecord(logger.name, logging.ERROR, __file__, 1, "Другая ошибка", (), None, extra=RATE_LIMITED)
+
+    assert [rate_filter.filter(record) for record in records] == [True, True, False, False, False]
+    assert rate_filter.filter(other)
+
+    rate_filter.rate = 10 ** 6
+    assert rate_filter.filter(records[0]) and records[0].suppressed == 3
+
+
+def test_sampling_filter():
+    logger = logging.getLogger("poll")
+    sampled = logger.makeRecord(logger.name, logging.INFO, __file__, 1, "ответ", (), None, extra=SAMPLED)
+    regular = logger.makeRecord(logger.name, logging.INFO, __file__, 1, "ответ", (), None)
+
+    assert not SamplingFilter(rate=0).filter(sampled)
+    assert SamplingFilter(rate=1).filter(sampled)
+    assert SamplingFilter(rate=0).filter(regular)
+
+
+def test_parse_levels():
+    assert parse_levels(" aiogram.event=warning, handlers.poll=DEBUG,") == {
+        "aiogram.event": "WARNING", "handlers.poll": "DEBUG"
+    }
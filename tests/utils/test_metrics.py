@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher, Router, types
+from aiohttp.test_utils import TestClient, TestServer
+
+from benchmarks.fake_telegram import FakeTelegramSession
+from tests.utils.test_webhook import TOKEN, callback_update, message_update
+from utils.metrics import (API_DURATION, API_ERRORS, HANDLER_DURATION, HANDLER_ERRORS, UPDATES, UPDATES_IN_FLIGHT,
+                           Counter, Histogram, Metric, MetricsRegistry, create_metrics_app, setup_metrics)
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Время", ("handler",), buckets=(0.01, 0.1))
+    for value in (0.005, 0.05, 0.07, 3):
+        histogram.observe(value, "answer")
+
+    assert histogram.render() == [
+        "# HELP latency_seconds Время",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{handler="answer",le="0.01"} 1',
+        'latency_seconds_bucket{handler="answer",le="0.1"} 3',
+        'latency_seconds_bucket{handler="answer",le="+Inf"} 4',
+        'latency_seconds_sum{handler="answer"} 3.125',
+        'latency_seconds_count{handler="answer"} 4',
+    ]
+
+
+def test_counter_escapes_label_values():
+    counter = Counter("errors_total", "Ошибки", ("error",))
+    counter.inc('bad "value"\n')
+    counter.inc('bad "value"\n', amount=2)
+
+    assert counter.render()[-1] == 'errors_total{error="bad \\"value\\"\\n"} 3'
+
+
+def test_metric_without_samples_cannot_be_created():
+    class Incomplete(Metric):
+        kind = "gauge"
+
+    with pytest.raises(TypeError):
+        Incomplete("incomplete", "Без значений")
+
+
+def test_middlewares_record_updates_handlers_and_api_calls():
+    router = Router(name="metrics_test")
+
+    @router.message()
+    async def reply(message: types.Message):
+        await message.answer("ok")
+
+    @router.callback_query()
+    async def fail(callback: types.CallbackQuery):
+        raise RuntimeError("boom")
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    setup_metrics(dp, port=0)
+    bot = Bot(token=TOKEN, session=FakeTelegramSession())
+
+    before = (UPDATES.get("message", "handled"), UPDATES.get("callback_query", "error"),
+              API_DURATION.count("sendMessage"))
+
+    async def run():
+        await dp.emit_startup(bot=bot)
+        await dp.feed_raw_update(bot, message_update(1, 1, "x"))
+        try:
+            await dp.feed_raw_update(bot, callback_update(2, 1, "x"))
+        except RuntimeError:
+            pass
+        # Повторный старт не подключает middleware сессии второй раз
+        await dp.emit_startup(bot=bot)
+        await dp.emit_shutdown(bot=bot)
+
+    asyncio.run(run())
+
+    assert UPDATES.get("message", "handled") == before[0] + 1
+    assert UPDATES.get("callback_query", "error") == before[1] + 1
+    assert API_DURATION.count("sendMessage") == before[2] + 1
+    assert HANDLER_DURATION.count("metrics_test", "reply") == 1
+    assert HANDLER_DURATION.count("metrics_test", "fail") == 1
+    assert HANDLER_ERRORS.get("metrics_test", "fail", "RuntimeError") == 1
+    assert UPDATES_IN_FLIGHT.get("message") == 0
+    assert len(bot.session.middleware) == 1
+
+
+def test_api_errors_are_counted():
+    bot = Bot(token=TOKEN, session=FakeTelegramSession(rate_limit_probability=1.0))
+    dp = Dispatcher()
+    setup_metrics(dp, port=0)
+    before = API_ERRORS.get("sendMessage", "TelegramRetryAfter")
+
+    async def run():
+        await dp.emit_startup(bot=bot)
+        try:
+            await bot.send_message(1, "x")
+        except Exception:
+            pass
+
+    asyncio.run(run())
+    assert API_ERRORS.get("sendMessage", "TelegramRetryAfter") == before + 1
+
+
+def test_metrics_endpoint():
+    metrics = MetricsRegistry()
+    metrics.register(Counter("bot_test_total", "Тест")).inc()
+
+    async def run():
+        client = TestClient(TestServer(create_metrics_app(metrics)))
+        await client.start_server()
+        try:
+            response = await client.get("/metrics")
+            return response.status, response.headers["Content-Type"], await response.text()
+        finally:
+            await client.close()
+
+    status, content_type, text = asyncio.run(run())
+    assert status == 200
+    assert content_type.startswith("text/plain; version=0.0.4")
+    assert text == "# HELP bot_test_total Тест\n# TYPE bot_test_total counter\nbot_test_total 1\n"
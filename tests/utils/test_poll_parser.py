@@ -1,6 +1,8 @@
+import io
+
 import pytest
 
-from utils.poll_parser import parse_poll_from_file
+from utils.poll_parser import ParseError, PollParseError, PollParser, parse_poll, parse_poll_from_file
 
 
 def test_parse_poll_from_file_valid_input():
@@ -172,3 +174,57 @@ def test_parse_poll_multiple_empty_lines():
 
     # Проверяем сообщение исключения
     assert str(exc_info.value) == "Incorrect format on line 7: expected a numbered question."
+
+
+def test_parse_poll_reports_all_errors():
+    file_content = """
+        1. Question 1
+        + Correct answer 1
+        Invalid answer format
+        - Incorrect answer 1
+
+        Question 2 without number
+        - Incorrect answer 2
+
+        3. Question 3
+        + Correct answer 3
+    """
+    with pytest.raises(PollParseError) as exc_info:
+        parse_poll_from_file(file_content)
+
+    # После ошибки ответы без вопроса пропускаются до следующего вопроса
+    assert exc_info.value.errors == [
+        ParseError(3, "expected '+', '-', or a numbered question."),
+        ParseError(6, "expected a numbered question."),
+    ]
+    assert str(exc_info.value) == (
+        "Incorrect format on line 3: expected '+', '-', or a numbered question.\n"
+        "Incorrect format on line 6: expected a numbered question."
+    )
+
+
+def test_parse_poll_from_binary_stream():
+    stream = io.BytesIO("\n1) Вопрос 1\n+ Да\n- Нет\n\n2: Вопрос 2\n- Нет\n+ Да\n".encode("utf-8"))
+
+    assert parse_poll(stream) == [
+        {'text': 'Вопрос 1', 'options': ['Да', 'Нет'], 'correct_answers': ['Да'], 'order': 1},
+        {'text': 'Вопрос 2', 'options': ['Нет', 'Да'], 'correct_answers': ['Да'], 'order': 2},
+    ]
+
+
+def test_parse_poll_error_line_numbers_count_from_stream_start():
+    with pytest.raises(PollParseError) as exc_info:
+        parse_poll(["", "1. Question", "+ Answer", "Invalid"])
+    assert exc_info.value.errors == [ParseError(4, "expected '+', '-', or a numbered question.")]
+
+
+def test_poll_parser_yields_questions_as_they_complete():
+    parser = PollParser()
+
+    assert parser.feed("1. Question 1") is None
+    assert parser.feed("+ Answer") is None
+    assert parser.feed("2. Question 2")["text"] == "Question 1"
+    assert parser.feed("- Answer") is None
+    assert parser.finish()["text"] == "Question 2"
+    assert parser.finish() is None
+    assert parser.errors == []
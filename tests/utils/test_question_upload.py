@@ -0,0 +1,127 @@
+import asyncio
+import codecs
+from types import SimpleNamespace
+
+import pytest
+from aiogram.types import Document
+
+from handlers.admin import format_parse_errors
+from utils.poll_parser import PollParseError
+from utils.question_upload import FileTooLargeError, LineDecoder, QuestionFileReader, download_questions
+
+CONTENT = "1. Вопрос\n+ Да\n- Нет\n\n2. Второй вопрос\n- Нет\n+ Да"
+EXPECTED = [
+    {'text': 'Вопрос', 'options': ['Да', 'Нет'], 'correct_answers': ['Да'], 'order': 1},
+    {'text': 'Второй вопрос', 'options': ['Нет', 'Да'], 'correct_answers': ['Да'], 'order': 2},
+]
+
+
+class FakeBot:
+    def __init__(self, data: bytes, chunk_size: int = 5):
+        self.data = data
+        self.chunk_size = chunk_size
+        self.downloaded = 0
+
+    async def get_file(self, file_id):
+        return SimpleNamespace(file_id=file_id, file_path="documents/file.txt")
+
+    async def download_file(self, file_path, destination, timeout, chunk_size, seek):
+        for start in range(0, len(self.data), self.chunk_size):
+            chunk = self.data[start:start + self.chunk_size]
+            destination.write(chunk)
+            destination.flush()
+            self.downloaded += len(chunk)
+
+
+def make_document(size=None) -> Document:
+    return Document(file_id="file", file_unique_id="unique", file_size=size)
+
+
+def decode_in_chunks(data: bytes, chunk_size: int) -> list:
+    decoder = LineDecoder()
+    lines = []
+    for start in range(0, len(data), chunk_size):
+        lines.extend(decoder.feed(data[start:start + chunk_size]))
+    return lines + decoder.finish()
+
+
+@pytest.mark.parametrize("data", [
+    CONTENT.encode("utf-8"),
+    codecs.BOM_UTF8 + CONTENT.encode("utf-8"),
+    CONTENT.encode("cp1251"),
+    CONTENT.replace("\n", "\r\n").encode("utf-8"),
+])
+def test_line_decoder_handles_encodings_and_split_characters(data):
+    # Части по 3 байта разрезают двухбайтовые символы UTF-8
+    lines = [line.rstrip("\r") for line in decode_in_chunks(data, 3)]
+    assert lines == CONTENT.split("\n")
+
+
+def test_line_decoder_detects_encoding_from_first_non_ascii_line():
+    decoder = LineDecoder()
+    lines = decoder.feed(b"1. Question\n" + "+ Ответ\n".encode("cp1251"))
+    assert lines == ["1. Question", "+ Ответ"]
+    assert decoder.encoding == "cp1251"
+
+
+def test_line_decoder_keeps_encoding_after_invalid_line():
+    decoder = LineDecoder()
+    lines = decoder.feed("1. Вопрос\n".encode("utf-8") + b"+ \xc2\n" + "- Ответ\n".encode("utf-8"))
+    # Строка с лишним байтом не переключает файл на cp1251
+    assert lines == ["1. Вопрос", b"+ \xc2", "- Ответ"]
+    assert decoder.encoding == "utf-8"
+
+
+def test_question_file_reader_reports_undecodable_line():
+    reader = QuestionFileReader()
+    reader.write("1. Вопрос\n+ Да\n".encode("utf-8") + b"- \xff\xfe\n" + "2. Второй\n+ Ответ\n".encode("utf-8"))
+
+    with pytest.raises(PollParseError) as exc_info:
+        reader.finish()
+    assert [(error.line_number, error.message) for error in exc_info.value.errors] == [(3, "line is not valid utf-8 text.")]
+
+
+def test_undecodable_line_is_translated_for_admin():
+    bot = FakeBot("1. Вопрос\n+ Да\n".encode("utf-8") + b"- \xff\xfe\n")
+    with pytest.raises(PollParseError) as exc_info:
+        asyncio.run(download_questions(bot, make_document()))
+
+    assert format_parse_errors(exc_info.value) == (
+        "Найдено ошибок: 1\n"
+        "Неверный формат в строке 3: строка не читается в кодировке utf-8."
+    )
+
+
+def test_download_questions_parses_stream():
+    bot = FakeBot(CONTENT.encode("utf-8"))
+    assert asyncio.run(download_questions(bot, make_document())) == EXPECTED
+
+
+def test_download_questions_reports_parse_errors():
+    bot = FakeBot("1. Вопрос\n+ Да\nОшибка\n\nНе вопрос".encode("utf-8"))
+    with pytest.raises(PollParseError) as exc_info:
+        asyncio.run(download_questions(bot, make_document()))
+    assert [error.line_number for error in exc_info.value.errors] == [3, 5]
+
+
+def test_download_questions_rejects_large_file_before_download():
+    bot = FakeBot(CONTENT.encode("utf-8"))
+    with pytest.raises(FileTooLargeError):
+        asyncio.run(download_questions(bot, make_document(size=100), max_size=50))
+    assert bot.downloaded == 0
+
+
+def test_download_questions_stops_when_limit_is_exceeded():
+    # Telegram может не сообщить размер файла
+    bot = FakeBot(b"x" * 1000, chunk_size=10)
+    with pytest.raises(FileTooLargeError):
+        asyncio.run(download_questions(bot, make_document(), max_size=50))
+    assert bot.downloaded == 50
+
+
+def test_question_file_reader_keeps_only_unfinished_line():
+    reader = QuestionFileReader()
+    reader.write("1. Вопрос\n+ Да\n- Н".encode("utf-8"))
+    assert reader._decoder._pending == "- Н".encode("utf-8")
+    reader.write("ет\n".encode("utf-8"))
+    assert reader.finish() == [{'text': 'Вопрос', 'options': ['Да', 'Нет'], 'correct_answers': ['Да'], 'order': 1}]
@@ -0,0 +1,79 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.metrics import registry
+from utils.report_executor import (REPORT_BUILD_DURATION, REPORT_JOBS, REPORT_QUEUE_WAIT, ReportExecutor,
+                                   ReportQueueFullError)
+
+
+def test_generate_returns_job_result_and_records_metrics():
+    def job(poll_id, submitted_at, summary=None):
+        return f"report_{poll_id}.xlsx", 0.01, 0.02
+
+    executor = ReportExecutor(workers=1, queue_limit=2, timeout=5, job=job)
+    completed = REPORT_JOBS.get("completed")
+    builds = REPORT_BUILD_DURATION.count()
+    waits = REPORT_QUEUE_WAIT.count()
+    try:
+        assert asyncio.run(executor.generate(7)) == "report_7.xlsx"
+    finally:
+        executor.shutdown()
+
+    assert REPORT_JOBS.get("completed") == completed + 1
+    assert (REPORT_BUILD_DURATION.count(), REPORT_QUEUE_WAIT.count()) == (builds + 1, waits + 1)
+    assert "bot_report_jobs_pending 0" in registry.render()
+
+    assert executor.metrics.submitted == 1
+    assert executor.metrics.completed == 1
+    assert executor.metrics.build_time_avg == pytest.approx(0.02)
+    assert executor.pending == 0
+
+
+def test_generate_rejects_jobs_over_queue_limit():
+    release = threading.Event()
+
+    def job(poll_id, submitted_at, summary=None):
+        release.wait(5)
+        return None, 0.0, 0.0
+
+    async def run():
+        first = asyncio.create_task(executor.generate(1))
+        await asyncio.sleep(0.05)
+        with pytest.raises(ReportQueueFullError):
+            await executor.generate(2)
+        release.set()
+        await first
+
+    executor = ReportExecutor(workers=1, queue_limit=1, timeout=5, job=job)
+    try:
+        asyncio.run(run())
+    finally:
+        executor.shutdown()
+
+    assert executor.metrics.rejected == 1
+
+
+def test_generate_times_out_and_removes_late_report(tmp_path):
+    report = tmp_path / "late.xlsx"
+
+    def job(poll_id, submitted_at, summary=None):
+        time.sleep(0.2)
+        report.write_bytes(b"xlsx")
+        return str(report), 0.0, 0.2
+
+    executor = ReportExecutor(workers=1, queue_limit=1, timeout=0.05, job=job)
+    timed_out = REPORT_JOBS.get("timed_out")
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(executor.generate(1))
+        time.sleep(0.3)
+    finally:
+        executor.shutdown()
+
+    assert executor.metrics.timed_out == 1
+    assert REPORT_JOBS.get("timed_out") == timed_out + 1
+    assert executor.pending == 0
+    assert not report.exists()
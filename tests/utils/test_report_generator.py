@@ -0,0 +1,116 @@
+import os
+
+import openpyxl
+import pytest
+from sqlalchemy import event
+
+from database.database import create_user, create_poll_db, create_question, create_poll_response, \
+    create_question_responses_bulk, finalize_poll
+from utils.report_generator import generate_excel_report, iter_report_rows
+
+
+@pytest.fixture
+def query_counter(engine):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    yield statements
+    event.remove(engine, "before_cursor_execute", count)
+
+
+def create_poll_with_answers(db, users_count: int, questions_count: int):
+    poll = create_poll_db(db, "Опрос", "Описание", 1, "code")
+    questions = [
+        create_question(db, poll.id, f"Вопрос {order}", ["a", "b"], ["a"], order)
+        for order in range(1, questions_count + 1)
+    ]
+    for user_id in range(1, users_count + 1):
+        create_user(db, user_id, f"user{user_id}", "Имя", f"Фамилия{user_id}", None, None)
+        create_poll_response(db, poll.id, user_id)
+    for question in questions:
+        answers = {user_id: ["a"] if user_id % 2 else ["b"] for user_id in range(1, users_count + 1)}
+        create_question_responses_bulk(db, poll.id, question.id, answers)
+    return poll
+
+
+@pytest.mark.parametrize("users_count, questions_count", [(2, 2), (30, 10)])
+def test_generate_excel_report_uses_constant_number_of_queries(db, query_counter, users_count, questions_count):
+    poll_id = create_poll_with_answers(db, users_count, questions_count).id
+    db.expunge_all()
+    query_counter.clear()
+
+    report_path = generate_excel_report(db, poll_id)
+    try:
+        workbook = openpyxl.load_workbook(report_path)
+    finally:
+        os.remove(report_path)
+
+    # Опрос, вопросы, участники и ответы - независимо от размера опроса
+    assert len(query_counter) == 4
+    results = list(workbook["Poll Results"].values)
+    assert len(results) == users_count + 1
+    assert len(results[0]) == 4 + 2 * questions_count
+
+
+def test_iter_report_rows_pivots_answers(db):
+    poll = create_poll_with_answers(db, 3, 2)
+    question_ids = [question.id for question in sorted(poll.questions, key=lambda question: question.order)]
+
+    first, second, third = iter_report_rows(db, poll.id)
+
+    assert first.full_name == "Имя Фамилия1"
+    assert first.total_score == 2.0
+    assert second.total_score == 0.0
+    assert [first.answers[question_id] for question_id in question_ids] == [["a"], ["a"]]
+    assert [second.answers[question_id] for question_id in question_ids] == [["b"], ["b"]]
+    assert third.username == "user3"
+
+
+def test_iter_report_rows_unknown_poll(db):
+    assert list(iter_report_rows(db, 42)) == []
+
+
+def test_generate_excel_report(db):
+    poll = create_poll_with_answers(db, 2, 1)
+
+    report_path = generate_excel_report(db, poll.id)
+    try:
+        workbook = openpyxl.load_workbook(report_path)
+    finally:
+        os.remove(report_path)
+
+    assert list(workbook["Poll Description"].values)[:4] == [
+        ("Название опроса", "Опрос"),
+        ("Описание", "Описание"),
+        ("Количество вопросов", 1),
+        ("Вопрос 1", "Вопрос 1"),
+    ]
+
+    results = list(workbook["Poll Results"].values)
+    assert results[0] == ("Имя и Фамилия", "Username", "Email", "Итоговый балл", "Ответ 1", "Правильный ответ 1")
+    assert results[1] == ("Имя Фамилия1", "user1", None, 1.0, "a", "a")
+    assert results[2] == ("Имя Фамилия2", "user2", None, 0.0, "b", "a")
+
+
+def test_generate_excel_report_with_finalization_summary(db):
+    poll = create_poll_with_answers(db, 2, 1)
+    summary = finalize_poll(db, poll.id)
+
+    report_path = generate_excel_report(db, poll.id, summary)
+    try:
+        workbook = openpyxl.load_workbook(report_path)
+    finally:
+        os.remove(report_path)
+
+    assert list(workbook["Poll Description"].values)[3:6] == [
+        ("Дата завершения", summary.completed_at.replace(microsecond=0)),
+        ("Завершили опрос", 2),
+        ("Средний балл", 0.5),
+    ]
+
+
+def test_generate_excel_report_unknown_poll(db):
+    assert generate_excel_report(db, 42) is None
@@ -0,0 +1,51 @@
+import random
+
+import pytest
+
+from utils.scoring import QuestionScorer, score_answer, score_answers
+
+
+def reference_score(selected, correct):
+    # Формула, которой баллы считались до появления QuestionScorer
+    if not correct:
+        return 0.0
+    correct_count = len(set(selected) & set(correct))
+    incorrect_count = len(selected) - correct_count
+    weight = 1 / len(correct)
+    return max(0.0, correct_count * weight - incorrect_count * weight)
+
+
+def test_partial_policy_matches_previous_formula():
+    rng = random.Random(17)
+    options = list("abcdef")
+    for _ in range(200):
+        correct = rng.sample(options, rng.randint(0, 4))
+        answers = {user_id: rng.sample(options, rng.randint(0, 6)) for user_id in range(20)}
+
+        scores = score_answers(correct, answers, options=options)
+
+        assert scores == pytest.approx({user_id: reference_score(selected, correct)
+                                        for user_id, selected in answers.items()})
+
+
+@pytest.mark.parametrize("policy, expected", [
+    ("partial", [1.0, 0.5, 0.0, 0.0]),
+    ("partial_no_penalty", [1.0, 1.0, 0.5, 0.0]),
+    ("all_or_nothing", [1.0, 0.0, 0.0, 0.0]),
+])
+def test_policies(policy, expected):
+    answers = {0: ["a", "b"], 1: ["a", "b", "c"], 2: ["a", "c", "d"], 3: ["неизвестный"]}
+
+    assert list(score_answers(["a", "b"], answers, policy, options=["a", "b", "c", "d"]).values()) == expected
+
+
+def test_scores_are_computed_once_per_combination():
+    scorer = QuestionScorer(["a"], ["a", "b"])
+    scorer.score_many({user_id: ["a", "b"][:user_id % 3] for user_id in range(1000)})
+
+    assert len(scorer._scores) == 3
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        score_answer(["a"], ["a"], policy="bonus")
@@ -0,0 +1,159 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher, Router, types
+from aiohttp.test_utils import TestClient, TestServer
+
+from utils.webhook import UpdateQueue, create_webhook_app, get_update_key
+
+TOKEN = "42:TEST"
+
+
+def message_update(update_id, chat_id, text):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Студент"},
+            "text": text,
+        },
+    }
+
+
+def callback_update(update_id, user_id, data):
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "chat_instance": "1",
+            "from": {"id": user_id, "is_bot": False, "first_name": "Студент"},
+            "message": {"message_id": 1, "date": 0, "chat": {"id": -user_id, "type": "group"}},
+            "data": data,
+        },
+    }
+
+
+def test_update_key_is_chat_id():
+    assert get_update_key(message_update(1, 7, "hi")) == 7
+    assert get_update_key(callback_update(2, 7, "a1:1:1:0")) == -7
+    assert get_update_key({"update_id": 3}) == 3
+
+
+def test_webhook_feeds_updates_in_order_per_chat():
+    handled = []
+    router = Router()
+
+    @router.message()
+    async def record(message: types.Message):
+        # Разная задержка не должна менять порядок сообщений одного чата
+        await asyncio.sleep(0.01 if message.text.endswith("0") else 0)
+        handled.append((message.chat.id, message.text))
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot(token=TOKEN)
+
+    async def run():
+        queue = UpdateQueue(lambda update: dp.feed_raw_update(bot, update), workers=4, maxsize=100)
+        queue.start()
+        client = TestClient(TestServer(create_webhook_app(queue, path="/webhook", secret="s3cret")))
+        await client.start_server()
+        try:
+            response = await client.post("/webhook", json=message_update(1, 1, "x"))
+            assert response.status == 401
+
+            update_id = 0
+            for text in ("0", "1", "2"):
+                for chat_id in (1, 2, 3):
+                    update_id += 1
+                    response = await client.post(
+                        "/webhook", json=message_update(update_id, chat_id, text),
+                        headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"}
+                    )
+                    assert response.status == 200
+
+            await queue.stop()
+            response = await client.get("/health")
+            assert response.status == 503
+            return await response.json()
+        finally:
+            await client.close()
+            await bot.session.close()
+
+    health = asyncio.run(run())
+
+    assert health["processed"] == 9
+    for chat_id in (1, 2, 3):
+        assert [text for chat, text in handled if chat == chat_id] == ["0", "1", "2"]
+
+
+def test_full_queue_rejects_with_503():
+    async def run():
+        blocked = asyncio.Event()
+
+        async def handler(update):
+            await blocked.wait()
+
+        queue = UpdateQueue(handler, workers=1, maxsize=1, overflow="reject", concurrency=1)
+        queue.start()
+        client = TestClient(TestServer(create_webhook_app(queue, path="/webhook", secret="s3cret")))
+        await client.start_server()
+        try:
+            statuses = []
+            for update_id in range(3):
+                response = await client.post("/webhook", json=message_update(update_id, 1, "x"),
+                                             headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"})
+                statuses.append(response.status)
+                await asyncio.sleep(0.01)
+            health = await (await client.get("/health")).json()
+            blocked.set()
+            await queue.stop()
+            return statuses, health
+        finally:
+            await client.close()
+
+    statuses, health = asyncio.run(run())
+
+    # Первое обновление обрабатывается, второе ждет в очереди, третье отклоняется
+    assert statuses == [200, 200, 503]
+    assert health["rejected"] == 1
+
+
+def test_webhook_requires_secret():
+    async def handler(update):
+        pass
+
+    with pytest.raises(ValueError):
+        create_webhook_app(UpdateQueue(handler), secret="")
+
+
+def test_long_handler_does_not_block_other_chats_in_its_queue():
+    handled = []
+
+    async def run():
+        admin_done = asyncio.Event()
+
+        async def handler(update):
+            chat_id = get_update_key(update)
+            if chat_id == 1:
+                # Долгая рассылка администратора
+                await admin_done.wait()
+            handled.append((chat_id, update["message"]["text"]))
+
+        queue = UpdateQueue(handler, workers=1, maxsize=100)
+        queue.start()
+        await queue.put(message_update(1, 1, "рассылка"))
+        await queue.put(message_update(2, 1, "следующее"))
+        for update_id in range(3, 6):
+            await queue.put(message_update(update_id, update_id, "ответ"))
+        await asyncio.sleep(0.01)
+        # Другие чаты той же очереди уже обработаны, второе сообщение чата 1 ждет первое
+        assert sorted(handled) == [(3, "ответ"), (4, "ответ"), (5, "ответ")]
+
+        admin_done.set()
+        await queue.stop()
+
+    asyncio.run(run())
+    assert [text for chat_id, text in handled if chat_id == 1] == ["рассылка", "следующее"]
@@ -0,0 +1,399 @@
+"""
+Буфер ответов участников на активный вопрос.
+
+Ответы копятся в буфере, пока администратор не завершит прием ответов,
+после чего забираются одним вызовом drain() и сохраняются в базу данных.
+При каждом переключении буфер также обновляет счетчики по вариантам
+(см. stats()), чтобы распределение ответов было видно до завершения вопроса.
+
+ANSWER_BUFFER        - "sqlite" (по умолчанию, переживает перезапуск бота) или "memory"
+ANSWER_BUFFER_PATH   - путь к файлу журнала ответов для бэкенда sqlite
+ANSWER_BUFFER_TTL    - через сколько секунд без активности ответы на вопрос удаляются
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+ANSWER_BUFFER = os.getenv("ANSWER_BUFFER", "sqlite")
+ANSWER_BUFFER_PATH = os.getenv("ANSWER_BUFFER_PATH", "answer_buffer.db")
+ANSWER_BUFFER_TTL = float(os.getenv("ANSWER_BUFFER_TTL", str(6 * 60 * 60)))
+
+# Выбранные варианты пользователя: dict используется как упорядоченное множество
+Selection = Dict[str, None]
+
+
+@dataclass
+class AnswerStats:
+    """
+    Текущее распределение ответов на вопрос.
+    """
+    answered: int = 0
+    correct: int = 0
+    options: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def percent_correct(self) -> float:
+        return 100 * self.correct / self.answered if self.answered else 0.0
+
+
+class StatsChange(NamedTuple):
+    """
+    Изменение счетчиков после одного переключения варианта.
+    """
+    option: int
+    answered: int
+    correct: int
+
+
+def is_correct(selection: Selection, correct_answers: Sequence[str]) -> bool:
+    return bool(correct_answers) and selection.keys() == set(correct_answers)
+
+
+def flip(selection: Selection, option: str) -> None:
+    if option in selection:
+        del selection[option]
+    else:
+        selection[option] = None
+
+
+class AnswerBuffer(ABC):
+    """
+    Базовый класс буфера ответов.
+
+    Хранит выбранные варианты по ключу (poll_id, question_id) -> user_id,
+    поэтому переключение варианта, чтение и выгрузка всех ответов на вопрос
+    не требуют перебора чужих вопросов.
+    """
+
+    # Как часто (в секундах) toggle() запускает удаление устаревших ответов
+    EVICTION_INTERVAL = 60.0
+
+    def __init__(self, ttl: float = ANSWER_BUFFER_TTL):
+        self.ttl = ttl
+        self._questions: Dict[Tuple[int, int], Dict[int, Selection]] = {}
+        self._touched_at: Dict[Tuple[int, int], float] = {}
+        self._next_eviction = time.monotonic() + self.EVICTION_INTERVAL
+
+    async def toggle(self, user_id: int, poll_id: int, question_id: int, option: str,
+                     correct_answers: Sequence[str] = ()) -> List[str]:
+        """
+        Отмечает вариант ответа или снимает отметку и возвращает текущий выбор пользователя.
+
+        Выбор в памяти меняется сразу, чтобы одновременные нажатия одного
+        пользователя применялись по очереди. Если переключение не удалось
+        сохранить, оно откатывается и исключение пробрасывается.
+
+        Args:
+            correct_answers: Правильные ответы вопроса, нужны для подсчета верных ответов в stats()
+        """
+        key = (poll_id, question_id)
+        selection = self._load_selection(user_id, key)
+        was_answered = bool(selection)
+        was_correct = is_correct(selection, correct_answers)
+        flip(selection, option)
+        change = StatsChange(
+            option=1 if option in selection else -1,
+            answered=bool(selection) - was_answered,
+            correct=is_correct(selection, correct_answers) - was_correct,
+        )
+        try:
+            await self._run(self._append, user_id, key, option, change)
+        except Exception:
+            # Переключения коммутируют, поэтому повторное переключение отменяет только это нажатие
+            flip(selection, option)
+            raise
+        self._touch(key)
+        return list(selection)
+
+    def get(self, user_id: int, poll_id: int, question_id: int) -> List[str]:
+        """
+        Возвращает варианты, выбранные пользователем.
+        """
+        return list(self._load_selection(user_id, (poll_id, question_id)))
+
+    async def drain(self, poll_id: int, question_id: int) -> Dict[int, List[str]]:
+        """
+        Забирает из буфера ответы всех пользователей на вопрос.
+        """
+        key = (poll_id, question_id)
+        answers = {user_id: list(selection) for user_id, selection in (await self._run(self._drain, key)).items()}
+        self._discard(key)
+        return answers
+
+    @abstractmethod
+    def stats(self, poll_id: int, question_id: int) -> AnswerStats:
+        """
+        Возвращает счетчики ответов на вопрос, не перебирая ответы пользователей.
+        """
+
+    async def stats_async(self, poll_id: int, question_id: int) -> AnswerStats:
+        """
+        То же, что stats(), но бэкенды с блокирующим вводом-выводом читают счетчики вне цикла событий.
+        """
+        return self.stats(poll_id, question_id)
+
+    def evict_expired(self, now: Optional[float] = None) -> int:
+        """
+        Удаляет ответы на вопросы, по которым не было активности дольше ttl.
+
+        Returns:
+            int: Количество вопросов, удаленных из памяти.
+        """
+        now = time.time() if now is None else now
+        expired = [key for key, touched_at in self._touched_at.items() if now - touched_at > self.ttl]
+        for key in expired:
+            self._discard(key)
+        self._evict_stored(now - self.ttl)
+        return len(expired)
+
+    def _load_selection(self, user_id: int, key: Tuple[int, int]) -> Selection:
+        answers = self._questions.setdefault(key, {})
+        selection = answers.get(user_id)
+        if selection is None:
+            selection = answers[user_id] = self._restore(user_id, key)
+        return selection
+
+    def _discard(self, key: Tuple[int, int]) -> None:
+        self._questions.pop(key, None)
+        self._touched_at.pop(key, None)
+
+    def _touch(self, key: Tuple[int, int]) -> None:
+        self._touched_at[key] = time.time()
+        if time.monotonic() >= self._next_eviction:
+            self._next_eviction = time.monotonic() + self.EVICTION_INTERVAL
+            self.evict_expired()
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Выполняет запись в хранилище. Бэкенды с блокирующим вводом-выводом
+        переопределяют метод, чтобы не останавливать цикл событий.
+        """
+        return func(*args)
+
+    @abstractmethod
+    def _restore(self, user_id: int, key: Tuple[int, int]) -> Selection:
+        """
+        Восстанавливает выбор пользователя, которого нет в памяти.
+        """
+
+    @abstractmethod
+    def _append(self, user_id: int, key: Tuple[int, int], option: str, change: StatsChange) -> None:
+        """
+        Сохраняет переключение варианта и изменение счетчиков.
+        """
+
+    @abstractmethod
+    def _drain(self, key: Tuple[int, int]) -> Dict[int, Selection]:
+        """
+        Возвращает и удаляет все ответы на вопрос.
+        """
+
+    def _evict_stored(self, cutoff: float) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryAnswerBuffer(AnswerBuffer):
+    """
+    Буфер ответов в памяти процесса. Ответы теряются при перезапуске.
+    """
+
+    def __init__(self, ttl: float = ANSWER_BUFFER_TTL):
+        super().__init__(ttl)
+        self._stats: Dict[Tuple[int, int], AnswerStats] = {}
+
+    def stats(self, poll_id: int, question_id: int) -> AnswerStats:
+        stats = self._stats.get((poll_id, question_id), AnswerStats())
+        return AnswerStats(stats.answered, stats.correct, dict(stats.options))
+
+    def _restore(self, user_id: int, key: Tuple[int, int]) -> Selection:
+        return {}
+
+    def _append(self, user_id: int, key: Tuple[int, int], option: str, change: StatsChange) -> None:
+        stats = self._stats.setdefault(key, AnswerStats())
+        stats.options[option] = stats.options.get(option, 0) + change.option
+        stats.answered += change.answered
+        stats.correct += change.correct
+
+    def _drain(self, key: Tuple[int, int]) -> Dict[int, Selection]:
+        return self._questions.get(key, {})
+
+    def _discard(self, key: Tuple[int, int]) -> None:
+        super()._discard(key)
+        self._stats.pop(key, None)
+
+
+class SQLiteAnswerBuffer(AnswerBuffer):
+    """
+    Буфер ответов с журналом переключений в локальном файле SQLite.
+
+    Каждое переключение дописывается в журнал, а текущий выбор хранится
+    в памяти. После перезапуска выбор пользователя восстанавливается
+    повторным применением его переключений из журнала. drain() читает
+    журнал, а не память, поэтому видит ответы, записанные другими процессами.
+    Счетчики хранятся в отдельных таблицах и обновляются в той же
+    транзакции, что и журнал; stats() читает их по первичному ключу.
+
+    Записи выполняются по порядку в отдельном потоке через свое соединение:
+    ожидание блокировки базы (busy_timeout) при конкуренции процессов не
+    останавливает цикл событий.
+    """
+
+    def __init__(self, path: str = ANSWER_BUFFER_PATH, ttl: float = ANSWER_BUFFER_TTL):
+        super().__init__(ttl)
+        self._connection = self._connect(path)
+        self._writer = self._connect(path)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="answer-buffer")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS answer_log ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "poll_id INTEGER NOT NULL, "
+            "question_id INTEGER NOT NULL, "
+            "user_id INTEGER NOT NULL, "
+            "option TEXT NOT NULL, "
+            "created_at REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS ix_answer_log_question_user "
+            "ON answer_log (poll_id, question_id, user_id)"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS answer_stats ("
+            "poll_id INTEGER NOT NULL, "
+            "question_id INTEGER NOT NULL, "
+            "answered INTEGER NOT NULL, "
+            "correct INTEGER NOT NULL, "
+            "updated_at REAL NOT NULL, "
+            "PRIMARY KEY (poll_id, question_id))"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS answer_option_counts ("
+            "poll_id INTEGER NOT NULL, "
+            "question_id INTEGER NOT NULL, "
+            "option TEXT NOT NULL, "
+            "count INTEGER NOT NULL, "
+            "PRIMARY KEY (poll_id, question_id, option))"
+        )
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA busy_timeout=5000")
+        return connection
+
+    @staticmethod
+    def _replay(rows) -> Dict[int, Selection]:
+        answers: Dict[int, Selection] = {}
+        for user_id, option in rows:
+            flip(answers.setdefault(user_id, {}), option)
+        return answers
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _restore(self, user_id: int, key: Tuple[int, int]) -> Selection:
+        rows = self._connection.execute(
+            "SELECT user_id, option FROM answer_log "
+            "WHERE poll_id = ? AND question_id = ? AND user_id = ? ORDER BY id",
+            (*key, user_id)
+        )
+        return self._replay(rows).get(user_id, {})
+
+    def _append(self, user_id: int, key: Tuple[int, int], option: str, change: StatsChange) -> None:
+        now = time.time()
+        with self._writer:
+            self._writer.execute("BEGIN IMMEDIATE")
+            self._writer.execute(
+                "INSERT INTO answer_log (poll_id, question_id, user_id, option, created_at) VALUES (?, ?, ?, ?, ?)",
+                (*key, user_id, option, now)
+            )
+            self._writer.execute(
+                "INSERT INTO answer_option_counts (poll_id, question_id, option, count) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (poll_id, question_id, option) DO UPDATE SET count = count + excluded.count",
+                (*key, option, change.option)
+            )
+            self._writer.execute(
+                "INSERT INTO answer_stats (poll_id, question_id, answered, correct, updated_at) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (poll_id, question_id) DO UPDATE SET "
+                "answered = answered + excluded.answered, correct = correct + excluded.correct, "
+                "updated_at = excluded.updated_at",
+                (*key, change.answered, change.correct, now)
+            )
+
+    def stats(self, poll_id: int, question_id: int) -> AnswerStats:
+        return self._read_stats(self._connection, (poll_id, question_id))
+
+    async def stats_async(self, poll_id: int, question_id: int) -> AnswerStats:
+        # Чтение идет в потоке записи через его соединение и видит все уже поставленные в очередь записи
+        return await self._run(self._read_stats, self._writer, (poll_id, question_id))
+
+    @staticmethod
+    def _read_stats(connection: sqlite3.Connection, key: Tuple[int, int]) -> AnswerStats:
+        row = connection.execute(
+            "SELECT answered, correct FROM answer_stats WHERE poll_id = ? AND question_id = ?", key
+        ).fetchone()
+        if row is None:
+            return AnswerStats()
+        options = connection.execute(
+            "SELECT option, count FROM answer_option_counts WHERE poll_id = ? AND question_id = ?", key
+        )
+        return AnswerStats(answered=row[0], correct=row[1], options=dict(options))
+
+    def _drain(self, key: Tuple[int, int]) -> Dict[int, Selection]:
+        with self._writer:
+            self._writer.execute("BEGIN IMMEDIATE")
+            rows = self._writer.execute(
+                "SELECT user_id, option FROM answer_log WHERE poll_id = ? AND question_id = ? ORDER BY id",
+                key
+            ).fetchall()
+            self._writer.execute("DELETE FROM answer_log WHERE poll_id = ? AND question_id = ?", key)
+            self._writer.execute("DELETE FROM answer_stats WHERE poll_id = ? AND question_id = ?", key)
+            self._writer.execute("DELETE FROM answer_option_counts WHERE poll_id = ? AND question_id = ?", key)
+        return self._replay(rows)
+
+    def _evict_stored(self, cutoff: float) -> None:
+        # Удаление выполняется в потоке записи после уже поставленных в очередь записей
+        self._executor.submit(self._delete_expired, cutoff)
+
+    def _delete_expired(self, cutoff: float) -> None:
+        try:
+            with self._writer:
+                self._writer.execute("BEGIN IMMEDIATE")
+                self._writer.execute(
+                    "DELETE FROM answer_log WHERE (poll_id, question_id) IN ("
+                    "SELECT poll_id, question_id FROM answer_log "
+                    "GROUP BY poll_id, question_id HAVING MAX(created_at) < ?)",
+                    (cutoff,)
+                )
+                self._writer.execute(
+                    "DELETE FROM answer_option_counts WHERE (poll_id, question_id) IN ("
+                    "SELECT poll_id, question_id FROM answer_stats WHERE updated_at < ?)",
+                    (cutoff,)
+                )
+                self._writer.execute("DELETE FROM answer_stats WHERE updated_at < ?", (cutoff,))
+        except sqlite3.Error as e:
+            logger.error("Ошибка при удалении устаревших ответов: %s", e)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self._writer.close()
+        self._connection.close()
+
+
+def create_answer_buffer() -> AnswerBuffer:
+    if ANSWER_BUFFER == "memory":
+        return MemoryAnswerBuffer()
+    return SQLiteAnswerBuffer()
@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from utils.log import RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+# Глобальный лимит Telegram Bot API - около 30 сообщений в секунду на бота
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "30"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "20"))
+# Не чаще одного сообщения в секунду в один чат
+BROADCAST_PER_CHAT_INTERVAL = float(os.getenv("BROADCAST_PER_CHAT_INTERVAL", "1.0"))
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "3"))
+
+
+class TokenBucket:
+    """
+    Глобальный ограничитель скорости отправки (token bucket).
+
+    При получении TelegramRetryAfter корзина ставится на паузу целиком,
+    чтобы все отправители одновременно дождались разрешения Telegram.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def pause(self, seconds: float) -> None:
+        """
+        Приостанавливает выдачу токенов на указанное количество секунд.
+        """
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0.0
+        self._updated_at = self._paused_until
+
+    async def acquire(self) -> None:
+        """
+        Ожидает, пока в корзине появится свободный токен, и забирает его.
+        """
+        async with self._lock:
+            while True:
+                wait = self._take()
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+
+    def _take(self) -> float:
+        """
+        Забирает токен, если он есть.
+
+        Returns:
+            float: 0, если токен получен, иначе сколько секунд ждать до следующей попытки.
+        """
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._refill(now)
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    Token bucket, общий для нескольких процессов.
+
+    Состояние корзины (токены, время пополнения, конец паузы) хранится в
+    разделяемой памяти, созданной create_state() до запуска процессов, и
+    меняется под ее блокировкой. time.monotonic() - общие для всех процессов
+    системные часы, поэтому отметки времени сравнимы между процессами.
+    """
+
+    def __init__(self, state, rate: float, capacity: Optional[float] = None):
+        super().__init__(rate, capacity)
+        self.state = state
+
+    @staticmethod
+    def create_state(capacity: float):
+        return multiprocessing.Array("d", [capacity, time.monotonic(), 0.0])
+
+    def _load(self) -> None:
+        self._tokens, self._updated_at, self._paused_until = self.state[:]
+
+    def _store(self) -> None:
+        self.state[:] = [self._tokens, self._updated_at, self._paused_until]
+
+    def pause(self, seconds: float) -> None:
+        with self.state.get_lock():
+            self._load()
+            super().pause(seconds)
+            self._store()
+
+    def _take(self) -> float:
+        with self.state.get_lock():
+            self._load()
+            wait = super()._take()
+            self._store()
+        return wait
+
+
+class ChatRateLimiter:
+    """
+    Ограничивает частоту отправки сообщений в один и тот же чат.
+    """
+
+    _PRUNE_THRESHOLD = 10000
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next_slot: Dict[int, float] = {}
+
+    async def wait(self, chat_id: int) -> None:
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(chat_id, 0.0))
+        self._next_slot[chat_id] = slot + self.interval
+        if len(self._next_slot) > self._PRUNE_THRESHOLD:
+            self._next_slot = {key: value for key, value in self._next_slot.items() if value > now}
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+@dataclass
+class BroadcastStats:
+    total: int
+    sent: int = 0
+    failed: int = 0
+    retries: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: Optional[float] = None
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.failed
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return end - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        """
+        Количество успешно отправленных сообщений в секунду.
+        """
+        elapsed = self.elapsed
+        return self.sent / elapsed if elapsed > 0 else 0.0
+
+
+class Broadcaster:
+    """
+    Рассылает сообщения списку чатов с ограниченным параллелизмом
+    под общим ограничителем скорости.
+    """
+
+    def __init__(self, rate: float = BROADCAST_RATE, concurrency: int = BROADCAST_CONCURRENCY,
+                 per_chat_interval: float = BROADCAST_PER_CHAT_INTERVAL,
+                 max_retries: int = BROADCAST_MAX_RETRIES):
+        self.bucket = TokenBucket(rate)
+        self.chat_limiter = ChatRateLimiter(per_chat_interval)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+
+    async def _send_one(self, chat_id: int, send: Callable[[int], Awaitable[Any]], stats: BroadcastStats) -> None:
+        attempt = 0
+        while True:
+            await self.chat_limiter.wait(chat_id)
+            await self.bucket.acquire()
+            try:
+                await send(chat_id)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                self.bucket.pause(e.retry_after)
+                if attempt > self.max_retries:
+                    logger.error("Превышено число повторов отправки пользователю %s: %s", chat_id, e, extra=RATE_LIMITED)
+                    stats.failed += 1
+                    return
+                stats.retries += 1
+                logger.warning("Flood control: пауза рассылки на %s с", e.retry_after)
+                continue
+            except Exception as e:
+                logger.error("Не удалось отправить сообщение пользователю %s: %s", chat_id, e, extra=RATE_LIMITED)
+                stats.failed += 1
+                return
+            stats.sent += 1
+            return
+
+    async def broadcast(self, chat_ids: Iterable[int], send: Callable[[int], Awaitable[Any]],
+                        on_progress: Optional[Callable[[BroadcastStats], Awaitable[Any]]] = None,
+                        progress_interval: float = 2.0) -> BroadcastStats:
+        """
+        Вызывает send(chat_id) для каждого чата и возвращает статистику рассылки.
+
+        Args:
+            chat_ids: ID чатов получателей.
+            send: Корутина, отправляющая сообщение в один чат.
+            on_progress: Корутина, вызываемая не чаще раза в progress_interval секунд,
+                пока рассылка идет.
+            progress_interval: Интервал между вызовами on_progress в секундах.
+
+        Returns:
+            BroadcastStats: Итоговая статистика рассылки.
+        """
+        chat_ids = list(chat_ids)
+        stats = BroadcastStats(total=len(chat_ids))
+        pending = iter(chat_ids)
+
+        async def worker():
+            for chat_id in pending:
+                await self._send_one(chat_id, send, stats)
+
+        async def reporter():
+            reported = -1
+            while True:
+                await asyncio.sleep(progress_interval)
+                if stats.processed != reported:
+                    reported = stats.processed
+                    try:
+                        await on_progress(stats)
+                    except Exception as e:
+                        logger.error("Ошибка при обновлении прогресса рассылки: %s", e)
+
+        reporter_task = asyncio.create_task(reporter()) if on_progress else None
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(chat_ids)))))
+        finally:
+            if reporter_task:
+                reporter_task.cancel()
+            stats.finished_at = time.monotonic()
+
+        logger.info(
+            "Рассылка завершена: отправлено %d/%d, ошибок %d, повторов %d за %.2f с (%.1f сообщ./с)",
+            stats.sent, stats.total, stats.failed, stats.retries, stats.elapsed, stats.throughput
+        )
+        return stats
+
+
+broadcaster = Broadcaster()
@@ -0,0 +1,121 @@
+"""
+Обновляемая сводка ответов на активный вопрос для администратора.
+
+Сводка строится по счетчикам буфера ответов (AnswerBuffer.stats()) и
+перерисовывается не чаще раза в DASHBOARD_INTERVAL секунд, причем только
+если ее текст изменился.
+
+DASHBOARD_INTERVAL  - период обновления сводки в секундах
+"""
+import asyncio
+import logging
+import os
+from typing import Dict, List, Tuple
+
+from aiogram import Bot
+
+from utils.answer_buffer import AnswerBuffer, AnswerStats
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_INTERVAL = float(os.getenv("DASHBOARD_INTERVAL", "3"))
+
+BAR_WIDTH = 10
+
+
+def render_dashboard(stats: AnswerStats, options: List[str], participants: int) -> str:
+    """
+    Формирует текст сводки ответов.
+    """
+    lines = [
+        f"📊 Ответили: {stats.answered} из {participants}",
+        f"✅ Полностью верно: {stats.correct} ({stats.percent_correct:.0f}%)",
+        "",
+    ]
+    for i, option in enumerate(options, 1):
+        count = stats.options.get(option, 0)
+        share = count / stats.answered if stats.answered else 0.0
+        bar = "█" * round(share * BAR_WIDTH)
+        lines.append(f"{i}. {option}: {count} {bar}")
+    return "\n".join(lines)
+
+
+class Dashboard:
+    """
+    Сводка ответов на один вопрос, привязанная к сообщению администратора.
+    """
+
+    def __init__(self, bot: Bot, chat_id: int, message_id: int, buffer: AnswerBuffer,
+                 poll_id: int, question_id: int, options: List[str], participants: int):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.buffer = buffer
+        self.poll_id = poll_id
+        self.question_id = question_id
+        self.options = options
+        self.participants = participants
+        self.text = render_dashboard(AnswerStats(), options, participants)
+
+    async def refresh(self) -> None:
+        try:
+            stats = await self.buffer.stats_async(self.poll_id, self.question_id)
+        except Exception as e:
+            logger.error("Ошибка при чтении счетчиков ответов: %s", e)
+            return
+        text = render_dashboard(stats, self.options, self.participants)
+        if text == self.text:
+            return
+        try:
+            await self.bot.edit_message_text(text, chat_id=self.chat_id, message_id=self.message_id)
+            self.text = text
+        except Exception as e:
+            logger.error("Ошибка при обновлении сводки ответов: %s", e)
+
+
+class DashboardRefresher:
+    """
+    Периодически обновляет открытые сводки ответов.
+    """
+
+    def __init__(self, interval: float = DASHBOARD_INTERVAL):
+        self.interval = interval
+        self._tasks: Dict[Tuple[int, int], Tuple[Dashboard, asyncio.Task]] = {}
+
+    def start(self, dashboard: Dashboard) -> None:
+        key = (dashboard.poll_id, dashboard.question_id)
+        self._cancel(key)
+        self._tasks[key] = (dashboard, asyncio.create_task(self._run(dashboard)))
+
+    async def stop(self, poll_id: int, question_id: int) -> None:
+        """
+        Останавливает обновление сводки, перерисовав ее в последний раз.
+        """
+        item = self._tasks.pop((poll_id, question_id), None)
+        if item is None:
+            return
+        dashboard, task = item
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await dashboard.refresh()
+
+    async def stop_poll(self, poll_id: int) -> None:
+        """
+        Останавливает сводки всех вопросов опроса: при переходе к следующему вопросу
+        без завершения текущего и при завершении опроса.
+        """
+        for key in [key for key in self._tasks if key[0] == poll_id]:
+            await self.stop(*key)
+
+    async def _run(self, dashboard: Dashboard) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await dashboard.refresh()
+
+    def _cancel(self, key: Tuple[int, int]) -> None:
+        item = self._tasks.pop(key, None)
+        if item is not None:
+            item[1].cancel()
+
+
+dashboards = DashboardRefresher()
@@ -0,0 +1,125 @@
+"""
+Объединение частых правок клавиатуры одного сообщения.
+
+Когда участник быстро отмечает несколько вариантов подряд, каждая отметка
+не приводит к отдельному вызову edit_reply_markup: правки одного сообщения
+копятся в течение EDIT_DEBOUNCE секунд, после чего отправляется только
+последняя клавиатура. Если она совпадает с уже показанной, правка не
+отправляется вовсе.
+
+EDIT_DEBOUNCE          - окно объединения правок в секундах
+EDIT_COALESCER_SIZE    - сколько последних клавиатур сообщений помнить
+"""
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+from aiogram.types import InlineKeyboardMarkup
+
+from utils.log import RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+EDIT_DEBOUNCE = float(os.getenv("EDIT_DEBOUNCE", "0.7"))
+EDIT_COALESCER_SIZE = int(os.getenv("EDIT_COALESCER_SIZE", "10000"))
+
+EditFunc = Callable[[InlineKeyboardMarkup], Awaitable]
+
+
+def markup_hash(markup: Optional[InlineKeyboardMarkup]) -> str:
+    """
+    Возвращает хэш содержимого клавиатуры.
+    """
+    if markup is None:
+        return ""
+    payload = markup.model_dump_json(exclude_none=True)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class EditCoalescer:
+    """
+    Откладывает правку клавиатуры сообщения и применяет только последнюю.
+
+    Ключ - любой идентификатор сообщения, например (chat_id, message_id).
+    """
+
+    def __init__(self, delay: float = EDIT_DEBOUNCE, maxsize: int = EDIT_COALESCER_SIZE):
+        self.delay = delay
+        self.maxsize = maxsize
+        self.submitted = 0
+        self.sent = 0
+        self.skipped = 0
+        self._pending: Dict[Hashable, tuple] = {}
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self._shown: "OrderedDict[Hashable, str]" = OrderedDict()
+
+    def submit(self, key: Hashable, markup: InlineKeyboardMarkup, edit: EditFunc,
+               current: Optional[InlineKeyboardMarkup] = None) -> None:
+        """
+        Планирует правку клавиатуры сообщения.
+
+        Args:
+            key: Идентификатор сообщения
+            markup: Новая клавиатура
+            edit: Корутина, применяющая клавиатуру к сообщению
+            current: Клавиатура, которая сейчас показана в сообщении (если известна)
+        """
+        self.submitted += 1
+        if key not in self._shown and current is not None:
+            self._remember(key, markup_hash(current))
+        self._pending[key] = (markup, edit)
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.create_task(self._apply_later(key))
+
+    async def flush(self) -> None:
+        """
+        Немедленно применяет все отложенные правки.
+        """
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for key in list(self._pending):
+            await self._apply(key)
+
+    async def _apply_later(self, key: Hashable) -> None:
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self._tasks.pop(key, None)
+            raise
+        self._tasks.pop(key, None)
+        await self._apply(key)
+
+    async def _apply(self, key: Hashable) -> None:
+        item = self._pending.pop(key, None)
+        if item is None:
+            return
+        markup, edit = item
+        digest = markup_hash(markup)
+        if self._shown.get(key) == digest:
+            self.skipped += 1
+            return
+        try:
+            await edit(markup)
+        except Exception as e:
+            if "message is not modified" in str(e):
+                self._remember(key, digest)
+                self.skipped += 1
+                return
+            logger.error("Не удалось отредактировать сообщение: %s", e, extra=RATE_LIMITED)
+            return
+        self.sent += 1
+        self._remember(key, digest)
+
+    def _remember(self, key: Hashable, digest: str) -> None:
+        self._shown[key] = digest
+        self._shown.move_to_end(key)
+        while len(self._shown) > self.maxsize:
+            self._shown.popitem(last=False)
+
+
+edit_coalescer = EditCoalescer()
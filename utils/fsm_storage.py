@@ -0,0 +1,238 @@
+"""
+Постоянное хранилище состояний FSM.
+
+FSM_STORAGE            - "sqlite" (по умолчанию), "redis" или "memory"
+FSM_STORAGE_PATH       - путь к файлу SQLite с состояниями
+FSM_STORAGE_TTL        - через сколько секунд без изменений состояние пользователя удаляется
+FSM_STORAGE_PREFIX     - пространство имен ключей, общее для всех процессов одного бота
+FSM_FLUSH_INTERVAL     - как долго (в секундах) копятся изменения перед записью в SQLite;
+                         0 - каждое изменение записывается сразу
+REDIS_URL              - адрес сервера Redis для бэкенда redis
+
+Надежность бэкенда sqlite: изменения состояний FSM_FLUSH_INTERVAL секунд
+(по умолчанию 50 мс) хранятся только в памяти процесса. При штатной
+остановке они записываются (close()), но если процесс упадет или будет
+убит (SIGKILL) в этом окне, последние изменения состояний пропадут без
+сообщений об ошибке: пользователь вернется к предыдущему шагу диалога.
+Если это недопустимо, задайте FSM_FLUSH_INTERVAL=0 - тогда каждое
+изменение записывается до возврата из set_state()/set_data() ценой
+отдельной транзакции на каждое изменение.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from utils.log import RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+FSM_STORAGE_PATH = os.getenv("FSM_STORAGE_PATH", "fsm_storage.db")
+FSM_STORAGE_TTL = float(os.getenv("FSM_STORAGE_TTL", str(7 * 24 * 60 * 60)))
+FSM_STORAGE_PREFIX = os.getenv("FSM_STORAGE_PREFIX", "opros_bot")
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "0.05"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Отложенные изменения: ключ -> (колонка -> новое значение)
+PendingWrites = Dict[str, Dict[str, Optional[str]]]
+
+
+def _state_name(state: StateType) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Хранилище FSM в файле SQLite, общее для нескольких процессов бота.
+
+    Изменения не записываются сразу: они копятся FSM_FLUSH_INTERVAL секунд
+    и сохраняются одной транзакцией (при flush_interval=0 - сразу, см.
+    описание модуля). Чтение сначала смотрит в отложенные
+    изменения, затем читает строку по первичному ключу. Состояния, которые
+    не менялись дольше ttl, считаются удаленными.
+
+    Запись выполняется в отдельном потоке через свое соединение, поэтому
+    ожидание блокировки базы другим процессом не останавливает цикл событий.
+    Если запись не удалась, изменения возвращаются в очередь (более новые
+    значения важнее) и запись повторяется.
+    """
+
+    # Как часто (в секундах) запись удаляет устаревшие состояния из файла
+    EVICTION_INTERVAL = 60.0
+    # Через сколько секунд повторяется неудавшаяся запись при flush_interval=0
+    RETRY_INTERVAL = 1.0
+
+    def __init__(self, path: str = FSM_STORAGE_PATH, ttl: float = FSM_STORAGE_TTL,
+                 flush_interval: float = FSM_FLUSH_INTERVAL, key_builder: Optional[KeyBuilder] = None):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.key_builder = key_builder or DefaultKeyBuilder(prefix=FSM_STORAGE_PREFIX, with_bot_id=True)
+        self._pending: PendingWrites = {}
+        # Изменения, которые записываются прямо сейчас: до окончания записи их читают отсюда
+        self._flushing: PendingWrites = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_lock = asyncio.Lock()
+        self._next_eviction = time.monotonic() + self.EVICTION_INTERVAL
+        self._connection = self._connect(path)
+        self._writer = self._connect(path)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm-storage")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS fsm_storage ("
+            "key TEXT PRIMARY KEY, "
+            "state TEXT, "
+            "data TEXT NOT NULL DEFAULT '{}', "
+            "expires_at REAL NOT NULL)"
+        )
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA busy_timeout=5000")
+        return connection
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._write(self.key_builder.build(key), "state", _state_name(state))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return self._read(self.key_builder.build(key))[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await self._write(self.key_builder.build(key), "data", json.dumps(dict(data), ensure_ascii=False))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return json.loads(self._read(self.key_builder.build(key))[1])
+
+    async def close(self) -> None:
+        try:
+            await self.flush()
+        except sqlite3.Error as e:
+            logger.error("Не удалось сохранить состояния FSM при остановке: %s", e)
+        self._executor.shutdown(wait=True)
+        self._writer.close()
+        self._connection.close()
+
+    async def flush(self) -> None:
+        """
+        Записывает отложенные изменения одной транзакцией.
+
+        Если запись не удалась, изменения возвращаются в очередь, повторная
+        запись планируется через flush_interval (или RETRY_INTERVAL), а исключение
+        пробрасывается.
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            self._flushing, self._pending = self._pending, {}
+            try:
+                await asyncio.get_running_loop().run_in_executor(self._executor, self._write_pending,
+                                                                 self._flushing)
+            except Exception:
+                # Изменения, сделанные во время записи, новее возвращаемых
+                for key, values in self._flushing.items():
+                    self._pending[key] = {**values, **self._pending.get(key, {})}
+                self._schedule_flush()
+                raise
+            finally:
+                self._flushing = {}
+
+    def _write_pending(self, pending: PendingWrites) -> None:
+        expires_at = time.time() + self.ttl
+        states = [(key, values["state"], expires_at) for key, values in pending.items() if "state" in values]
+        data = [(key, values["data"], expires_at) for key, values in pending.items() if "data" in values]
+        with self._writer:
+            self._writer.execute("BEGIN IMMEDIATE")
+            self._writer.executemany(
+                "INSERT INTO fsm_storage (key, state, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET state = excluded.state, expires_at = excluded.expires_at",
+                states
+            )
+            self._writer.executemany(
+                "INSERT INTO fsm_storage (key, data, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at",
+                data
+            )
+            # Пустые записи (после state.clear()) не храним
+            self._writer.executemany(
+                "DELETE FROM fsm_storage WHERE key = ? AND state IS NULL AND data = '{}'",
+                [(key,) for key in pending]
+            )
+
+        if time.monotonic() >= self._next_eviction:
+            self._next_eviction = time.monotonic() + self.EVICTION_INTERVAL
+            try:
+                self.evict_expired()
+            except sqlite3.Error as e:
+                # Изменения уже записаны, удаление повторится через EVICTION_INTERVAL
+                logger.error("Ошибка при удалении устаревших состояний FSM: %s", e)
+
+    def evict_expired(self, now: Optional[float] = None) -> int:
+        """
+        Удаляет состояния, которые не менялись дольше ttl.
+
+        Returns:
+            int: Количество удаленных записей.
+        """
+        now = time.time() if now is None else now
+        return self._writer.execute("DELETE FROM fsm_storage WHERE expires_at < ?", (now,)).rowcount
+
+    def _read(self, key: str) -> Tuple[Optional[str], str]:
+        row = self._connection.execute(
+            "SELECT state, data FROM fsm_storage WHERE key = ? AND expires_at >= ?",
+            (key, time.time())
+        ).fetchone()
+        state, data = row if row is not None else (None, "{}")
+        pending = {**self._flushing.get(key, {}), **self._pending.get(key, {})}
+        return pending.get("state", state), pending.get("data", data)
+
+    async def _write(self, key: str, column: str, value: Optional[str]) -> None:
+        self._pending.setdefault(key, {})[column] = value
+        if self.flush_interval <= 0:
+            # Запись без отложенного сброса: ошибка получает вызывающий обработчик
+            await self.flush()
+        else:
+            self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if self._flush_handle is None:
+            delay = self.flush_interval if self.flush_interval > 0 else self.RETRY_INTERVAL
+            self._flush_handle = asyncio.get_running_loop().call_later(delay, self._flush_later)
+
+    def _flush_later(self) -> None:
+        self._flush_handle = None
+        asyncio.ensure_future(self._flush_logged())
+
+    async def _flush_logged(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error("Ошибка при сохранении состояний FSM, запись будет повторена: %s", e, extra=RATE_LIMITED)
+
+
+def create_fsm_storage() -> BaseStorage:
+    if FSM_STORAGE == "memory":
+        return MemoryStorage()
+    if FSM_STORAGE == "redis":
+        # redis - необязательная зависимость, нужна только для этого бэкенда
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        return RedisStorage.from_url(
+            REDIS_URL,
+            key_builder=DefaultKeyBuilder(prefix=FSM_STORAGE_PREFIX, with_bot_id=True),
+            state_ttl=int(FSM_STORAGE_TTL),
+            data_ttl=int(FSM_STORAGE_TTL),
+        )
+    return SQLiteStorage()
@@ -0,0 +1,43 @@
+import bisect
+import hashlib
+from typing import Generic, Hashable, List, Sequence, Tuple, TypeVar
+
+Node = TypeVar("Node", bound=Hashable)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing(Generic[Node]):
+    """
+    Консистентное хэширование ключей по узлам.
+
+    Каждый узел занимает replicas точек на кольце, ключ принадлежит первой
+    точке по часовой стрелке. При добавлении или удалении узла переезжает
+    только примерно 1/N ключей.
+    """
+
+    def __init__(self, nodes: Sequence[Node] = (), replicas: int = 100):
+        self.replicas = replicas
+        self._points: List[int] = []
+        self._ring: List[Tuple[int, Node]] = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: Node) -> None:
+        for replica in range(self.replicas):
+            point = _hash(f"{node}:{replica}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._ring.insert(index, (point, node))
+
+    def remove(self, node: Node) -> None:
+        self._ring = [(point, owner) for point, owner in self._ring if owner != node]
+        self._points = [point for point, _ in self._ring]
+
+    def get(self, key: Hashable) -> Node:
+        if not self._ring:
+            raise LookupError("В кольце нет узлов")
+        index = bisect.bisect(self._points, _hash(str(key))) % len(self._ring)
+        return self._ring[index][1]
@@ -0,0 +1,186 @@
+"""
+Настройка логирования.
+
+Записи из обработчиков попадают в очередь и форматируются в отдельном
+потоке (QueueListener), поэтому обработчик платит только за создание
+записи и подстановку аргументов в сообщение. Аргументы подставляются
+сразу, чтобы в лог попали их значения на момент вызова. Сообщения нужно
+передавать с аргументами, а не f-строкой: logger.info("Опрос %s завершен",
+poll_id) - тогда строка собирается только для записей, прошедших уровни и
+фильтры.
+
+Для частых событий, происходящих на каждого пользователя, есть два фильтра:
+    extra=SAMPLED       - выводится только доля LOG_SAMPLE_RATE таких записей
+    extra=RATE_LIMITED  - не больше LOG_RATE_LIMIT записей в секунду с одним шаблоном,
+                          число пропущенных попадает в поле suppressed следующей записи
+
+LOG_LEVEL        - общий уровень логирования
+LOG_LEVELS       - уровни отдельных модулей: "aiogram.event=WARNING,handlers.poll=DEBUG" (по умолчанию aiogram.event=WARNING)
+LOG_FORMAT       - "json" (по умолчанию) или "text"
+LOG_SAMPLE_RATE  - доля выводимых записей с extra=SAMPLED
+LOG_RATE_LIMIT   - сколько записей в секунду с одним шаблоном пропускает extra=RATE_LIMITED
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# aiogram.event пишет строку на каждое обновление
+LOG_LEVELS = os.getenv("LOG_LEVELS", "aiogram.event=WARNING")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+LOG_RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT", "10"))
+
+SAMPLED = {"sampled": True}
+RATE_LIMITED = {"rate_limited": True}
+
+# Атрибуты LogRecord, которые не считаются дополнительными полями записи
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Форматирует запись как одну строку JSON.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает долю rate записей с extra=SAMPLED, остальные записи - все.
+    """
+
+    def __init__(self, rate: float = LOG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not getattr(record, "sampled", False) or random.random() < self.rate
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Ограничивает число записей с extra=RATE_LIMITED для каждого шаблона сообщения.
+    """
+
+    def __init__(self, rate: float = LOG_RATE_LIMIT, burst: Optional[float] = None):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst or rate
+        # (логгер, шаблон) -> (токены, время последнего пополнения, пропущено записей)
+        self._buckets: Dict[Tuple[str, str], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "rate_limited", False):
+            return True
+        with self._lock:
+            return self._take(record)
+
+    def _take(self, record: logging.LogRecord) -> bool:
+        now = time.monotonic()
+        bucket = self._buckets.setdefault((record.name, str(record.msg)), [self.burst, now, 0])
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            bucket[2] += 1
+            return False
+        bucket[0] -= 1
+        if bucket[2]:
+            record.suppressed = bucket[2]
+            bucket[2] = 0
+        return True
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Аргументы (например, списки ответов) могут измениться, пока запись ждет в очереди,
+        # поэтому сообщение собирается здесь. Остальное форматирование делает поток QueueListener
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+
+def parse_levels(levels: str) -> Dict[str, str]:
+    """
+    Разбирает строку вида "aiogram.event=WARNING,handlers.poll=DEBUG".
+    """
+    result = {}
+    for item in filter(None, (part.strip() for part in levels.split(","))):
+        name, _, level = item.partition("=")
+        result[name.strip()] = level.strip().upper()
+    return result
+
+
+def setup_logging(level: str = LOG_LEVEL, levels: str = LOG_LEVELS, fmt: str = LOG_FORMAT,
+                  stream=None) -> QueueListener:
+    """
+    Настраивает корневой логгер: фильтры, очередь и поток вывода.
+
+    Повторный вызов заменяет предыдущую настройку.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    if fmt == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _QueueHandler(records)
+    handler.addFilter(SamplingFilter())
+    handler.addFilter(RateLimitFilter())
+
+    root = logging.getLogger()
+    for old_handler in root.handlers[:]:
+        root.removeHandler(old_handler)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    for name, module_level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = QueueListener(records, output)
+    _listener.start()
+    return _listener
+
+
+@atexit.register
+def shutdown_logging() -> None:
+    """
+    Дописывает оставшиеся в очереди записи.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -11,6 +11,8 @@ def translate_exception(exception_message):
             "Неверный формат в строке {line_number}: ожидался пронумерованный вопрос.",
         "Incorrect format on line {line_number}: expected '+', '-', or a numbered question.":
             "Неверный формат в строке {line_number}: ожидался ответ ('+' или '-') или пронумерованный вопрос",
+        "Incorrect format on line {line_number}: line is not valid {encoding} text.":
+            "Неверный формат в строке {line_number}: строка не читается в кодировке {encoding}.",
         "Incorrect format: no correct answer for question '{question_text}'.":
             "Неверный формат: отсутствует правильный ответ для вопроса '{question_text}'.",
         "Unknown error":
@@ -26,6 +28,8 @@ def translate_exception(exception_message):
         if "for question" in message:
             question_text = message.split("for question")[1].split(".")[0].strip().strip("'")
             params["question_text"] = question_text
+        if "is not valid" in message:
+            params["encoding"] = message.split("is not valid")[1].split()[0]
         return params
 
     # Проверяем все шаблоны переводов
@@ -37,5 +41,5 @@ def translate_exception(exception_message):
         except KeyError:
             continue
 
-    # Если перевод не найден, возвращаем оригинальное сообщение или "Неизвестная ошибка"
-    return translations.get("Unknown error", exception_message)
\ No newline at end of file
+    # Если перевод не найден, возвращаем оригинальное сообщение: в нем хотя бы есть номер строки и причина
+    return translations.get(exception_message, exception_message)
\ No newline at end of file
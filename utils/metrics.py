@@ -0,0 +1,303 @@
+"""
+Метрики работы бота в текстовом формате Prometheus.
+
+Собираются:
+  - количество обновлений по типу и результату, обновления в обработке,
+    время обработки обновления целиком;
+  - время работы и ошибки каждого обработчика (по роутеру и имени функции);
+  - время запросов к Telegram Bot API и ошибки по методам;
+  - ожидание в очереди, время построения и таймауты отчетов
+    (регистрируются в utils.report_executor);
+  - попадания и промахи кэшей сущностей (регистрируются в database.database).
+
+Набор меток ограничен: типы обновлений, обработчики, методы API и классы
+исключений известны заранее, поэтому число рядов не растет с нагрузкой.
+Запись метрики - несколько операций со словарем без блокировок (метрики
+пишутся только из цикла событий); накладные расходы замеряет
+benchmarks/bench_metrics.py.
+
+METRICS_PORT  - порт HTTP-сервера с метриками (GET /metrics); 0 - сервер не запускается
+METRICS_HOST  - адрес HTTP-сервера с метриками (по умолчанию доступен только локально)
+"""
+import abc
+import bisect
+import logging
+import math
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.methods import Response, TelegramMethod
+from aiogram.types import TelegramObject, Update
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric(abc.ABC):
+    """
+    Метрика с фиксированным набором имен меток.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    @abc.abstractmethod
+    def _samples(self) -> Iterable[str]:
+        """
+        Строки значений метрики в текстовом формате Prometheus.
+        """
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self.values.get(labels, 0)
+
+    def _samples(self) -> Iterable[str]:
+        for labels, value in sorted(self.values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # По каждому набору меток: счетчики корзин (последняя - +Inf), сумма и количество
+        self.series: Dict[Labels, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, *labels: str) -> int:
+        series = self.series.get(labels)
+        return series[2] if series else 0
+
+    def _samples(self) -> Iterable[str]:
+        names = self.labelnames + ("le",)
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}"
+
+
+class CallbackMetric(Metric):
+    """
+    Метрика, значения которой читаются функцией при каждом запросе /metrics.
+
+    Подходит для значений, которые уже считаются в другом месте (размер
+    очереди, статистика кэша): callback возвращает значения по наборам меток.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Callable[[], Dict[Labels, float]] = dict, kind: str = "gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.callback = callback
+
+    def _samples(self) -> Iterable[str]:
+        for labels, value in sorted(self.callback().items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+UPDATES = registry.register(Counter(
+    "bot_updates_total", "Обработанные обновления по типу и результату", ("type", "status")))
+UPDATES_IN_FLIGHT = registry.register(Gauge(
+    "bot_updates_in_flight", "Обновления в обработке", ("type",)))
+UPDATE_DURATION = registry.register(Histogram(
+    "bot_update_duration_seconds", "Время обработки обновления, включая middleware", ("type",)))
+HANDLER_DURATION = registry.register(Histogram(
+    "bot_handler_duration_seconds", "Время работы обработчика", ("router", "handler")))
+HANDLER_ERRORS = registry.register(Counter(
+    "bot_handler_errors_total", "Исключения в обработчиках", ("router", "handler", "error")))
+API_DURATION = registry.register(Histogram(
+    "telegram_api_request_duration_seconds", "Время запроса к Telegram Bot API", ("method",)))
+API_ERRORS = registry.register(Counter(
+    "telegram_api_errors_total", "Ошибки запросов к Telegram Bot API", ("method", "error")))
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """
+    Внешний middleware обновлений: количество, обновления в обработке, общее время.
+    """
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: Update, data: Dict[str, Any]) -> Any:
+        update_type = event.event_type
+        UPDATES_IN_FLIGHT.inc(update_type)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            result = await handler(event, data)
+            status = "unhandled" if result is UNHANDLED else "handled"
+            return result
+        finally:
+            UPDATE_DURATION.observe(time.perf_counter() - started, update_type)
+            UPDATES_IN_FLIGHT.dec(update_type)
+            UPDATES.inc(update_type, status)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Внутренний middleware событий: время и ошибки конкретного обработчика.
+    """
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        handler_object = data.get("handler")
+        router = data.get("event_router")
+        labels = (router.name if router else "", getattr(handler_object.callback, "__name__", "")
+                  if handler_object else "")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            HANDLER_ERRORS.inc(*labels, type(e).__name__)
+            raise
+        finally:
+            HANDLER_DURATION.observe(time.perf_counter() - started, *labels)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: время и ошибки запросов к Bot API.
+    """
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot,
+                       method: TelegramMethod) -> Response:
+        name = method.__api_method__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            API_ERRORS.inc(name, type(e).__name__)
+            raise
+        finally:
+            API_DURATION.observe(time.perf_counter() - started, name)
+
+
+def install_api_metrics(bot: Bot) -> None:
+    if not any(isinstance(middleware, ApiMetricsMiddleware) for middleware in bot.session.middleware):
+        bot.session.middleware(ApiMetricsMiddleware())
+
+
+def create_metrics_app(metrics: MetricsRegistry = registry) -> web.Application:
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(body=metrics.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    return app
+
+
+def setup_metrics(dp: Dispatcher, port: int = METRICS_PORT, host: str = METRICS_HOST) -> None:
+    """
+    Подключает сбор метрик к диспетчеру и, если задан порт, запускает HTTP-сервер при старте.
+
+    Время запросов к API учитывается для ботов, переданных в dp.emit_startup().
+    """
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    handler_metrics = HandlerMetricsMiddleware()
+    for event_name, observer in dp.observers.items():
+        if event_name not in ("update", "error"):
+            # Внутренние middleware диспетчера применяются к обработчикам всех вложенных роутеров
+            observer.middleware(handler_metrics)
+
+    runner: Optional[web.AppRunner] = None
+
+    async def on_startup(bot: Bot) -> None:
+        nonlocal runner
+        install_api_metrics(bot)
+        if port and runner is None:
+            runner = web.AppRunner(create_metrics_app())
+            await runner.setup()
+            await web.TCPSite(runner, host, port).start()
+            logger.info("Метрики доступны на %s:%s/metrics", host, port)
+
+    async def on_shutdown() -> None:
+        nonlocal runner
+        if runner is not None:
+            await runner.cleanup()
+            runner = None
+
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
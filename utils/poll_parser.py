@@ -1,52 +1,154 @@
-import re
+"""
+Разбор текста с вопросами опроса.
 
-import re
+Формат: вопросы нумеруются ("1. Текст", "2) Текст", "3: Текст"), варианты
+ответов начинаются с "+ " (правильный) или "- " (неправильный), вопросы
+разделяются пустыми строками.
 
+Разбор потоковый: PollParser принимает строки по одной и отдает вопросы
+по мере их завершения. Ошибочные строки не прерывают разбор - парсер
+пропускает строки до следующего вопроса или пустой строки и продолжает,
+а все ошибки с номерами строк собираются в PollParseError.
+"""
 import re
+from dataclasses import dataclass
+from typing import BinaryIO, Iterable, Iterator, List, Optional, TextIO, Union
 
-import re
+# Вопрос: "1. Текст" / "1) Текст" / "1: Текст"; ответ: "+ Текст" / "- Текст"
+LINE_PATTERN = re.compile(r"\d+[.:)]\s+(?P<question>.+)|(?P<mark>[+-]) (?P<option>.*)", re.DOTALL)
+
+EXPECTED_QUESTION = "expected a numbered question."
+EXPECTED_ANSWER_OR_QUESTION = "expected '+', '-', or a numbered question."
+UNDECODABLE_LINE = "line is not valid {encoding} text."
+
+Lines = Union[Iterable[str], Iterable[bytes], TextIO, BinaryIO]
+
+
+@dataclass(frozen=True)
+class ParseError:
+    line_number: int
+    message: str
+
+    def __str__(self) -> str:
+        return f"Incorrect format on line {self.line_number}: {self.message}"
+
+
+class PollParseError(ValueError):
+    """
+    Текст содержит ошибочные строки; все найденные ошибки - в errors.
+    """
+
+    def __init__(self, errors: List[ParseError]):
+        super().__init__("\n".join(str(error) for error in errors))
+        self.errors = errors
+
+
+class PollParser:
+    """
+    Потоковый разбор вопросов: feed() для каждой строки, finish() в конце.
+
+    feed() и finish() возвращают вопрос, если он завершен этой строкой.
+    Ошибки накапливаются в errors.
+    """
 
-def parse_poll_from_file(file_content):
-    questions = []
-    current_question = None
-    question_order = 0  # Счетчик порядковых номеров
+    def __init__(self, encoding: str = "utf-8"):
+        self.encoding = encoding
+        self.errors: List[ParseError] = []
+        self.line_number = 0
+        self._question: Optional[dict] = None
+        self._order = 0
+        # Пропуск строк после ошибки до следующего вопроса или пустой строки
+        self._skipping = False
 
-    for line_number, line in enumerate(file_content.strip().splitlines(), start=1):
+    def feed(self, line: Union[str, bytes]) -> Optional[dict]:
+        self.line_number += 1
+        if isinstance(line, bytes):
+            try:
+                line = line.decode(self.encoding)
+            except UnicodeDecodeError:
+                # Строка не разбирается, но остальные ошибки в файле тоже будут найдены
+                self._error(UNDECODABLE_LINE.format(encoding=self.encoding))
+                return None
         line = line.strip()
+
         if not line:
-            if current_question:
-                questions.append(current_question)
-                current_question = None
-            continue
-
-        if re.match(r"^\d+[.:)]\s", line):
-            if current_question:
-                questions.append(current_question)
-            question_order += 1  # Увеличиваем порядковый номер
-            current_question = {
-                "text": line.split(" ", 1)[1],
+            self._skipping = False
+            return self._close_question()
+
+        match = LINE_PATTERN.match(line)
+        if match is not None and match.group("question") is not None:
+            self._skipping = False
+            completed = self._close_question()
+            self._order += 1
+            self._question = {
+                "text": match.group("question"),
                 "options": [],
                 "correct_answers": [],
-                "order": question_order  # Добавляем поле order
+                "order": self._order
             }
-        elif current_question:
-            if line.startswith("+ "):
-                current_question["options"].append(line[2:])
-                current_question["correct_answers"].append(line[2:])
-            elif line.startswith("- "):
-                current_question["options"].append(line[2:])
-            else:
-                raise ValueError(
-                    f"Incorrect format on line {line_number}: "
-                    "expected '+', '-', or a numbered question."
-                )
+            return completed
+
+        if self._skipping:
+            return None
+        if self._question is None:
+            self._error(EXPECTED_QUESTION)
+            self._skipping = True
+        elif match is None:
+            # Ошибочная строка внутри вопроса: следующие ответы относятся к нему же
+            self._error(EXPECTED_ANSWER_OR_QUESTION)
         else:
-            raise ValueError(
-                f"Incorrect format on line {line_number}: "
-                "expected a numbered question."
-            )
+            option = match.group("option")
+            self._question["options"].append(option)
+            if match.group("mark") == "+":
+                self._question["correct_answers"].append(option)
+        return None
+
+    def finish(self) -> Optional[dict]:
+        self._skipping = False
+        return self._close_question()
+
+    def _close_question(self) -> Optional[dict]:
+        question, self._question = self._question, None
+        return question
+
+    def _error(self, message: str) -> None:
+        self.errors.append(ParseError(self.line_number, message))
+
+
+def iter_poll_questions(lines: Lines, encoding: str = "utf-8") -> Iterator[dict]:
+    """
+    Разбирает строки (текстовый или бинарный поток, список строк) и отдает вопросы по мере готовности.
+
+    Raises:
+        PollParseError: В конце разбора, если в тексте были ошибки.
+    """
+    parser = PollParser(encoding)
+    for line in lines:
+        question = parser.feed(line)
+        if question is not None:
+            yield question
+    question = parser.finish()
+    if question is not None:
+        yield question
+    if parser.errors:
+        raise PollParseError(parser.errors)
+
+
+def parse_poll(lines: Lines, encoding: str = "utf-8") -> List[dict]:
+    """
+    Разбирает все строки и возвращает список вопросов.
+
+    Raises:
+        PollParseError: Если в тексте были ошибки.
+    """
+    return list(iter_poll_questions(lines, encoding))
+
 
-    if current_question:
-        questions.append(current_question)
+def parse_poll_from_file(file_content: str) -> List[dict]:
+    """
+    Разбирает текст целиком. Номера строк в ошибках отсчитываются от первой непустой строки.
 
-    return questions
\ No newline at end of file
+    Raises:
+        PollParseError: Если в тексте были ошибки.
+    """
+    return parse_poll(file_content.strip().splitlines())
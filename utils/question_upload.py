@@ -0,0 +1,159 @@
+"""
+Потоковая загрузка файлов с вопросами опроса.
+
+Файл скачивается частями, каждая часть сразу декодируется и передается
+PollParser, поэтому в памяти не хранится ни файл целиком, ни его текст.
+Файлы больше QUESTIONS_FILE_MAX_SIZE отклоняются до скачивания (по размеру,
+который сообщает Telegram) или как только скачанная часть превысит лимит.
+
+Кодировка определяется один раз для всего файла: UTF-8, если есть BOM или
+первая строка с не-ASCII символами корректна в UTF-8, иначе cp1251. Строки,
+которые не декодируются в выбранной кодировке, считаются ошибками разбора
+с номером строки, как и остальные ошибки формата.
+
+QUESTIONS_FILE_MAX_SIZE    - максимальный размер файла в байтах
+QUESTIONS_FILE_CHUNK_SIZE  - размер скачиваемой части в байтах
+QUESTIONS_FILE_TIMEOUT     - сколько секунд ждать скачивания файла
+"""
+import codecs
+import io
+import os
+from typing import List, Optional, Union
+
+from aiogram import Bot
+from aiogram.types import Document
+
+from utils.poll_parser import PollParseError, PollParser
+
+QUESTIONS_FILE_MAX_SIZE = int(os.getenv("QUESTIONS_FILE_MAX_SIZE", str(1024 * 1024)))
+QUESTIONS_FILE_CHUNK_SIZE = int(os.getenv("QUESTIONS_FILE_CHUNK_SIZE", "65536"))
+QUESTIONS_FILE_TIMEOUT = int(os.getenv("QUESTIONS_FILE_TIMEOUT", "30"))
+
+FALLBACK_ENCODING = "cp1251"
+
+
+class FileTooLargeError(Exception):
+    """
+    Файл с вопросами больше допустимого размера.
+    """
+
+    def __init__(self, max_size: int):
+        super().__init__(f"File is larger than {max_size} bytes")
+        self.max_size = max_size
+
+
+class LineDecoder:
+    """
+    Инкрементально разбивает байты на строки и декодирует их.
+
+    Части могут обрываться посреди строки или символа: незавершенная строка
+    хранится до следующей части. Кодировка (encoding) определяется по BOM
+    или по первой строке с не-ASCII байтами; строки до нее - ASCII и
+    одинаково читаются в любой из кодировок. Строка, которую нельзя
+    декодировать в определенной кодировке, возвращается как bytes.
+    """
+
+    def __init__(self, fallback_encoding: str = FALLBACK_ENCODING):
+        self.fallback_encoding = fallback_encoding
+        self.encoding: Optional[str] = None
+        self._pending = b""
+        self._first_line = True
+
+    def feed(self, chunk: bytes) -> List[Union[str, bytes]]:
+        lines = (self._pending + chunk).split(b"\n")
+        self._pending = lines.pop()
+        return [self._decode(line) for line in lines]
+
+    def finish(self) -> List[Union[str, bytes]]:
+        line, self._pending = self._pending, b""
+        return [self._decode(line)] if line else []
+
+    def _decode(self, line: bytes) -> Union[str, bytes]:
+        if self._first_line:
+            self._first_line = False
+            if line.startswith(codecs.BOM_UTF8):
+                line = line[len(codecs.BOM_UTF8):]
+                self.encoding = "utf-8"
+        if self.encoding is None:
+            if line.isascii():
+                return line.decode("ascii")
+            self.encoding = "utf-8" if _is_utf8(line) else self.fallback_encoding
+        try:
+            return line.decode(self.encoding)
+        except UnicodeDecodeError:
+            return line
+
+
+def _is_utf8(line: bytes) -> bool:
+    try:
+        line.decode("utf-8")
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+class QuestionFileReader(io.RawIOBase):
+    """
+    Приемник для Bot.download_file(): разбирает вопросы по мере скачивания.
+    """
+
+    def __init__(self, max_size: int = QUESTIONS_FILE_MAX_SIZE):
+        super().__init__()
+        self.max_size = max_size
+        self.size = 0
+        self.questions: List[dict] = []
+        self._decoder = LineDecoder()
+        self._parser = PollParser()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, chunk: bytes) -> int:
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise FileTooLargeError(self.max_size)
+        for line in self._decoder.feed(chunk):
+            self._feed(line)
+        return len(chunk)
+
+    def finish(self) -> List[dict]:
+        """
+        Завершает разбор после скачивания.
+
+        Raises:
+            PollParseError: Если в файле были ошибки.
+        """
+        for line in self._decoder.finish():
+            self._feed(line)
+        question = self._parser.finish()
+        if question is not None:
+            self.questions.append(question)
+        if self._parser.errors:
+            raise PollParseError(self._parser.errors)
+        return self.questions
+
+    def _feed(self, line: Union[str, bytes]) -> None:
+        # Недекодированную строку парсер учтет как ошибку с ее номером
+        self._parser.encoding = self._decoder.encoding or "utf-8"
+        question = self._parser.feed(line)
+        if question is not None:
+            self.questions.append(question)
+
+
+async def download_questions(bot: Bot, document: Document, max_size: int = QUESTIONS_FILE_MAX_SIZE,
+                             chunk_size: int = QUESTIONS_FILE_CHUNK_SIZE,
+                             timeout: int = QUESTIONS_FILE_TIMEOUT) -> List[dict]:
+    """
+    Скачивает файл с вопросами и разбирает его по частям.
+
+    Raises:
+        FileTooLargeError: Если файл больше max_size байт.
+        PollParseError: Если в файле были ошибки.
+    """
+    if document.file_size and document.file_size > max_size:
+        raise FileTooLargeError(max_size)
+
+    file = await bot.get_file(document.file_id)
+    reader = QuestionFileReader(max_size)
+    await bot.download_file(file.file_path, destination=reader, timeout=timeout, chunk_size=chunk_size, seek=False)
+    return reader.finish()
@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Optional, Tuple
+
+from utils.metrics import CallbackMetric, Counter, Histogram, registry
+
+if TYPE_CHECKING:
+    from database.database import PollFinalization
+
+logger = logging.getLogger(__name__)
+
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+REPORT_QUEUE_LIMIT = int(os.getenv("REPORT_QUEUE_LIMIT", "8"))
+REPORT_TIMEOUT = float(os.getenv("REPORT_TIMEOUT", "120"))
+# "thread" или "process"
+REPORT_EXECUTOR = os.getenv("REPORT_EXECUTOR", "thread")
+
+REPORT_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+REPORT_QUEUE_WAIT = registry.register(Histogram(
+    "bot_report_queue_wait_seconds", "Время ожидания отчета в очереди", buckets=REPORT_BUCKETS))
+REPORT_BUILD_DURATION = registry.register(Histogram(
+    "bot_report_build_duration_seconds", "Время построения отчета", buckets=REPORT_BUCKETS))
+REPORT_JOBS = registry.register(Counter(
+    "bot_report_jobs_total", "Задания на построение отчетов по результату", ("status",)))
+
+
+class ReportQueueFullError(Exception):
+    """
+    Очередь отчетов переполнена, новое задание отклонено.
+    """
+
+
+def build_report(poll_id: int, submitted_at: float,
+                 summary: Optional["PollFinalization"] = None) -> Tuple[Optional[str], float, float]:
+    """
+    Строит отчет в рабочем потоке или процессе с собственной сессией БД.
+
+    Returns:
+        Tuple: Путь к файлу отчета, время ожидания в очереди и время построения в секундах.
+    """
+    from database.database import SessionLocal
+    from utils.report_generator import generate_excel_report
+
+    started_at = time.time()
+    db = SessionLocal()
+    try:
+        report_path = generate_excel_report(db, poll_id, summary)
+    finally:
+        db.close()
+    return report_path, started_at - submitted_at, time.time() - started_at
+
+
+@dataclass
+class ReportExecutorMetrics:
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    rejected: int = 0
+    timed_out: int = 0
+    queue_wait_total: float = 0.0
+    queue_wait_max: float = 0.0
+    build_time_total: float = 0.0
+    build_time_max: float = 0.0
+
+    @property
+    def queue_wait_avg(self) -> float:
+        return self.queue_wait_total / self.completed if self.completed else 0.0
+
+    @property
+    def build_time_avg(self) -> float:
+        return self.build_time_total / self.completed if self.completed else 0.0
+
+
+class ReportExecutor:
+    """
+    Пул потоков или процессов для построения отчетов вне цикла событий.
+
+    Ограничивает число заданий в работе и в очереди, прерывает ожидание
+    слишком долгих заданий и собирает метрики времени ожидания и построения.
+    """
+
+    def __init__(self, workers: int = REPORT_WORKERS, queue_limit: int = REPORT_QUEUE_LIMIT,
+                 timeout: float = REPORT_TIMEOUT, use_processes: bool = REPORT_EXECUTOR == "process",
+                 job: Callable[..., Tuple[Optional[str], float, float]] = build_report):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self.use_processes = use_processes
+        self.job = job
+        self.metrics = ReportExecutorMetrics()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._pool: Optional[Executor] = None
+
+    @property
+    def pending(self) -> int:
+        """
+        Количество заданий в очереди и в работе.
+        """
+        return self._pending
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            pool_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            self._pool = pool_class(max_workers=self.workers)
+        return self._pool
+
+    def _on_job_done(self, future, job_state: dict) -> None:
+        report_path = None
+        with self._lock:
+            self._pending -= 1
+            job_state["finished"] = True
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                self.metrics.failed += 1
+                return
+            report_path, queue_wait, build_time = future.result()
+            self.metrics.completed += 1
+            self.metrics.queue_wait_total += queue_wait
+            self.metrics.queue_wait_max = max(self.metrics.queue_wait_max, queue_wait)
+            self.metrics.build_time_total += build_time
+            self.metrics.build_time_max = max(self.metrics.build_time_max, build_time)
+            if not job_state["timed_out"]:
+                return
+        # Результат опоздавшего задания никому не нужен
+        if report_path:
+            os.remove(report_path)
+
+    async def generate(self, poll_id: int, summary: Optional["PollFinalization"] = None) -> Optional[str]:
+        """
+        Ставит построение отчета в очередь и ожидает результат.
+
+        Итоги завершения опроса (summary) передаются заданию как есть и
+        попадают в отчет.
+
+        Returns:
+            Optional[str]: Путь к файлу отчета или None, если опрос не найден.
+
+        Raises:
+            ReportQueueFullError: Если в очереди уже queue_limit заданий.
+            asyncio.TimeoutError: Если отчет не построен за timeout секунд.
+        """
+        with self._lock:
+            if self._pending >= self.queue_limit:
+                self.metrics.rejected += 1
+                REPORT_JOBS.inc("rejected")
+                raise ReportQueueFullError(f"Report queue is full ({self.queue_limit} jobs)")
+            self._pending += 1
+            self.metrics.submitted += 1
+
+        job_state = {"timed_out": False, "finished": False}
+        try:
+            future = self._get_pool().submit(self.job, poll_id, time.time(), summary)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        future.add_done_callback(lambda done: self._on_job_done(done, job_state))
+
+        try:
+            report_path, queue_wait, build_time = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            with self._lock:
+                job_state["timed_out"] = True
+                self.metrics.timed_out += 1
+                # Задание успело завершиться, пока истекал таймаут
+                late_result = future.result() if job_state["finished"] and not future.cancelled() \
+                    and future.exception() is None else None
+            if late_result and late_result[0]:
+                os.remove(late_result[0])
+            REPORT_JOBS.inc("timed_out")
+            logger.error("Отчет по опросу %s не построен за %s с", poll_id, self.timeout)
+            raise
+        except Exception:
+            REPORT_JOBS.inc("failed")
+            raise
+
+        # Метрики Prometheus пишутся из цикла событий, а не из потока, завершившего задание
+        REPORT_JOBS.inc("completed")
+        REPORT_QUEUE_WAIT.observe(queue_wait)
+        REPORT_BUILD_DURATION.observe(build_time)
+
+        logger.info("Отчет по опросу %s построен за %.2f с (ожидание в очереди %.2f с)",
+                     poll_id, build_time, queue_wait)
+        return report_path
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+report_executor = ReportExecutor()
+
+REPORT_JOBS_PENDING = registry.register(CallbackMetric(
+    "bot_report_jobs_pending", "Задания на построение отчетов в очереди и в работе",
+    callback=lambda: {(): report_executor.pending}))
@@ -1,170 +1,165 @@
+import logging
+import os
+import tempfile
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Iterator, Optional
+
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font
-from database.database import get_users_by_poll_id
-from database.models import Question, QuestionResponse, PollResponse, User, Poll
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Optional
-import logging
-from io import BytesIO
 
+from database.models import Question, QuestionResponse, PollResponse, User, Poll
 
-import logging
-from io import BytesIO
-from typing import Optional
-from openpyxl import Workbook
-from openpyxl.styles import Font
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+if TYPE_CHECKING:
+    from database.database import PollFinalization
+
+logger = logging.getLogger(__name__)
 
-def generate_excel_report(db: Session, poll_id: int) -> BytesIO:
+# Количество строк, забираемых из курсора за один раз при построении отчета
+REPORT_BATCH_SIZE = 500
+
+
+@dataclass
+class ReportRow:
     """
-    Generates an Excel report for a given poll.
+    Строка отчета: участник опроса, его итоговый балл и ответы по ID вопросов.
+    """
+    full_name: str
+    username: Optional[str]
+    email: Optional[str]
+    total_score: float
+    answers: Dict[int, list] = field(default_factory=dict)
+
+
+def iter_report_rows(db: Session, poll_id: int) -> Iterator[ReportRow]:
+    """
+    Построчно выдает участников опроса с их баллами и ответами.
+
+    Участники и ответы читаются двумя потоковыми запросами, упорядоченными
+    по ID записи PollResponse, и сливаются на лету, поэтому в памяти
+    одновременно находится только одна строка отчета.
 
     Args:
         db: SQLAlchemy Session.
-        poll_id: The ID of the poll.
+        poll_id: ID опроса.
 
-    Returns:
-        BytesIO: In-memory Excel file.
+    Yields:
+        ReportRow: Строка отчета для очередного участника.
+    """
+    participants = (db.query(PollResponse.id, User.first_name, User.last_name, User.username, User.email,
+                             PollResponse.total_score)
+                    .join(User, User.telegram_id == PollResponse.user_id)
+                    .filter(PollResponse.poll_id == poll_id)
+                    .order_by(PollResponse.id)
+                    .yield_per(REPORT_BATCH_SIZE))
+
+    responses = iter(db.query(QuestionResponse.poll_response_id, QuestionResponse.question_id,
+                              QuestionResponse.selected_answers)
+                     .join(PollResponse, PollResponse.id == QuestionResponse.poll_response_id)
+                     .filter(PollResponse.poll_id == poll_id)
+                     .order_by(QuestionResponse.poll_response_id, QuestionResponse.id)
+                     .yield_per(REPORT_BATCH_SIZE))
+    response = next(responses, None)
+
+    for poll_response_id, first_name, last_name, username, email, total_score in participants:
+        row = ReportRow(
+            full_name=f"{first_name} {last_name if last_name else ''}",
+            username=username,
+            email=email,
+            total_score=total_score or 0.0
+        )
+        while response is not None and response.poll_response_id <= poll_response_id:
+            # Учитывается первый сохраненный ответ на вопрос
+            if response.poll_response_id == poll_response_id and response.question_id not in row.answers:
+                row.answers[response.question_id] = response.selected_answers
+            response = next(responses, None)
+        yield row
+
+
+def _bold_row(sheet, values: list) -> list:
+    cells = []
+    for value in values:
+        cell = WriteOnlyCell(sheet, value=value)
+        cell.font = Font(bold=True)
+        cells.append(cell)
+    return cells
+
+
+def generate_excel_report(db: Session, poll_id: int,
+                          summary: Optional["PollFinalization"] = None) -> Optional[str]:
     """
-    # Create a new workbook
-    workbook = openpyxl.Workbook()
+    Generates an Excel report for a given poll.
 
-    # Remove default sheet
-    default_sheet = workbook.active
-    workbook.remove(default_sheet)
+    The workbook is written in write-only mode: rows are emitted as they are
+    read from the database and the result is saved to a temporary file, so
+    memory usage does not depend on the number of participants. The caller
+    is responsible for removing the file.
 
-    # Log the start of the process
-    logging.info(f"Generating Excel report for poll ID {poll_id}")
+    Args:
+        db: SQLAlchemy Session.
+        poll_id: The ID of the poll.
+        summary: Poll finalization result (finalize_poll()); if given, its totals
+            are added to the description sheet.
 
-    # Create a new sheet for poll description
-    description_sheet = workbook.create_sheet("Poll Description", 0)
+    Returns:
+        Optional[str]: Path to the generated .xlsx file or None if the poll is not found.
+    """
+    logger.info("Generating Excel report for poll ID %s", poll_id)
 
-    # Get poll data
-    poll: Optional[Poll] = db.query(Poll).filter(Poll.id == poll_id).first()
+    poll = db.query(Poll).filter(Poll.id == poll_id).first()
     if not poll:
-        logging.warning(f"Poll with id {poll_id} not found")
-        return BytesIO()
-
-    # Log poll details
-    logging.info(f"Poll found: Title='{poll.title}', Description='{poll.description}'")
-
-    # Write poll data to the sheet
-    description_sheet["A1"] = "Название опроса"
-    description_sheet["B1"] = poll.title
-    description_sheet["A2"] = "Описание"
-    description_sheet["B2"] = poll.description
-    description_sheet["A3"] = "Количество вопросов"
+        logger.warning("Poll with id %s not found", poll_id)
+        return None
+
     questions = db.query(Question).filter(Question.poll_id == poll_id).order_by(Question.order).all()
-    description_sheet["B3"] = len(questions)
 
-    row_num = 4
+    workbook = openpyxl.Workbook(write_only=True)
+
+    # Poll description sheet
+    description_sheet = workbook.create_sheet("Poll Description")
+    description_sheet.append(["Название опроса", poll.title])
+    description_sheet.append(["Описание", poll.description])
+    description_sheet.append(["Количество вопросов", len(questions)])
+    if summary is not None:
+        description_sheet.append(["Дата завершения", summary.completed_at.replace(microsecond=0)])
+        description_sheet.append(["Завершили опрос", summary.completed_count])
+        description_sheet.append(["Средний балл", round(summary.average_score, 2)])
     for question in questions:
-        description_sheet[f"A{row_num}"] = f"Вопрос {question.order}"
-        description_sheet[f"B{row_num}"] = question.text
-        row_num += 1
-        description_sheet[f"A{row_num}"] = "Варианты ответов"
-        description_sheet[f"B{row_num}"] = ", ".join(question.options)
-        row_num += 1
-        description_sheet[f"A{row_num}"] = "Правильные ответы"
-        description_sheet[f"B{row_num}"] = ", ".join(question.correct_answers)
-        row_num += 2
-
-    # Log the number of questions retrieved
-    logging.info(f"Retrieved {len(questions)} questions for poll ID {poll_id}")
-
-    # Create a new sheet for poll results
+        description_sheet.append([f"Вопрос {question.order}", question.text])
+        description_sheet.append(["Варианты ответов", ", ".join(question.options)])
+        description_sheet.append(["Правильные ответы", ", ".join(question.correct_answers)])
+        description_sheet.append([])
+
+    # Poll results sheet
     sheet = workbook.create_sheet("Poll Results")
 
-    # Define headers
     headers = ["Имя и Фамилия", "Username", "Email", "Итоговый балл"]
     for question in questions:
         headers.append(f"Ответ {question.order}")
         headers.append(f"Правильный ответ {question.order}")
-
-    # Write headers to the sheet
-    for col_num, column_title in enumerate(headers, 1):
-        cell = sheet.cell(row=1, column=col_num)
-        cell.font = Font(bold=True)
-        cell.value = column_title
-
-    # Log the creation of headers
-    logging.info(f"Headers created for {len(questions)} questions")
-
-    # Get users who participated in the poll
-    user_ids = get_users_by_poll_id(db, poll_id, True)
-
-    # Log the number of users retrieved
-    logging.info(f"Retrieved {len(user_ids)} users who participated in poll ID {poll_id}")
-
-    # Write data for each user
-    row_num = 2
-    for user_id in user_ids:
-        user: Optional[User] = db.query(User).filter(User.telegram_id == user_id).first()
-        if not user:
-            logging.warning(f"User with telegram_id {user_id} not found")
-            continue
-
-        # Log user details
-        logging.info(f"Processing user: ID={user_id}, Name='{user.first_name} {user.last_name or ''}', Username='{user.username}'")
-
-        # Get user's poll response
-        poll_response: Optional[PollResponse] = db.query(PollResponse).filter(
-            PollResponse.poll_id == poll_id,
-            PollResponse.user_id == user_id
-        ).first()
-        if not poll_response:
-            logging.warning(f"PollResponse not found for user {user_id} and poll {poll_id}")
-            continue
-
-        # Calculate total score
-        total_score = db.query(func.sum(QuestionResponse.score)).filter(
-            QuestionResponse.poll_response_id == poll_response.id
-        ).scalar() or 0.0
-
-        # Log user's total score
-        logging.info(f"User {user_id} total score: {total_score}")
-
-        user_data = [f"{user.first_name} {user.last_name if user.last_name else ''}", user.username, user.email, total_score]
-
-        # Get user's question responses
-        for question in questions:
-            question_response: Optional[QuestionResponse] = db.query(QuestionResponse).filter(
-                QuestionResponse.poll_response_id == poll_response.id,
-                QuestionResponse.question_id == question.id
-            ).first()
-
-            if question_response:
-                user_answer = ", ".join(question_response.selected_answers)
-                correct_answers = ", ".join(question.correct_answers)
-                logging.info(f"User {user_id} answered question {question.order}: '{user_answer}' (Correct: '{correct_answers}')")
-            else:
-                user_answer = "N/A"
-                correct_answers = ", ".join(question.correct_answers)
-                logging.warning(f"No answer found for user {user_id} on question {question.order}")
-
-            user_data.append(user_answer)
-            user_data.append(correct_answers)
-
-        # Log the final user data being written
-        logging.info(f"Writing user data to Excel: {user_data}")
-
-        # Write user data to the sheet
-        for col_num, cell_value in enumerate(user_data, 1):
-            sheet.cell(row=row_num, column=col_num).value = cell_value
-
-        row_num += 1
-
-    # Log the completion of writing all user data
-    logging.info(f"All user data written to Excel for poll ID {poll_id}")
-
-    # Create an in-memory file
-    excel_file = BytesIO()
-    workbook.save(excel_file)
-    excel_file.seek(0)
-
-    # Log the successful generation of the Excel file
-    logging.info(f"Excel report successfully generated for poll ID {poll_id}")
-
-    return excel_file
\ No newline at end of file
+    sheet.append(_bold_row(sheet, headers))
+
+    correct_answers = [", ".join(question.correct_answers) for question in questions]
+    participants_count = 0
+    for row in iter_report_rows(db, poll_id):
+        user_data = [row.full_name, row.username, row.email, row.total_score]
+        for question, correct in zip(questions, correct_answers):
+            selected_answers = row.answers.get(question.id)
+            user_data.append(", ".join(selected_answers) if selected_answers is not None else "N/A")
+            user_data.append(correct)
+        sheet.append(user_data)
+        participants_count += 1
+
+    file_descriptor, report_path = tempfile.mkstemp(prefix=f"poll_{poll_id}_", suffix=".xlsx")
+    os.close(file_descriptor)
+    try:
+        workbook.save(report_path)
+    except Exception:
+        os.remove(report_path)
+        raise
+
+    logger.info("Excel report for poll ID %s generated: %d questions, %d participants",
+                 poll_id, len(questions), participants_count)
+
+    return report_path
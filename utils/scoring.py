@@ -0,0 +1,102 @@
+"""
+Подсчет баллов за ответы на вопрос.
+
+Выбранные и правильные варианты представляются битовыми масками, поэтому
+оценка ответа сводится к нескольким битовым операциям. Ответы на один
+вопрос оцениваются пакетно: балл считается один раз для каждой различной
+комбинации вариантов.
+
+Политики подсчета (Question.scoring_policy):
+    partial             - доля правильных вариантов минус доля неправильных, не меньше 0 (по умолчанию)
+    partial_no_penalty  - доля выбранных правильных вариантов, неправильные не штрафуются
+    all_or_nothing      - 1, если выбраны ровно все правильные варианты, иначе 0
+"""
+from typing import Callable, Dict, Iterable, Sequence, TypeVar
+
+Key = TypeVar("Key")
+
+# Политика получает количество правильных и неправильных выбранных вариантов,
+# количество правильных вариантов вопроса и возвращает балл
+ScoringPolicy = Callable[[int, int, int], float]
+
+DEFAULT_SCORING_POLICY = "partial"
+
+SCORING_POLICIES: Dict[str, ScoringPolicy] = {
+    "partial": lambda hits, misses, total: max(0.0, (hits - misses) / total),
+    "partial_no_penalty": lambda hits, misses, total: hits / total,
+    "all_or_nothing": lambda hits, misses, total: 1.0 if hits == total and not misses else 0.0,
+}
+
+
+class QuestionScorer:
+    """
+    Оценивает ответы на один вопрос.
+    """
+
+    def __init__(self, correct_answers: Sequence[str], options: Sequence[str] = (),
+                 policy: str = DEFAULT_SCORING_POLICY):
+        if policy not in SCORING_POLICIES:
+            raise ValueError(f"Неизвестная политика подсчета баллов: {policy}")
+        self.policy = SCORING_POLICIES[policy]
+        self._bits: Dict[str, int] = {}
+        for option in options:
+            self._bit(option)
+        self.correct_mask = self.mask(correct_answers)
+        self.correct_total = self.correct_mask.bit_count()
+        self._scores: Dict[int, float] = {}
+
+    def mask(self, selected: Iterable[str]) -> int:
+        """
+        Возвращает битовую маску выбранных вариантов.
+        """
+        mask = 0
+        for option in selected:
+            mask |= self._bits.get(option) or self._bit(option)
+        return mask
+
+    def score_mask(self, mask: int) -> float:
+        score = self._scores.get(mask)
+        if score is None:
+            if not self.correct_total:
+                score = 0.0
+            else:
+                hits = (mask & self.correct_mask).bit_count()
+                misses = (mask & ~self.correct_mask).bit_count()
+                score = self.policy(hits, misses, self.correct_total)
+            self._scores[mask] = score
+        return score
+
+    def score(self, selected: Iterable[str]) -> float:
+        return self.score_mask(self.mask(selected))
+
+    def score_many(self, answers: Dict[Key, Sequence[str]]) -> Dict[Key, float]:
+        """
+        Оценивает ответы всех участников.
+
+        Args:
+            answers: Выбранные варианты по ключу участника.
+
+        Returns:
+            Dict: Баллы по тем же ключам.
+        """
+        return {key: self.score_mask(self.mask(selected)) for key, selected in answers.items()}
+
+    def _bit(self, option: str) -> int:
+        bit = self._bits[option] = 1 << len(self._bits)
+        return bit
+
+
+def score_answers(correct_answers: Sequence[str], answers: Dict[Key, Sequence[str]],
+                  policy: str = DEFAULT_SCORING_POLICY, options: Sequence[str] = ()) -> Dict[Key, float]:
+    """
+    Оценивает ответы всех участников на вопрос одним вызовом.
+    """
+    return QuestionScorer(correct_answers, options, policy).score_many(answers)
+
+
+def score_answer(selected: Sequence[str], correct_answers: Sequence[str],
+                 policy: str = DEFAULT_SCORING_POLICY) -> float:
+    """
+    Оценивает один ответ.
+    """
+    return QuestionScorer(correct_answers, policy=policy).score(selected)
@@ -0,0 +1,245 @@
+"""
+Прием обновлений Telegram через вебхук.
+
+Обновления из HTTP-запросов складываются в ограниченные очереди. Обновления
+одного чата всегда попадают в одну очередь и обрабатываются по порядку,
+обновления разных чатов - одновременно, не более WEBHOOK_CONCURRENCY сразу.
+Без WEBHOOK_SECRET вебхук не запускается: иначе кто угодно может прислать
+поддельное обновление.
+
+WEBHOOK_URL              - внешний адрес бота (например, https://bot.example.com), на него ставится вебхук
+WEBHOOK_PATH             - путь, по которому Telegram присылает обновления
+WEBHOOK_HOST             - адрес, на котором слушает HTTP-сервер
+WEBHOOK_PORT             - порт HTTP-сервера
+WEBHOOK_SECRET           - секрет, который Telegram передает в заголовке X-Telegram-Bot-Api-Secret-Token (обязателен)
+WEBHOOK_WORKERS          - количество очередей, по которым распределяются чаты
+WEBHOOK_CONCURRENCY      - сколько принятых из очередей обновлений может ждать или обрабатываться одновременно
+WEBHOOK_QUEUE_SIZE       - сколько обновлений может ждать обработки
+WEBHOOK_OVERFLOW         - что делать при заполненной очереди: "wait" (ждать места) или "reject" (сразу ответить 503)
+WEBHOOK_ENQUEUE_TIMEOUT  - сколько секунд ждать места в очереди в режиме "wait"
+"""
+import asyncio
+import hmac
+import logging
+import os
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Set
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+
+from utils.log import RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", "100"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WEBHOOK_OVERFLOW = os.getenv("WEBHOOK_OVERFLOW", "wait")
+WEBHOOK_ENQUEUE_TIMEOUT = float(os.getenv("WEBHOOK_ENQUEUE_TIMEOUT", "5"))
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+UpdateHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+def get_update_key(update: Dict[str, Any]) -> int:
+    """
+    Возвращает идентификатор чата (или пользователя), к которому относится обновление.
+
+    Обновления с одинаковым ключом должны обрабатываться по порядку.
+    """
+    for value in update.values():
+        if not isinstance(value, dict):
+            continue
+        # У callback_query чат находится в сообщении с кнопкой
+        chat = value.get("chat") or value.get("message", {}).get("chat")
+        if chat:
+            return chat["id"]
+        user = value.get("from") or value.get("user")
+        if user:
+            return user["id"]
+    return update.get("update_id", 0)
+
+
+@dataclass
+class UpdateQueueStats:
+    received: int = 0
+    processed: int = 0
+    failed: int = 0
+    rejected: int = 0
+
+
+class UpdateQueue:
+    """
+    Набор ограниченных очередей обновлений.
+
+    Обновление попадает в очередь по ключу get_update_key(). Обновления
+    одного чата обрабатываются по одному и по порядку, а разных чатов из
+    одной очереди - одновременно, поэтому долгий обработчик (например,
+    рассылка вопроса администратором) не задерживает остальные чаты.
+    """
+
+    def __init__(self, handler: UpdateHandler, workers: int = WEBHOOK_WORKERS,
+                 maxsize: int = WEBHOOK_QUEUE_SIZE, overflow: str = WEBHOOK_OVERFLOW,
+                 enqueue_timeout: float = WEBHOOK_ENQUEUE_TIMEOUT, concurrency: int = WEBHOOK_CONCURRENCY):
+        if overflow not in ("wait", "reject"):
+            raise ValueError(f"Неизвестная политика переполнения очереди: {overflow}")
+        self.handler = handler
+        self.overflow = overflow
+        self.enqueue_timeout = enqueue_timeout
+        self.stats = UpdateQueueStats()
+        self._queues: List[asyncio.Queue] = [
+            asyncio.Queue(maxsize=max(1, maxsize // workers)) for _ in range(workers)
+        ]
+        self._tasks: List[asyncio.Task] = []
+        # Пока все места заняты, обновления остаются в очередях и срабатывает ограничение нагрузки
+        self._slots = asyncio.Semaphore(concurrency)
+        # Обновления чатов, которые сейчас обрабатываются, в порядке поступления
+        self._chats: Dict[int, Deque[Dict[str, Any]]] = {}
+        self._chat_tasks: Set[asyncio.Task] = set()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    @property
+    def size(self) -> int:
+        return sum(queue.qsize() for queue in self._queues)
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._consume(queue)) for queue in self._queues]
+
+    async def stop(self) -> None:
+        """
+        Дожидается обработки принятых обновлений и останавливает обработчики.
+        """
+        for queue in self._queues:
+            await queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def put(self, update: Dict[str, Any]) -> bool:
+        """
+        Ставит обновление в очередь.
+
+        Returns:
+            bool: False, если очередь заполнена и обновление не принято.
+        """
+        self.stats.received += 1
+        queue = self._queues[get_update_key(update) % len(self._queues)]
+        try:
+            if self.overflow == "reject":
+                queue.put_nowait(update)
+            else:
+                await asyncio.wait_for(queue.put(update), self.enqueue_timeout)
+        except (asyncio.QueueFull, asyncio.TimeoutError):
+            self.stats.rejected += 1
+            return False
+        return True
+
+    async def _consume(self, queue: asyncio.Queue) -> None:
+        while True:
+            await self._slots.acquire()
+            update = await queue.get()
+            key = get_update_key(update)
+            pending = self._chats.get(key)
+            if pending is not None:
+                # Предыдущее обновление чата еще обрабатывается, это обработается после него
+                pending.append(update)
+                continue
+            self._chats[key] = deque([update])
+            task = asyncio.create_task(self._process_chat(key, queue))
+            self._chat_tasks.add(task)
+            task.add_done_callback(self._chat_tasks.discard)
+
+    async def _process_chat(self, key: int, queue: asyncio.Queue) -> None:
+        pending = self._chats[key]
+        try:
+            while pending:
+                update = pending.popleft()
+                try:
+                    await self.handler(update)
+                    self.stats.processed += 1
+                except Exception as e:
+                    self.stats.failed += 1
+                    logger.error("Ошибка при обработке обновления %s: %s", update.get("update_id"), e,
+                                 extra=RATE_LIMITED)
+                finally:
+                    self._slots.release()
+                    queue.task_done()
+        finally:
+            del self._chats[key]
+
+
+def create_webhook_app(queue: UpdateQueue, path: str = WEBHOOK_PATH,
+                       secret: str = WEBHOOK_SECRET) -> web.Application:
+    """
+    Создает aiohttp-приложение с вебхуком и проверкой состояния (/health).
+
+    Raises:
+        ValueError: Если секрет не задан.
+    """
+    if not secret:
+        raise ValueError("Для режима вебхука нужно задать WEBHOOK_SECRET")
+
+    async def handle_update(request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+            return web.Response(status=401)
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        if not await queue.put(update):
+            # Telegram повторит доставку обновления позже
+            return web.Response(status=503, headers={"Retry-After": "1"})
+        return web.Response()
+
+    async def handle_health(request: web.Request) -> web.Response:
+        return web.json_response(
+            {"status": "ok" if queue.running else "stopped", "queue": queue.size, **vars(queue.stats)},
+            status=200 if queue.running else 503
+        )
+
+    app = web.Application()
+    app.router.add_post(path, handle_update)
+    app.router.add_get("/health", handle_health)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot) -> None:
+    """
+    Запускает бота в режиме вебхука и работает до отмены.
+    """
+    queue = UpdateQueue(lambda update: dp.feed_raw_update(bot, update))
+    runner = web.AppRunner(create_webhook_app(queue))
+
+    await dp.emit_startup(bot=bot)
+    queue.start()
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    if WEBHOOK_URL:
+        await bot.set_webhook(
+            WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+    logger.info("Вебхук слушает %s:%s%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        # Сначала перестаем принимать запросы, затем дорабатываем очередь
+        await runner.cleanup()
+        await queue.stop()
+        await dp.emit_shutdown(bot=bot)
+        await bot.session.close()